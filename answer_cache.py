@@ -0,0 +1,192 @@
+#answer_cache.py
+#cache hasil pencarian (data_property) per filter JSON + page, opsional juga jawaban akhirnya
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from langchain_core.runnables import RunnableGenerator
+
+from vector_store import get_manager
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))          # detik
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_ANSWERS = os.getenv("ANSWER_CACHE_ANSWERS", "0") == "1"    # cache juga jawaban LLM
+LISTINGS_JSON = os.getenv("LISTINGS_JSON", "data/embeds/listings.json")
+
+def normalize(d: dict) -> dict:
+    """Seperti normalize di fetch_property (buang None / string kosong), string di-lowercase."""
+    out = {}
+    for k, v in d.items():
+        if v is None:
+            continue
+        if isinstance(v, str) and v.strip() == "":
+            continue
+        out[k] = v.strip().lower() if isinstance(v, str) else v
+    return out
+
+def filter_key(param: dict) -> str:
+    """Key cache = filter (tanpa page/paginate) yang sudah dinormalisasi + nomor page."""
+    base = {k: v for k, v in normalize(param).items() if k not in ("page", "paginate")}
+    page = param.get("page", 1)
+    return json.dumps(base, sort_keys=True, ensure_ascii=False) + f"#page={page}"
+
+class AnswerCache:
+    """
+    Cache LRU + TTL. Semua entry dianggap basi bila versi katalog berubah:
+    - stamp ingest (ditulis ingest.py lewat VectorStoreManager.mark_updated; ini invalidasi eksplisit saat ingest,
+      karena ingest berjalan di proses lain), atau
+    - updated_at terbaru di listings.json.
+    Versi dibaca di luar lock cache (listings.json bisa besar); hanya penggantiannya yang di dalam lock.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE, check_interval: float = 5.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()   # 1 thread saja yang membaca ulang versi katalog
+        self._docs: OrderedDict[str, tuple] = OrderedDict()
+        self._answers: OrderedDict[str, tuple] = OrderedDict()
+        self._version = None
+        self._last_check = 0.0
+        self._listings_mtime = None
+        self._listings_updated_at = None
+        self.hits = 0
+        self.misses = 0
+        self.answer_hits = 0
+
+    def catalog_version(self):
+        path = Path(LISTINGS_JSON)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._listings_mtime:
+            self._listings_mtime = mtime
+            try:
+                rows = json.loads(path.read_text(encoding="utf-8"))
+                self._listings_updated_at = max((r.get("updated_at") or "" for r in rows), default=None)
+            except (OSError, ValueError):
+                self._listings_updated_at = None
+        return (get_manager().read_stamp(), self._listings_updated_at)
+
+    def _poll_version(self):
+        """Versi katalog bila sudah waktunya dicek (None bila belum / thread lain sedang membaca). Di luar lock cache."""
+        if time.monotonic() - self._last_check < self.check_interval or not self._version_lock.acquire(blocking=False):
+            return None
+        try:
+            self._last_check = time.monotonic()
+            return self.catalog_version()
+        finally:
+            self._version_lock.release()
+
+    def _apply_version(self, version):
+        # dipanggil di dalam lock
+        if version is not None and version != self._version:
+            self._version = version
+            self._docs.clear()
+            self._answers.clear()
+
+    def _get(self, store: OrderedDict, key: str):
+        item = store.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.monotonic():
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return value
+
+    def _put(self, store: OrderedDict, key: str, value):
+        store[key] = (value, time.monotonic() + self.ttl)
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get_docs(self, param: dict):
+        version = self._poll_version()
+        with self._lock:
+            self._apply_version(version)
+            value = self._get(self._docs, filter_key(param))
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put_docs(self, param: dict, documents: str):
+        with self._lock:
+            self._put(self._docs, filter_key(param), documents)
+
+    def answer_key(self, param: dict, query: str | None = None) -> str:
+        """Sama dengan key cache dokumen; `query` ikut bila data properti berasal dari pencarian vector."""
+        key = filter_key(param)
+        return key + f"#q={query.strip().lower()}" if query else key
+
+    def get_answer(self, param: dict, query: str | None = None):
+        if not ANSWER_CACHE_ANSWERS or param is None:
+            return None
+        key = self.answer_key(param, query)
+        version = self._poll_version()
+        with self._lock:
+            self._apply_version(version)
+            value = self._get(self._answers, key)
+            if value is not None:
+                self.answer_hits += 1
+            return value
+
+    def put_answer(self, param: dict, answer: str, query: str | None = None):
+        if not ANSWER_CACHE_ANSWERS or param is None or not answer:
+            return
+        key = self.answer_key(param, query)
+        with self._lock:
+            self._put(self._answers, key, answer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "answer_hits": self.answer_hits,
+                "entries": len(self._docs),
+            }
+
+answer_cache = AnswerCache()
+
+def remembering(chain, key):
+    """
+    Jalankan `chain` (output str) sambil meneruskan chunk-nya apa adanya (stream tetap mengalir),
+    lalu simpan jawaban lengkap ke answer_cache. key(x) -> (param, query).
+    """
+    def remember(x: dict, chunks: list):
+        param, query = key(x)
+        answer_cache.put_answer(param, "".join(chunks), query)
+
+    def transform(inputs, config):
+        x = {}
+        for part in inputs:
+            x.update(part)
+        chunks = []
+        for chunk in chain.stream(x, config):
+            chunks.append(chunk)
+            yield chunk
+        remember(x, chunks)
+
+    async def atransform(inputs, config):
+        x = {}
+        async for part in inputs:
+            x.update(part)
+        chunks = []
+        async for chunk in chain.astream(x, config):
+            chunks.append(chunk)
+            yield chunk
+        remember(x, chunks)
+
+    return RunnableGenerator(transform, atransform, name="remember_answer")
@@ -3,6 +3,7 @@
 from dotenv import load_dotenv
 
 from typing import Dict, List, Tuple
+import asyncio
 import os
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
@@ -12,10 +13,10 @@ from langchain_chroma import Chroma
 from langchain_core.runnables import RunnableLambda, RunnableParallel
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables import RunnableBranch
+from langchain_core.runnables import RunnableBranch, RunnablePassthrough
 from langchain_community.callbacks import get_openai_callback
 from langchain_core.output_parsers import JsonOutputParser
-from helper import doc_to_json, post_query, text_to_json, jakarta_time_greeting
+from helper import doc_to_json, post_query, apost_query, text_to_json, jakarta_time_greeting
 from rich import print
 from itertools import islice
 from typing import Iterable
@@ -28,61 +29,38 @@ from operator import itemgetter
 import ast, json
 
 from helper import jakarta_time_greeting
+from understand import understand_runnable, resolve_mode
+from listing_source import query_listing, aquery_listing
+from answer_cache import answer_cache, remembering, ANSWER_CACHE_ANSWERS
+from vector_store import get_manager
+from vector_filter import hybrid_search, ahybrid_search
+import fast_path
+import metrics
+from tracing import trace_scope
+from http_client import http
+from history_writer import history_writer
+from reranker import RERANK, reranker
+from listing_context import LISTING_CONTEXT, context_from_docs, context_from_text
+from history_window import render_history, history_report
+from session_store import get_history, get_query_history
+from request_context import request_scope, timed, timed_stream, current, set_doc, set_method, set_branch
 
 load_dotenv()
 
 DATA_API_URL = os.getenv("DATA_API_URL")
 API_TOKEN = os.getenv("API_TOKEN")
-FETCH_PROPERTY_URL = DATA_API_URL + "/query_listing"
-STORE_HISTORY_URL = DATA_API_URL + "/chat_history"
-
-PERSIST_DIR = "chroma/realestate"
-COLLECTION_NAME = "realestate"
-
-
-report_param = {}
-
-_session_store: Dict[str, ChatMessageHistory] = {}
-def get_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in _session_store:
-        _session_store[session_id] = ChatMessageHistory()
-    return _session_store[session_id]
-
-_query_session_store: Dict[str, ChatMessageHistory] = {}
-def get_query_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in _query_session_store:
-        _query_session_store[session_id] = ChatMessageHistory()
-    return _query_session_store[session_id]
 
 def coming_soon(x):
     return "Maaf, fitur ini masih dalam tahap pengembangan. Silahkan hubungi Admin atau kunjungi www.metaproperty.co.id ."
 
-def serialize_history(hist_obj: BaseChatMessageHistory, turns: int = 10) -> str:
-    """
-    Ambil 10 percakapan terakhir (user+AI = 2 pesan x 10 = 20 messages)
-    dan ubah jadi transcript teks sederhana: "Human: ..." / "AI: ..."
-    """
-    if not hist_obj or not getattr(hist_obj, "messages", None):
-        return ""
-    msgs = hist_obj.messages[-2*turns:]  # 10 percakapan terakhir
-    lines = []
-    for m in msgs:
-        role = "Human" if m.type in ("human", "user") else "AI"
-        try:
-            content = m.content if isinstance(m.content, str) else json.dumps(m.content, ensure_ascii=False)
-        except Exception:
-            content = str(m.content)
-        lines.append(f"{role}: {content}")
-    return "\n".join(lines)
-
 def prev_param(hist_obj: BaseChatMessageHistory):
     """ambil data terakhir dari AIMessage di history query"""
     jumlah = len(hist_obj.messages)
     if jumlah > 0:
         return hist_obj.messages[jumlah-2].content
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# stream_usage: token tetap tercatat di get_openai_callback saat jawaban di-stream (astream_chain)
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, stream_usage=True)
 
 contextualize_q_prompt = ChatPromptTemplate.from_messages([
         (   
@@ -100,18 +78,27 @@ contextualize_q_prompt = ChatPromptTemplate.from_messages([
         ("human", "{question}")
     ])
 
+history_context = contextualize_q_prompt | llm | StrOutputParser()
+
 def rewrite_chain(x):
     q = x['question']
     hist_chat = x.get("history_chat")  
-    history_context = contextualize_q_prompt | llm | StrOutputParser()
     hist_chain = history_context.invoke({"question":q, "history_chat":hist_chat})
-    
+    log_rewrite(hist_chat, hist_chain)
+    return hist_chain
+
+async def arewrite_chain(x):
+    q = x['question']
+    hist_chat = x.get("history_chat")  
+    hist_chain = await history_context.ainvoke({"question":q, "history_chat":hist_chat})
+    log_rewrite(hist_chat, hist_chain)
+    return hist_chain
+
+def log_rewrite(hist_chat, hist_chain):
     print("\n[italic bold green]Membaca histori chat sebelumnya... [/italic bold green]\n")
     print(f"[italic bold green]{hist_chat if hist_chat else 'Tidak ada history chat'}[/italic bold green]\n")
     print("[italic bold green]Membuat pertanyaan baru (history context)... [/italic bold green]\n")
     print(f"[italic bold green]hasil pertanyaan baru (history): {hist_chain} [italic bold green]\n" ) 
-    
-    return hist_chain
 
 classifier_prompt = ChatPromptTemplate.from_messages([
     (
@@ -135,11 +122,20 @@ classifier_prompt = ChatPromptTemplate.from_messages([
     ("human", "{rewrite_question}")
 ])
 
+classify_chain = classifier_prompt | llm | StrOutputParser()
+
 def classifier(x):
-    rewrite_question = x['rewrite_question'] 
-    chain = classifier_prompt | llm | StrOutputParser()
-    cls = chain.invoke({"rewrite_question":rewrite_question})
+    cls = classify_chain.invoke({"rewrite_question":x['rewrite_question']})
+    log_classification(cls)
+    return cls
 
+async def aclassifier(x):
+    cls = await classify_chain.ainvoke({"rewrite_question":x['rewrite_question']})
+    log_classification(cls)
+    return cls
+
+def log_classification(cls):
+    set_branch(cls)
     if(cls == "1"):
         classification  = "(1) Minta informasi properti, pencarian properti, rekomendasi properti."
     elif(cls == "2"):
@@ -151,8 +147,6 @@ def classifier(x):
     
     print("[italic bold green]Melakukan klasifikasi pertanyaan... [/italic bold green]\n")
     print("[italic bold green]Hasil Klasifikasi : " + classification + " [/italic bold green]\n")
-    
-    return cls
 
 greeting_prompt = ChatPromptTemplate.from_messages([
     (
@@ -228,18 +222,24 @@ json_convertion_prompt = ChatPromptTemplate.from_messages([
     ("human", "{rewrite_question}")
 ])
 
-json_convertion_chain = RunnableParallel(
-    json_query = json_convertion_prompt | llm | JsonOutputParser(),
-    rewrite_question = itemgetter("rewrite_question"),
-    question = itemgetter("question"),
-    session_id = itemgetter("session_id"),
-    history_query = itemgetter("history_query")
+json_convertion_chain = RunnableBranch(
+    (
+        # json_query sudah diisi oleh understand (mode single), tidak perlu LLM call lagi
+        lambda x: x.get("json_query") is not None,
+        RunnablePassthrough()
+    ),
+    RunnableParallel(
+        json_query = json_convertion_prompt | llm | JsonOutputParser(),
+        rewrite_question = itemgetter("rewrite_question"),
+        question = itemgetter("question"),
+        session_id = itemgetter("session_id"),
+        history_query = itemgetter("history_query")
+    )
 )
 
-def fetch_property(x):
-    url = FETCH_PROPERTY_URL
+def prepare_param(x):
+    """Ambil JSON filter, naikkan page bila filter sama dengan history query."""
     param = x['json_query']
-    rewrite_question = x['rewrite_question']
 
     def normalize(d: dict) -> dict:
         out = {}
@@ -264,66 +264,123 @@ def fetch_property(x):
             param["page"] = last_page + 1
 
     if len(param) > 0:
-        
         print("[italic bold green]Mengubah text menjadi JSON ... [/italic bold green]\n")
         print("[italic bold green]JSON : " + str(param) + " [/italic bold green]\n")
 
-        if param["is_hard_filter"] == "FALSE" or param["is_hard_filter"] == False:
-            print("[italic bold green]Melakukan pencairan dokumen vector [/italic bold green]\n")
-            vector_doc = fetch_relevant_docs(x)
-            documents = vector_doc
-            report_param["method"] = 'vector'
+    return param
 
-        else :
-            param["page"] = 1 if "page" not in param else param["page"]
-            param["paginate"] = 5
+def is_soft_filter(param):
+    return param["is_hard_filter"] == "FALSE" or param["is_hard_filter"] == False
 
-            print("[italic bold green]Mengambil data properti ... [/italic bold green]\n")
+def is_hard_constrained(p):
+    hard_keys = ["harga_min", "harga_max", "kamar_tidur", "jenis_properti", "luas_tanah", "luas_bangunan"]
+    return any(k in p for k in hard_keys)
 
-            filter_result = post_query(url,param,API_TOKEN)
-            documents = filter_result.text
-            report_param["method"] = 'mysql'
+def prepare_api_param(param):
+    param["page"] = 1 if "page" not in param else param["page"]
+    param["paginate"] = 5
 
-    def is_hard_constrained(p):
-        hard_keys = ["harga_min", "harga_max", "kamar_tidur", "jenis_properti", "luas_tanah", "luas_bangunan"]
-        return any(k in p for k in hard_keys)
+    print("[italic bold green]Mengambil data properti ... [/italic bold green]\n")
+    set_method('mysql')
+    return param
 
-    if len(param) == 0 or documents == "":
-        if is_hard_constrained(param):
-            # Pertahankan CPA: akui no-result
-            report_param["method"] = 'mysql'
-            return ""  # biar LLM jawab "tidak menemukan" (sesuai prompt)
-        else:
-            # Barulah vector fallback
-            print("[italic bold green]Melakukan pencairan dokumen vector [/italic bold green]\n")
-            vector_doc = fetch_relevant_docs(x)
-            documents = vector_doc
-            report_param["method"] = 'vector'
-        
+def log_vector_search():
+    print("[italic bold green]Melakukan pencairan dokumen vector [/italic bold green]\n")
+    set_method('vector')
 
+def store_property_result(x, param, documents):
     print(f"[italic bold green]{'Menemukan data properti...' if documents != '' else 'Tidak menemukan data properti'}[/italic bold green]\n")
     print("[italic bold green]Menyiapkan jawaban kepada user ... [/italic bold green]\n")
 
     query_history = get_query_history(session_id=x['session_id'])
     query_history.add_ai_message(str(param))
-    query_history.add_user_message(rewrite_question)
+    query_history.add_user_message(x['rewrite_question'])
 
     # list = doc_to_json(filter_result.text)
     # print(list)
-    report_param["doc"] = documents
+    set_doc(documents)
 
     return documents
 
+def fetch_property(x):
+    param = prepare_param(x)
+    documents = ""
 
+    if len(param) > 0:
+        if is_soft_filter(param):
+            log_vector_search()
+            documents = fetch_relevant_docs(x)
+        else :
+            documents = query_listing(prepare_api_param(param))
+            if documents is not None:
+                documents = context_from_text(documents, x)
+            else:
+                # /query_listing gagal atau circuit terbuka → vector search (tetap dengan filter metadata)
+                log_vector_search()
+                documents = fetch_relevant_docs(x)
 
-def fetch_relevant_docs(x):
+    if len(param) == 0 or documents == "":
+        if is_hard_constrained(param):
+            # Pertahankan CPA: akui no-result
+            set_method('mysql')
+            return ""  # biar LLM jawab "tidak menemukan" (sesuai prompt)
+        # Barulah vector fallback
+        log_vector_search()
+        documents = fetch_relevant_docs(x)
 
-    vectordb = Chroma(
-        persist_directory=PERSIST_DIR,
-        collection_name=COLLECTION_NAME,
-        embedding_function=embeddings,
-    )
+    return store_property_result(x, param, documents)
+
+async def afetch_property(x):
+    param = prepare_param(x)
+    documents = ""
 
+    if len(param) > 0:
+        if is_soft_filter(param):
+            log_vector_search()
+            documents = await afetch_relevant_docs(x)
+        else :
+            documents = await aquery_listing(prepare_api_param(param))
+            if documents is not None:
+                documents = context_from_text(documents, x)
+            else:
+                # /query_listing gagal atau circuit terbuka → vector search (tetap dengan filter metadata)
+                log_vector_search()
+                documents = await afetch_relevant_docs(x)
+
+    if len(param) == 0 or documents == "":
+        if is_hard_constrained(param):
+            # Pertahankan CPA: akui no-result
+            set_method('mysql')
+            return ""  # biar LLM jawab "tidak menemukan" (sesuai prompt)
+        # Barulah vector fallback
+        log_vector_search()
+        documents = await afetch_relevant_docs(x)
+
+    return await asyncio.to_thread(store_property_result, x, param, documents)
+
+
+def join_page_contents(relevant_docs: Iterable, limit: int = 15 ) -> str:
+    """
+    Gabungkan field `page_content` dari setiap doc jadi satu string,
+    dipisah dengan 2 newline.
+    - Abaikan doc yang tidak punya/empty `page_content`.
+    - Trim spasi di awal/akhir tiap potongan.
+    - Ambil maksimal `limit` dokumen pertama.
+    """
+    chunks = []
+    for doc in islice(relevant_docs, limit):
+        # dukung objek mirip LangChain Document (punya .page_content)
+        content = getattr(doc, "page_content", None)
+        if content:
+            text = str(content).strip()
+            if text:
+                chunks.append(text)
+    return "\n\n".join(chunks)
+
+# koleksi Chroma bersama per proses; tidak dibuka ulang di setiap pencarian
+vector_store = get_manager()
+
+def get_retriever():
     # retriever =vectordb.as_retriever(
     #     search_type="similarity_score_threshold",
     #     search_kwargs={
@@ -333,42 +390,34 @@ def fetch_relevant_docs(x):
     #     },
     # )
 
-    retriever =vectordb.as_retriever(
-        search_type="similarity",
-        search_kwargs={
-            "k": 10, 
-        },
-    )
-
-    def join_page_contents(relevant_docs: Iterable, limit: int = 15 ) -> str:
-        """
-        Gabungkan field `page_content` dari setiap doc jadi satu string,
-        dipisah dengan 2 newline.
-        - Abaikan doc yang tidak punya/empty `page_content`.
-        - Trim spasi di awal/akhir tiap potongan.
-        - Ambil maksimal `limit` dokumen pertama.
-        """
-        chunks = []
-        for doc in islice(relevant_docs, limit):
-            # dukung objek mirip LangChain Document (punya .page_content)
-            content = getattr(doc, "page_content", None)
-            if content:
-                text = str(content).strip()
-                if text:
-                    chunks.append(text)
-        return "\n\n".join(chunks)
-    
-    query = x['rewrite_question']
-    question = x['question']
+    return vector_store.as_retriever(search_type="similarity", k=10)
 
+def fetch_relevant_docs(x):
     print("[italic bold green]Mencari document yang sesuai ... [/italic bold green]\n")
-    relevant_docs = retriever.invoke(query)
+    # batasan di json_query (harga, kamar tidur, luas, jenis) dipakai sebagai filter metadata,
+    # hasil dense digabung dengan BM25 supaya nama komplek / fasilitas yang persis tetap terangkat
+    relevant_docs = hybrid_search(vector_store, x['rewrite_question'], x.get('json_query'))
+    if RERANK:
+        relevant_docs = reranker.rerank(x['rewrite_question'], relevant_docs)
+    return docs_to_property(x, relevant_docs)
+
+async def afetch_relevant_docs(x):
+    print("[italic bold green]Mencari document yang sesuai ... [/italic bold green]\n")
+    relevant_docs = await ahybrid_search(vector_store, x['rewrite_question'], x.get('json_query'))
+    if RERANK:
+        relevant_docs = await reranker.arerank(x['rewrite_question'], relevant_docs)
+    return docs_to_property(x, relevant_docs)
+
+def docs_to_property(x, relevant_docs):
     count = len(relevant_docs)
 
     print(f"[italic bold green]Menemukan {count} document yang sesuai ... [/italic bold green]\n")
-    data_property = join_page_contents(relevant_docs, limit=15)
+    if LISTING_CONTEXT == "compact":
+        data_property = context_from_docs(relevant_docs, x)
+    else:
+        data_property = join_page_contents(relevant_docs, limit=15)
 
-    report_param["doc"] = data_property
+    set_doc(data_property)
 
     print(f"[italic bold green]{'Menemukan document properti...' if count > 0 else 'Tidak menemukan document properti'}[/italic bold green]\n")
     print(f"[italic bold green]Document : \n{data_property} [/italic bold green]\n")
@@ -403,10 +452,9 @@ property_finder_prompt = ChatPromptTemplate.from_messages([
 ]) 
 
 
-fetch_property_chain = RunnableParallel(
-    data_property = json_convertion_chain | RunnableLambda(fetch_property) ,
-    question = itemgetter("question"),
-    session_id = itemgetter("session_id")
+# json_query ikut diteruskan (sudah dilengkapi page/paginate oleh prepare_param) untuk key cache jawaban
+fetch_property_chain = timed("json", json_convertion_chain) | RunnablePassthrough.assign(
+    data_property = timed("retrieval", RunnableLambda(fetch_property, afunc=afetch_property))
 )
 
 fallback_prompt = ChatPromptTemplate.from_messages([
@@ -441,6 +489,29 @@ fallback_prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}")
 ]) 
 
+def answer_query(x):
+    # hasil pencarian vector bergantung pada pertanyaan, bukan hanya filter
+    return x['rewrite_question'] if current().method == 'vector' else None
+
+def answer_key(x):
+    return x['json_query'], answer_query(x)
+
+def cached_answer(x):
+    return answer_cache.get_answer(*answer_key(x))
+
+if ANSWER_CACHE_ANSWERS:
+    # filter + page sama → pakai ulang jawaban sebelumnya (cache dicek sekali, hasilnya dibawa di input);
+    # jawaban baru tetap di-stream per chunk dan disimpan setelah selesai
+    property_answer_chain = RunnablePassthrough.assign(cached_answer = RunnableLambda(cached_answer)) | RunnableBranch(
+        (
+            lambda x: x['cached_answer'] is not None,
+            itemgetter('cached_answer')
+        ),
+        remembering(property_finder_prompt | llm | StrOutputParser(), answer_key)
+    )
+else:
+    property_answer_chain = property_finder_prompt | llm | StrOutputParser()
+
 classifier_branches = RunnableBranch(
     (
         lambda x: x['cls'] == "3",
@@ -449,9 +520,7 @@ classifier_branches = RunnableBranch(
     (
         lambda x: x['cls'] == "1",
         fetch_property_chain 
-        | property_finder_prompt 
-        | llm
-        | StrOutputParser()
+        | timed_stream("answer", property_answer_chain)
     ),
     (
         lambda x: x['cls'] == "2",
@@ -461,7 +530,7 @@ classifier_branches = RunnableBranch(
 )
 
 classifier_chain = RunnableParallel(
-    cls = RunnableLambda(classifier),
+    cls = timed("classify", RunnableLambda(classifier, afunc=aclassifier)),
     rewrite_question = itemgetter("rewrite_question"),
     question = itemgetter("question"),
     history_chat = itemgetter("history_chat"),
@@ -472,7 +541,7 @@ classifier_chain = RunnableParallel(
 )
 
 rewrite_context_chain = RunnableParallel(
-    rewrite_question = RunnableLambda(rewrite_chain),
+    rewrite_question = timed("rewrite", RunnableLambda(rewrite_chain, afunc=arewrite_chain)),
     question = itemgetter("question"),
     history_chat = itemgetter("history_chat"),
     history_query = itemgetter("history_query"),
@@ -483,35 +552,67 @@ rewrite_context_chain = RunnableParallel(
 
 chain = rewrite_context_chain | classifier_chain | classifier_branches
 
-def build_chain(data):
-    start = time.perf_counter()
+# rewrite + klasifikasi (+ JSON filter) dalam 1 structured call, pilih lewat UNDERSTAND_MODE=single
+understand_chain = timed("understand", understand_runnable(llm, json_convertion_prompt)) | classifier_branches
+
+def next_page_input(x):
+    """Pakai ulang filter terakhir (tanpa page) supaya fetch_property menaikkan page-nya."""
+    prev = ast.literal_eval(x['history_query'])
+    prev.pop("page", None)
+    prev.pop("paginate", None)
+    query_history = get_query_history(x['session_id'])
+    print("[italic bold green]Fast path: menampilkan pilihan berikutnya dari filter sebelumnya ... [/italic bold green]\n")
+    return {**x, "json_query": prev, "rewrite_question": query_history.messages[-1].content}
+
+# "ada yang lain?" → langsung page+1 tanpa rewrite/classify/JSON LLM call
+next_page_chain = (
+    RunnableLambda(next_page_input)
+    | fetch_property_chain
+    | timed_stream("answer", property_answer_chain)
+)
+
+def select_chain(data, inputs):
+    route = inputs["fast_path"]
+    if route == fast_path.GREETING:
+        set_branch("fast_greeting")
+        return greeting_chain
+    if route == fast_path.MORE:
+        set_branch("fast_more")
+        return next_page_chain
+    return understand_chain if resolve_mode(data) == "single" else chain
+
+def chain_input(data):
+    """Susun input chain dari payload (history chat + history query per session)."""
     session_id = data['session_id']
-    question = data['question']
     history = get_history(session_id)
-    last_history = serialize_history(history,10)
-    history_query = get_query_history(session_id)
-    last_history_query = prev_param(history_query)
-
-    with get_openai_callback() as cb:
-        answer = chain.invoke({
-            "session_id": session_id,
-            "question": question,
-            "history_chat": last_history,
-            "history_query": last_history_query,
-            "time_greeting": jakarta_time_greeting(),
-            "user_name": data['user_name']
-        })
+    last_history_query = prev_param(get_query_history(session_id))
+    return {
+        "session_id": session_id,
+        "question": data['question'],
+        "history_chat": render_history(history),
+        "history_query": last_history_query,
+        "time_greeting": jakarta_time_greeting(),
+        "user_name": data['user_name'],
+        "fast_path": fast_path.route(data['question'], can_paginate=bool(last_history_query and "page" in last_history_query)),
+    }
 
+def finish_turn(data, answer, cb, start):
+    """Simpan percakapan ke history, cetak rincian token, dan kembalikan record chat_history."""
+    session_id = data['session_id']
+    question = data['question']
+    history = get_history(session_id)
     history.add_user_message(question)
     history.add_ai_message(answer)
 
     elapsed_ms = (time.perf_counter() - start) * 1000
+    ctx = current()
+    ctx.add_timing("total", elapsed_ms)
 
     store_data = {
         "chat_session_id" : session_id,
         "human" : question,
         "ai" : answer,
-        "method" : 'mysql',
+        "method" : ctx.method or 'mysql',
         "input_token" : cb.prompt_tokens,
         "output_token" : cb.completion_tokens,
         "total_token" : cb.total_tokens,
@@ -520,8 +621,7 @@ def build_chain(data):
         "cost_usd" : cb.total_cost,
         "cost_idr" : cb.total_cost * 17000,
     }
-    
-    post_query(STORE_HISTORY_URL,store_data,API_TOKEN)
+    ctx.tokens = {k: store_data[k] for k in ("input_token", "output_token", "total_token", "cost_usd")}
 
     print("[italic bold blue]\n======== RINCIAN PEMAKAIAN TOKEN =============[/italic bold blue]")
     print(f"[italic bold blue]Total Token : {cb.total_tokens}[/italic bold blue]")
@@ -531,60 +631,91 @@ def build_chain(data):
     print(f"[italic bold blue]Cost (USD) : {round(cb.total_cost,4)}[/italic bold blue]")
     print(f"[italic bold blue]Cost (IDR) : {round((cb.total_cost * 17000),2)}[/italic bold blue]")
     print(f"[italic bold blue]Total response time: {elapsed_ms:.1f} ms[/italic bold blue]")
+    if ctx.history:
+        print(f"[italic bold blue]{history_report(ctx.history)}[/italic bold blue]")
+    print(f"[italic bold blue]Tahap (ms) : {', '.join(f'{k} {v:.0f}' for k, v in ctx.timings.items())}[/italic bold blue]")
+    fp = fast_path.stats()
+    print(f"[italic bold blue]Fast path hit rate : {fp['hits']}/{fp['total']} ({fp['hit_rate']:.0%})[/italic bold blue]")
+    ql = http.metrics().get("query_listing")
+    if ql:
+        print(f"[italic bold blue]query_listing : p50 {ql['p50_ms']} ms, p95 {ql['p95_ms']} ms, reuse {ql['connection_reuse']}, circuit {ql['circuit']}[/italic bold blue]")
+    ac = answer_cache.stats()
+    print(f"[italic bold blue]Search cache : hit {ac['hits']} / miss {ac['misses']} ({ac['hit_rate']:.0%}), answer hit {ac['answer_hits']}[/italic bold blue]")
+    ec = vector_store.embedding_stats()
+    if ec:
+        print(f"[italic bold blue]Embedding cache : hit {ec['hits'] + ec['disk_hits']} / miss {ec['misses']} ({ec['hit_rate']:.0%})[/italic bold blue]")
     print("[italic bold blue]===============================================[/italic bold blue]\n")
-    
+
+    metrics.observe_turn("hybrid", ctx, store_data)
+    return store_data
+
+def build_chain(data):
+    start = time.perf_counter()
+
+    with request_scope(data['session_id']), trace_scope("api_vector_rval", data['session_id']):
+        inputs = chain_input(data)
+        with get_openai_callback() as cb:
+            answer = select_chain(data, inputs).invoke(inputs)
+
+        store_data = finish_turn(data, answer, cb, start)
+    # dikirim di background; jawaban user tidak menunggu endpoint chat_history
+    history_writer.submit(store_data)
 
     return answer
 
+async def abuild_chain(data):
+    """Versi async build_chain untuk FastAPI: semua LLM call & HTTP call non-blocking."""
+    start = time.perf_counter()
+
+    with request_scope(data['session_id']), trace_scope("api_vector_rval", data['session_id']):
+        # history sqlite (SESSION_DB) dibaca/ditulis di thread, bukan di event loop
+        inputs = await asyncio.to_thread(chain_input, data)
+        with get_openai_callback() as cb:
+            answer = await select_chain(data, inputs).ainvoke(inputs)
+
+        store_data = await asyncio.to_thread(finish_turn, data, answer, cb, start)
+    # dikirim di background; jawaban user tidak menunggu endpoint chat_history
+    history_writer.submit(store_data)
+
+    return answer
+
+async def astream_chain(data):
+    """
+    Versi streaming abuild_chain: yield potongan jawaban akhir selama LLM menulis.
+    History & chat_history disimpan setelah stream selesai (jawaban lengkap).
+    """
+    start = time.perf_counter()
+
+    with request_scope(data['session_id']), trace_scope("api_vector_rval", data['session_id']):
+        # history sqlite (SESSION_DB) dibaca/ditulis di thread, bukan di event loop
+        inputs = await asyncio.to_thread(chain_input, data)
+        chunks = []
+        with get_openai_callback() as cb:
+            async for chunk in select_chain(data, inputs).astream(inputs):
+                chunks.append(chunk)
+                yield chunk
+
+        store_data = await asyncio.to_thread(finish_turn, data, "".join(chunks), cb, start)
+    history_writer.submit(store_data)
+
 def build_chain_test(data):
     start = time.perf_counter()
-    session_id = data['session_id']
-    question = data['question']
-    history = get_history(session_id)
-    last_history = serialize_history(history,10)
-    history_query = get_query_history(session_id)
-    last_history_query = prev_param(history_query)
-
-    with get_openai_callback() as cb:
-        answer = chain.invoke({
-            "session_id": session_id,
-            "question": question,
-            "history_chat": last_history,
-            "history_query": last_history_query,
-            "time_greeting": jakarta_time_greeting(),
-            "user_name": data['user_name']
-        })
 
-    
-    history.add_user_message(question)
-    history.add_ai_message(answer)
+    with request_scope(data['session_id']) as ctx, trace_scope("api_vector_rval", data['session_id']):
+        inputs = chain_input(data)
+        with get_openai_callback() as cb:
+            answer = select_chain(data, inputs).invoke(inputs)
 
-    elapsed_ms = (time.perf_counter() - start) * 1000
+        store_data = finish_turn(data, answer, cb, start)
 
-    report_param["chat_session_id"] = session_id
-    report_param["human"] = question
-    report_param["ai"] = answer
-    report_param["gold"] = data['gold'] 
- 
-    report_param["input_token"] = cb.prompt_tokens
-    report_param["output_token"] = cb.completion_tokens
-    report_param["total_token"] = cb.total_tokens
-    report_param["response_count"] = cb.successful_requests
-    report_param["response_time"] = elapsed_ms
-    report_param["cost_usd"] = cb.total_cost
-    report_param["cost_idr"] = cb.total_cost * 17000
+    # record milik request ini saja (aman untuk evaluasi paralel)
+    record = ctx.report()
+    record.update(store_data)
+    record["gold"] = data['gold'] 
+    record["understand"] = resolve_mode(data)
+    record["fast_path"] = inputs["fast_path"]
 
-    print("[italic bold blue]\n======== RINCIAN PEMAKAIAN TOKEN =============[/italic bold blue]")
-    print(f"[italic bold blue]Total Token : {cb.total_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Input Token : {cb.prompt_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Output Token : {cb.completion_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Request Count : {cb.successful_requests}[/italic bold blue]")
-    print(f"[italic bold blue]Cost (USD) : {round(cb.total_cost,4)}[/italic bold blue]")
-    print(f"[italic bold blue]Cost (IDR) : {round((cb.total_cost * 17000),2)}[/italic bold blue]")
-    print(f"[italic bold blue]Total response time: {elapsed_ms:.1f} ms[/italic bold blue]")
-    print("[italic bold blue]===============================================[/italic bold blue]\n")
-    
-    return report_param
+    return record
 
 
 test_prompt = ChatPromptTemplate.from_messages([
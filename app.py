@@ -6,13 +6,22 @@ from pydantic import BaseModel, Field, ConfigDict
 load_dotenv()
 
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import time
 import logging
 from pydantic import BaseModel
 
-from api_rval import build_chain as build_chain_api
-from vector_rval import build_chain as build_chain_vector
-from api_vector_rval import build_chain as build_chain_hybrid
+from api_rval import abuild_chain as build_chain_api
+from vector_rval import abuild_chain as build_chain_vector
+from api_vector_rval import abuild_chain as build_chain_hybrid
+from api_rval import astream_chain as stream_chain_api
+from vector_rval import astream_chain as stream_chain_vector
+from api_vector_rval import astream_chain as stream_chain_hybrid
+from streaming import detached, sse_event
+from reranker import RERANK, reranker
+from history_writer import history_writer
+import tracing
+import metrics
 
 
 
@@ -42,12 +51,37 @@ async def timing_middleware(request: Request, call_next):
                 request.method, request.url.path, response.status_code, ms)
     return response
 
+@app.on_event("startup")
+def start_history_writer():
+    # kirim ulang chat history yang tertunda di journal dari run sebelumnya
+    history_writer.start()
+    if RERANK:
+        # muat cross-encoder sebelum menerima request; gagal muat = startup gagal (bukan rerank diam-diam mati)
+        reranker.load()
+
 @app.get("/health")
 def health():
     return {"status": "Chatbot Ready"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/traces")
+def debug_traces(limit: int = 20, session_id: str | None = None):
+    """Ringkasan trace terakhir (durasi total & jumlah span), terbaru dulu."""
+    return {"traces": tracing.buffer.recent(limit, session_id)}
+
+@app.get("/debug/traces/{trace_id}")
+def debug_trace(trace_id: str):
+    """Semua span 1 trace: runnable, LLM call, retriever/Chroma, HTTP call."""
+    trace = tracing.buffer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="trace tidak ditemukan")
+    return trace
+
 @app.post("/question_hook")
-def question_hook(payload: MessageInbound):
+async def question_hook(payload: MessageInbound):
 
     # Pilih fungsi build_chain sesuai argumen
     if payload.method == "api":
@@ -58,12 +92,13 @@ def question_hook(payload: MessageInbound):
         build_chain = build_chain_hybrid
     
     try:
-        reply = build_chain({
+        reply = await build_chain({
             "question" : payload.question, 
             "session_id" : payload.sender_id,
             "user_name" : payload.sender_name,
         })   
     except Exception as e:
+        metrics.turn_errors.inc(pipeline=payload.method or "hybrid")
         # Jangan bocorkan error lengkap ke user
         raise HTTPException(status_code=500, detail=f"RAG error: {type(e).__name__}: {e}") from e
 
@@ -75,3 +110,37 @@ def question_hook(payload: MessageInbound):
     }
 
     return response
+
+@app.post("/question_hook/stream")
+async def question_hook_stream(payload: MessageInbound):
+    """
+    Sama dengan /question_hook, tapi jawaban dikirim bertahap lewat Server-Sent Events:
+    event `token` per potongan jawaban, lalu `done` berisi jawaban lengkap (atau `error`).
+    """
+    method = payload.method if payload.method else "hybrid"
+    if payload.method == "api":
+        stream_chain = stream_chain_api
+    elif payload.method == "vector":
+        stream_chain = stream_chain_vector
+    else:
+        stream_chain = stream_chain_hybrid
+
+    async def events():
+        chunks = []
+        try:
+            async for chunk in detached(stream_chain({
+                "question" : payload.question,
+                "session_id" : payload.sender_id,
+                "user_name" : payload.sender_name,
+            })):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+        except Exception as e:
+            metrics.turn_errors.inc(pipeline=method)
+            # Jangan bocorkan error lengkap ke user
+            yield sse_event("error", {"code": 500, "detail": f"RAG error: {type(e).__name__}: {e}"})
+            return
+        yield sse_event("done", {"code": 200, "status": "ok", "method": method, "answer": "".join(chunks)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
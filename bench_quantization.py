@@ -0,0 +1,89 @@
+#bench_quantization.py
+#laporan recall@10 vs memori untuk mode penyimpanan index numpy (float32 / float16 / int8 / PQ, dengan & tanpa
+#rescoring) memakai query test_question.py; acuan = top-k float32 brute force dengan filter yang sama
+import argparse
+import time
+
+import numpy as np
+
+from numpy_index import NumpyVectorIndex, compress, pq_subspaces
+from test_question import question
+from vector_filter import build_where
+from vector_store import PERSIST_DIR, COLLECTION_NAME, get_manager
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Recall@k vs memori untuk index numpy terkompresi")
+    p.add_argument("--persist-dir", default=PERSIST_DIR)
+    p.add_argument("--collection", default=COLLECTION_NAME)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--rescore", type=int, default=4, help="Faktor shortlist (k x faktor) untuk baris rescoring")
+    p.add_argument("--catalog-size", type=int, default=50_000, help="Jumlah listing untuk proyeksi memori")
+    return p.parse_args()
+
+def variants(base: NumpyVectorIndex, rescore: int) -> list:
+    """(nama, index, faktor rescore). Index berbagi metadata dengan base, hanya penyimpanan vektornya berbeda."""
+    full32 = np.asarray(base.vectors, dtype=np.float32)
+    full16 = full32.astype(np.float16)
+    dim = full32.shape[1]
+
+    def make(vectors, **codes):
+        return NumpyVectorIndex(vectors, base.numeric, base.category, base.doc_offsets, base.ids, base.info, base.docs_blob, **codes)
+
+    out = [("float32", make(full32), 0), ("float16", make(full16), 0)]
+    int8 = compress(full32, "int8")
+    out += [("int8", make(full32, **int8), 0), (f"int8 + rescore x{rescore}", make(full32, **int8), rescore)]
+    for sub_dim in (8, 16, 32):
+        if dim % sub_dim:
+            continue
+        m = pq_subspaces(dim, dim // sub_dim)
+        started = time.perf_counter()
+        pq = compress(full32, "pq", m)
+        print(f"  PQ m={m}: training {time.perf_counter() - started:.1f} s")
+        out += [(f"pq m={m}", make(full32, **pq), 0), (f"pq m={m} + rescore x{rescore}", make(full32, **pq), rescore)]
+    return out
+
+def evaluate(index: NumpyVectorIndex, rescore: int, vectors: np.ndarray, wheres: list, truth: list, k: int) -> tuple:
+    recalls, latencies = [], []
+    for v, where, expected in zip(vectors, wheres, truth):
+        started = time.perf_counter()
+        got = {row for row, _ in index.search(v, k, where, rescore=rescore)}
+        latencies.append((time.perf_counter() - started) * 1000)
+        if expected:
+            recalls.append(len(got & expected) / len(expected))
+    return float(np.mean(recalls)), float(np.percentile(latencies, 50))
+
+def main():
+    args = parse_args()
+    manager = get_manager(args.persist_dir, args.collection)
+    store = manager.get()
+    backend = manager.backend or "custom"
+    base, _ = NumpyVectorIndex.from_collection(store._collection, backend, backend, dtype="float32", quant="none")
+    print(f"Koleksi {args.collection}: {base.n_docs} listing, dim {base.info['dim']}")
+
+    questions = question()
+    vectors = np.array([manager.embed_query(q["q"]) for q in questions], dtype=np.float32)
+    runs = {"tanpa filter": [None] * len(questions), "filter gold": [build_where(q.get("gold")) for q in questions]}
+    truth = {name: [{row for row, _ in base.search(v, args.k, w)} for v, w in zip(vectors, wheres)]
+             for name, wheres in runs.items()}
+
+    rows = []
+    for name, index, rescore in variants(base, args.rescore):
+        mem = index.memory_bytes()
+        # disk: vektor penuh tetap disimpan untuk rescoring (float16) + kode per listing
+        disk = mem["full"] / base.n_docs + (mem["per_row"] if index.quantized else 0)
+        results = [evaluate(index, rescore, vectors, wheres, truth[run], args.k) for run, wheres in runs.items()]
+        rows.append((name, mem, disk, results))
+
+    print(f"\n{len(questions)} query test_question.py, recall@{args.k} terhadap float32 brute force")
+    print(f"{'mode':<24} {'B/listing':>10} {'MB @' + format(args.catalog_size, ','):>12} {'disk B/listing':>15} "
+          + " ".join(f"{'recall ' + run:>22} {'p50':>8}" for run in runs))
+    for name, mem, disk, results in rows:
+        per_listing = mem["per_row"]
+        projected = (mem["per_row"] * args.catalog_size + mem["fixed"]) / 1024 / 1024
+        cols = " ".join(f"{recall:>22.3f} {p50:>5.2f} ms" for recall, p50 in results)
+        print(f"{name:<24} {per_listing:>10.0f} {projected:>12.1f} {disk:>15.0f} {cols}")
+    print("\nB/listing = byte yang dipindai per listing setiap query; MB termasuk skala int8 / codebook PQ. "
+          "Rescoring membaca vektor float16 penuh hanya untuk shortlist (mmap).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#bench_vector_index.py
+#bandingkan index numpy (brute force, mmap) dengan Chroma untuk query test_question.py (filter dari gold):
+#cold start (buka index + query pertama), latency per query (p50 / p95) dan RSS; tiap engine di proses terpisah
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+def rss_mb() -> float:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+        # Linux: ru_maxrss dalam KB (puncak, bukan saat ini)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_engine(engine: str, persist_dir: str, collection: str, queries_dir: str, k: int, repeat: int) -> dict:
+    """
+    Dijalankan di proses anak: ukur 1 engine saja supaya RSS tidak tercampur.
+    Proses anak hanya mengimpor numpy + engine yang diukur (modul pipeline tidak ikut terhitung).
+    """
+    vectors = np.load(os.path.join(queries_dir, "vectors.npy"))
+    with open(os.path.join(queries_dir, "wheres.json"), encoding="utf-8") as f:
+        wheres = json.load(f)
+    base_rss = rss_mb()
+    started = time.perf_counter()
+    if engine == "chroma":
+        from langchain_chroma import Chroma
+        store = Chroma(persist_directory=persist_dir, collection_name=collection)
+        search = lambda v, where: store.similarity_search_by_vector(v.tolist(), k=k, filter=where)
+    else:
+        from numpy_index import NumpyVectorIndex, index_dir
+        index = NumpyVectorIndex.load(index_dir(persist_dir, collection))
+        search = lambda v, where: index.search_docs(v, k, where)
+    search(vectors[0], wheres[0])
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    latencies, results = [], []
+    for _ in range(repeat):
+        for v, where in zip(vectors, wheres):
+            t = time.perf_counter()
+            docs = search(v, where)
+            latencies.append((time.perf_counter() - t) * 1000)
+            if len(results) < len(vectors):
+                results.append([d.id for d in docs])
+    return {
+        "engine": engine,
+        "cold_start_ms": cold_ms,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": rss_mb(),
+        "rss_delta_mb": rss_mb() - base_rss,
+        "results": results,
+    }
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark index numpy vs Chroma (latency & RSS)")
+    p.add_argument("--persist-dir", default=os.getenv("PERSIST_DIR", "chroma/realestate"))
+    p.add_argument("--collection", default=os.getenv("COLLECTION_NAME", "realestate"))
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--repeat", type=int, default=20, help="Berapa kali seluruh query diulang")
+    p.add_argument("--no-filter", action="store_true", help="Abaikan filter gold (similarity murni)")
+    p.add_argument("--engine", choices=("chroma", "numpy"), help=argparse.SUPPRESS)
+    p.add_argument("--queries", help=argparse.SUPPRESS)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.engine:
+        out = run_engine(args.engine, args.persist_dir, args.collection, args.queries, args.k, args.repeat)
+        print(json.dumps(out))
+        return
+
+    from test_question import question
+    from vector_filter import build_where
+    from vector_store import get_manager
+
+    questions = question()
+    wheres = [None if args.no_filter else build_where(q.get("gold")) for q in questions]
+    # embed query sekali di proses induk (embedding yang sama dengan koleksi), hasilnya dipakai kedua engine
+    manager = get_manager(args.persist_dir, args.collection)
+    vectors = np.array([manager.embed_query(q["q"]) for q in questions], dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        np.save(os.path.join(tmp, "vectors.npy"), vectors)
+        with open(os.path.join(tmp, "wheres.json"), "w", encoding="utf-8") as f:
+            json.dump(wheres, f)
+        reports = {}
+        for engine in ("chroma", "numpy"):
+            cmd = [sys.executable, __file__, "--engine", engine, "--queries", tmp,
+                   "--persist-dir", args.persist_dir, "--collection", args.collection,
+                   "--k", str(args.k), "--repeat", str(args.repeat)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            reports[engine] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    overlap = [len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(reports["chroma"]["results"], reports["numpy"]["results"])]
+    print(f"{len(questions)} query x {args.repeat}, k={args.k}, filter={'tidak' if args.no_filter else 'gold'}")
+    print(f"{'engine':<8} {'cold start':>12} {'p50':>10} {'p95':>10} {'RSS':>10} {'ΔRSS':>10}")
+    for r in reports.values():
+        print(f"{r['engine']:<8} {r['cold_start_ms']:>9.1f} ms {r['p50_ms']:>7.2f} ms {r['p95_ms']:>7.2f} ms "
+              f"{r['rss_mb']:>7.1f} MB {r['rss_delta_mb']:>7.1f} MB")
+    print(f"overlap top-{args.k} numpy vs Chroma: {np.mean(overlap):.1%}")
+
+if __name__ == "__main__":
+    main()
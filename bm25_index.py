@@ -0,0 +1,122 @@
+#bm25_index.py
+#index BM25 (sparse / leksikal) dari page_content listing: dibangun oleh ingest.py, disimpan sebagai .npy
+#di samping koleksi Chroma dan di-memory-map saat serving; digabung dengan hasil dense lewat RRF
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from index_files import MARKER_FILE, IndexCache, atomic_dir
+from listing_engine import tokenize
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def index_dir(persist_dir: str, collection: str) -> Path:
+    return Path(persist_dir) / f"bm25-{collection}"
+
+class BM25Index:
+    """
+    Posting list kolumnar (mirip CSR):
+    - terms    : kosakata terurut (dicari dengan searchsorted),
+    - offsets  : posting term ke-i ada di docs[offsets[i]:offsets[i+1]],
+    - docs/tfs : nomor dokumen & frekuensi term,
+    - doc_len  : panjang dokumen (token).
+    """
+
+    FILES = ("terms", "offsets", "docs", "tfs", "doc_len")
+
+    def __init__(self, terms, offsets, docs, tfs, doc_len, ids: list, k1: float = BM25_K1, b: float = BM25_B):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(ids)
+        self.avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+        # bagian penyebut BM25 yang hanya bergantung pada panjang dokumen
+        self.norm = (k1 * (1 - b + b * doc_len / self.avgdl)).astype(np.float32) if self.n_docs else doc_len
+
+    @classmethod
+    def build(cls, texts: list, ids: list) -> "BM25Index":
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[d] = len(tokens)
+            counts = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for t, c in counts.items():
+                postings.setdefault(t, []).append((d, c))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, t in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[t])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, t in enumerate(terms):
+            pl = postings[t]
+            docs[offsets[i]:offsets[i + 1]] = [d for d, _ in pl]
+            tfs[offsets[i]:offsets[i + 1]] = [c for _, c in pl]
+        return cls(np.array(terms, dtype=str), offsets, docs, tfs, doc_len, list(ids))
+
+    def save(self, path: Path):
+        with atomic_dir(path) as tmp:
+            for name in self.FILES:
+                np.save(tmp / f"{name}.npy", getattr(self, name))
+            (tmp / MARKER_FILE).write_text(json.dumps(self.ids), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        path = Path(path)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in cls.FILES}
+        ids = json.loads((path / MARKER_FILE).read_text(encoding="utf-8"))
+        # terms kecil & sering di-searchsorted: simpan di memori; posting list tetap mmap
+        arrays["terms"] = np.array(arrays["terms"])
+        arrays["doc_len"] = np.array(arrays["doc_len"])
+        return cls(ids=ids, **arrays)
+
+    def search(self, query: str, k: int = 10) -> list:
+        """[(doc_id, skor)] terurut skor tertinggi; kosong bila tidak ada term yang cocok."""
+        if not self.n_docs:
+            return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        hit = False
+        for term in set(tokenize(query)):
+            i = int(np.searchsorted(self.terms, term))
+            if i >= len(self.terms) or self.terms[i] != term:
+                continue
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end]
+            df = end - start
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[docs])
+            hit = True
+        if not hit:
+            return []
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[d], float(scores[d])) for d in top if scores[d] > 0]
+
+def rrf_fuse(rankings: list, k: int = RRF_K) -> list:
+    """Reciprocal rank fusion: skor(id) = Σ 1 / (k + rank). rankings = list berisi list id terurut."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+_indexes = IndexCache(BM25Index.load)
+
+def get_index(persist_dir: str, collection: str, check_interval: float = 2.0) -> BM25Index | None:
+    """Index bersama per proses; dimuat ulang bila ingest menulis index baru. None bila belum dibangun."""
+    return _indexes.get(index_dir(persist_dir, collection), check_interval)
@@ -0,0 +1,148 @@
+#embedding_batcher.py
+#gabungkan embed_query yang datang hampir bersamaan (beberapa ms) menjadi 1 panggilan embedding:
+#1 request embed_documents ke OpenAI, atau 1 forward pass model lokal (e5 / e5-onnx)
+import asyncio
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH = os.getenv("EMBED_BATCH", "1") == "1"
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))   # batch yang boleh berjalan bersamaan (remote)
+
+_batchers = weakref.WeakSet()
+
+def query_batch_fn(embeddings: Embeddings):
+    """
+    Fungsi list[str] → list[vektor query] untuk 1 panggilan, atau None bila backend tidak bisa di-batch.
+    - model lokal e5: embed_queries (prefix "query: ", 1 forward pass),
+    - OpenAI: embed_query == embed_documents([teks])[0], jadi embed_documents bisa dipakai langsung.
+    """
+    fn = getattr(embeddings, "embed_queries", None)
+    if fn is not None:
+        return fn
+    try:
+        from langchain_openai import OpenAIEmbeddings
+    except ImportError:
+        return None
+    return embeddings.embed_documents if isinstance(embeddings, OpenAIEmbeddings) else None
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Bungkus objek embeddings lain. embed_query masuk antrian; 1 thread pengumpul menunggu
+    sampai window_ms sejak query pertama (atau max_batch query), lalu menjalankan 1 panggilan
+    untuk semua teks unik dan mengembalikan vektor ke masing-masing pemanggil.
+    Bila semua slot concurrency terpakai, query baru terus terkumpul sampai ada slot kosong:
+    makin padat trafik, makin besar batch-nya. embed_documents diteruskan apa adanya.
+    """
+
+    def __init__(self, embeddings: Embeddings, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_BATCH_MAX,
+                 concurrency: int = EMBED_BATCH_CONCURRENCY):
+        self.embeddings = embeddings
+        # CachedEmbeddings di luar memakai nama model sebagai bagian key
+        self.model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.concurrency = max(1, concurrency)
+        self._batch_fn = query_batch_fn(embeddings)
+
+        self._queue: queue.Queue = queue.Queue()
+        self._slots = threading.Semaphore(self.concurrency)
+        self._pool = None
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.queries = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest = 0
+        _batchers.add(self)
+
+    # ---------- pengumpul ----------
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed-batch")
+                self._worker = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._slots.acquire()
+            # selama menunggu slot, query lain mungkin sudah masuk: ikutkan
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: list):
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))    # teks sama cukup di-embed sekali
+            try:
+                vectors = dict(zip(texts, self._batch_fn(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            for text, future in batch:
+                future.set_result(vectors[text])
+            with self._stats_lock:
+                self.queries += len(batch)
+                self.texts += len(texts)
+                self.batches += 1
+                self.largest = max(self.largest, len(batch))
+        finally:
+            self._slots.release()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    # ---------- Embeddings ----------
+    def embed_query(self, text: str) -> List[float]:
+        if self._batch_fn is None:
+            return self.embeddings.embed_query(text)
+        return self.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self._batch_fn is None:
+            return await self.embeddings.aembed_query(text)
+        # tunggu Future dari thread batch tanpa memblok event loop
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"model": self.model, "queries": self.queries, "batches": self.batches, "texts": self.texts,
+                    "largest": self.largest}
+
+def all_batchers() -> list:
+    return list(_batchers)
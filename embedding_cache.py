@@ -0,0 +1,145 @@
+#embedding_cache.py
+#cache embedding query: LRU di memori (dibatasi byte) + sqlite lokal supaya tahan restart
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embed_cache.sqlite")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "64"))
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bungkus objek embeddings lain. Hanya embed_query yang di-cache
+    (query user berulang); embed_documents diteruskan apa adanya.
+    Key = sha1(nama model + teks yang dinormalisasi).
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str | None = EMBED_CACHE_PATH, max_bytes: int | None = None):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+        self.max_bytes = int(max_bytes if max_bytes is not None else EMBED_CACHE_MAX_MB * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()   # sqlite terpisah dari lock LRU: baca/tulis disk tidak menahan cache hit
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vector BLOB)")
+            self._db.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        # dipanggil di dalam lock
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return
+        self._lru[key] = vec
+        self._bytes += vec.nbytes
+        while self._bytes > self.max_bytes and self._lru:
+            _, old = self._lru.popitem(last=False)
+            self._bytes -= old.nbytes
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+            elif self._db is None:
+                self.misses += 1
+            return vec
+
+    def _disk_get(self, key: str):
+        with self._db_lock:
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if not row:
+                self.misses += 1
+                return None
+            vec = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vec)
+            self.disk_hits += 1
+            return vec
+
+    def _disk_put(self, key: str, vec: np.ndarray):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                (key, self.model, vec.tobytes()),
+            )
+            self._db.commit()
+
+    def _store_memory(self, key: str, vector: List[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+        return vec
+
+    def lookup(self, text: str):
+        key = self.key(text)
+        vec = self._memory_get(key)
+        if vec is None and self._db is not None:
+            vec = self._disk_get(key)
+        return key, vec
+
+    def store(self, key: str, vector: List[float]):
+        vec = self._store_memory(key, vector)
+        if self._db is not None:
+            self._disk_put(key, vec)
+        return vec
+
+    def embed_query(self, text: str) -> List[float]:
+        key, vec = self.lookup(text)
+        if vec is None:
+            vec = self.store(key, self.embeddings.embed_query(text))
+        return vec.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # hanya LRU di memori yang dicek di event loop; sqlite (baca & INSERT + commit) di thread
+        key = self.key(text)
+        vec = self._memory_get(key)
+        if vec is None and self._db is not None:
+            vec = await asyncio.to_thread(self._disk_get, key)
+        if vec is None:
+            vec = self._store_memory(key, await self.embeddings.aembed_query(text))
+            if self._db is not None:
+                await asyncio.to_thread(self._disk_put, key, vec)
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.disk_hits) / total) if total else 0.0,
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+            }
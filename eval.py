@@ -809,6 +809,32 @@ def classify_confusion_from_summary(gold: dict, summary: dict, T: float):
     }
     return label, info
 
+# ===============================
+# 8.6) LATENCY & TOKEN PER MODE UNDERSTAND
+# ===============================
+def summarize_cost(excel_path: str, sheet_name=0) -> pd.DataFrame | None:
+    """
+    Rata-rata response_time / token / request per mode `understand`
+    (chain = rewrite+classify+json 3 call, single = 1 structured call).
+    """
+    try:
+        df = pd.read_excel(excel_path, sheet_name=sheet_name)
+    except Exception as e:
+        print(f"[COST] Gagal membaca {excel_path}: {e}")
+        return None
+
+    cols = [c for c in ("response_time", "input_token", "output_token", "total_token", "response_count", "cost_idr") if c in df.columns]
+    if not cols:
+        return None
+    if "understand" not in df.columns:
+        df["understand"] = "chain"
+    df["understand"] = df["understand"].fillna("chain")
+    for c in cols:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    summary = df.groupby("understand")[cols].mean().round(2)
+    summary["n"] = df.groupby("understand").size()
+    return summary.reset_index()
+
 # ===============================
 # 9) JALANKAN + APPEND KE EXCEL
 # ===============================
@@ -968,7 +994,16 @@ if __name__ == "__main__":
     print(f"CM F1                           : {cm_f1:.3f}")
     print(f"CM Accuracy                     : {cm_accuracy:.3f}")
 
+    cost_summary = summarize_cost(excel_file)
+    if cost_summary is not None:
+        print("---- Latency & Token per Understand Mode ----")
+        print(cost_summary.to_string(index=False))
+
     # ========= TULIS KE EXCEL (APPEND) =========
+    if cost_summary is not None:
+        cost_summary.insert(0, "run_id", RUN_ID)
+        cost_summary.insert(1, "xls_input", excel_file)
+        _append_df_to_excel(AUDIT_XLSX, "cost_by_mode", cost_summary)
     if per_q_rows:
         _append_df_to_excel(AUDIT_XLSX, "per_question", pd.DataFrame(per_q_rows))
     if per_item_rows:
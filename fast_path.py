@@ -0,0 +1,106 @@
+#fast_path.py
+#pre-classifier lokal (tanpa LLM) untuk sapaan & permintaan "pilihan lain"
+import re
+import threading
+
+from rapidfuzz import fuzz, process
+
+GREETING = "greeting"
+MORE = "more"
+
+# kata sapaan + kata pengisi yang boleh menyertai (nama panggilan, partikel)
+GREETING_WORDS = {
+    "halo", "hallo", "helo", "hello", "hai", "hi", "hey", "pagi", "siang", "sore", "malam",
+    "selamat", "met", "assalamualaikum", "assalamu'alaikum", "salam", "permisi", "shalom",
+}
+FILLER_WORDS = {
+    "kak", "kk", "ka", "min", "admin", "bang", "bro", "sis", "mas", "mbak", "pak", "bu",
+    "bot", "meta", "property", "semua", "ya", "nih", "dong", "juga", "wr", "wb",
+}
+
+MORE_PATTERNS = [
+    re.compile(p) for p in (
+        r"^(apa(kah)? )?(masih )?ada (pilihan |opsi |yang |listing |properti |rumah )?(lain|lainnya|lagi)( lagi| ga| gak| nggak| tidak| kah| nya)?$",
+        r"^(tolong |coba )?(berikan|berikan lagi|kasih|kasih lagi|tampilkan|tunjukkan|carikan) (lagi )?(pilihan|opsi|yang) (lain|lainnya|berikutnya|selanjutnya)( lagi| dong| ya)?$",
+        r"^(pilihan|opsi|yang) (lain|lainnya|berikutnya|selanjutnya)( lagi| dong| ya)?$",
+        r"^(next|lanjut|lanjutkan|selanjutnya|berikutnya|lagi|lainnya)( dong| ya| lagi)?$",
+    )
+]
+
+# contoh kalimat untuk fallback RapidFuzz (typo, variasi kecil)
+MORE_EXAMPLES = [
+    "apakah masih ada pilihan lain",
+    "masih ada pilihan lain",
+    "ada yang lain",
+    "berikan lagi pilihan lain",
+    "kasih pilihan lain",
+    "ada pilihan lainnya",
+    "tampilkan yang lain",
+]
+GREETING_EXAMPLES = [
+    "halo", "selamat pagi", "selamat siang", "selamat sore", "selamat malam",
+    "assalamualaikum", "hai kak", "halo admin",
+]
+
+FUZZY_THRESHOLD = 88
+MAX_FUZZY_WORDS = 6   # kalimat panjang hampir pasti berisi kriteria baru → serahkan ke LLM
+
+_lock = threading.Lock()
+_stats = {"total": 0, GREETING: 0, MORE: 0}
+
+def normalize(text: str) -> str:
+    t = (text or "").lower().strip()
+    t = re.sub(r"[^\w\s']", " ", t)
+    t = re.sub(r"(.)\1{2,}", r"\1", t)     # haloooo → halo
+    return re.sub(r"\s+", " ", t).strip()
+
+def is_greeting(t: str) -> bool:
+    words = t.split()
+    if not words or not any(w in GREETING_WORDS for w in words):
+        return False
+    return all(w in GREETING_WORDS or w in FILLER_WORDS for w in words)
+
+def is_more(t: str) -> bool:
+    return any(p.match(t) for p in MORE_PATTERNS)
+
+def fuzzy_route(t: str) -> str | None:
+    if not t or len(t.split()) > MAX_FUZZY_WORDS:
+        return None
+    best = None
+    for label, examples in ((MORE, MORE_EXAMPLES), (GREETING, GREETING_EXAMPLES)):
+        match = process.extractOne(t, examples, scorer=fuzz.ratio, score_cutoff=FUZZY_THRESHOLD)
+        if match and (best is None or match[1] > best[1]):
+            best = (label, match[1])
+    return best[0] if best else None
+
+def classify(question: str) -> str | None:
+    """Kembalikan GREETING / MORE / None tanpa mencatat statistik."""
+    t = normalize(question)
+    if is_greeting(t):
+        return GREETING
+    if is_more(t):
+        return MORE
+    return fuzzy_route(t)
+
+def route(question: str, can_paginate: bool = False) -> str | None:
+    """
+    Tentukan apakah giliran ini bisa dilayani tanpa rewrite/classify/JSON LLM call.
+    MORE hanya berlaku bila ada filter sebelumnya yang bisa dinaikkan page-nya.
+    """
+    label = classify(question)
+    if label == MORE and not can_paginate:
+        label = None
+
+    with _lock:
+        _stats["total"] += 1
+        if label:
+            _stats[label] += 1
+    return label
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats)
+    hits = s[GREETING] + s[MORE]
+    s["hits"] = hits
+    s["hit_rate"] = (hits / s["total"]) if s["total"] else 0.0
+    return s
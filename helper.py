@@ -1,5 +1,8 @@
 from datetime import datetime, timezone, timedelta
 import re, json, requests
+import httpx
+
+from http_client import http, CircuitOpen
 
 def token_usage_calculator(prev,result):
     """Ambil token usage dengan aman (berbagai versi LCEL/OpenAI)."""
@@ -56,28 +59,40 @@ def jakarta_time_greeting() -> str:
         return "Malam"
 
 def post_query(url,data,token):
+    """POST lewat client bersama (keep-alive, retry, circuit breaker). None bila gagal."""
     headers = {
         "Authorization": "Bearer "+token,
         "Accept": "application/json"
     }
 
     try:
-        resp = requests.post(
-            url,
-            json=data,    
-            headers=headers,
-            timeout=15        
-        )
-        resp.raise_for_status()         # error kalau status 4xx/5xx
-        return resp
-
+        return http.request("POST", url, json=data, headers=headers)
+    except CircuitOpen as e:
+        print("Circuit open:", e)
     except requests.exceptions.Timeout:
         print("Timeout: server lambat merespons.")
     except requests.exceptions.HTTPError as e:
-        print("HTTP error:", e, "| body:", resp.text if 'resp' in locals() else "")
+        print("HTTP error:", e, "| body:", e.response.text if e.response is not None else "")
     except requests.exceptions.RequestException as e:
         print("Request error:", e)
 
+async def apost_query(url,data,token):
+    headers = {
+        "Authorization": "Bearer "+token,
+        "Accept": "application/json"
+    }
+
+    try:
+        return await http.arequest("POST", url, json=data, headers=headers)
+    except CircuitOpen as e:
+        print("Circuit open:", e)
+    except httpx.TimeoutException:
+        print("Timeout: server lambat merespons.")
+    except httpx.HTTPStatusError as e:
+        print("HTTP error:", e, "| body:", e.response.text)
+    except httpx.HTTPError as e:
+        print("Request error:", e)
+
 def get_query(url,data):
     headers = {
         # "Authorization": "Bearer "+token,
@@ -85,19 +100,13 @@ def get_query(url,data):
     }
 
     try:
-        resp = requests.get(
-            url,
-            json=data,    
-            headers=headers,
-            timeout=15        
-        )
-        resp.raise_for_status()         # error kalau status 4xx/5xx
-        return resp
-
+        return http.request("GET", url, json=data, headers=headers)
+    except CircuitOpen as e:
+        print("Circuit open:", e)
     except requests.exceptions.Timeout:
         print("Timeout: server lambat merespons.")
     except requests.exceptions.HTTPError as e:
-        print("HTTP error:", e, "| body:", resp.text if 'resp' in locals() else "")
+        print("HTTP error:", e, "| body:", e.response.text if e.response is not None else "")
     except requests.exceptions.RequestException as e:
         print("Request error:", e)
 
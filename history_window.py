@@ -0,0 +1,179 @@
+#history_window.py
+#render HISTORY CHAT hemat token: N giliran terakhir apa adanya, giliran lama jadi ringkasan,
+#isi listing diganti id listing, total dibatasi budget token (tiktoken)
+import os
+import re
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage
+
+from request_context import current
+from token_count import count_tokens, keep_last_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_VERBATIM_TURNS = int(os.getenv("HISTORY_VERBATIM_TURNS", "3"))
+HISTORY_ENCODING = os.getenv("HISTORY_ENCODING", "o200k_base")   # encoding gpt-4o / gpt-4o-mini
+
+LISTING_URL = re.compile(r"https?://(?:www\.)?metaproperty\.co\.id/listing/(\d+)")
+SUMMARY_LINE_CHARS = 160
+SUMMARY_HEADER = "Ringkasan percakapan sebelumnya:"
+
+def role_of(m: BaseMessage) -> str:
+    return "Human" if m.type in ("human", "user") else "AI"
+
+def content_of(m: BaseMessage) -> str:
+    return m.content if isinstance(m.content, str) else str(m.content)
+
+def listing_ids(text: str) -> List[str]:
+    return list(dict.fromkeys(LISTING_URL.findall(text)))
+
+def shorten(text: str, limit: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+def compact_listing_reply(text: str) -> str:
+    """Balasan AI berisi daftar listing → kalimat pembuka + id listing + kalimat penutup."""
+    ids = listing_ids(text)
+    if not ids:
+        return text
+    lines = [l.strip() for l in text.strip().splitlines() if l.strip()]
+    head = lines[0] if lines and not LISTING_URL.search(lines[0]) else ""
+    tail = lines[-1] if len(lines) > 1 and not LISTING_URL.search(lines[-1]) else ""
+    parts = [p for p in (head, f"[menampilkan listing id: {', '.join(ids)}]", tail) if p]
+    return "\n".join(parts)
+
+class TurnSummaries:
+    """
+    Ringkasan 1 baris per giliran (user + AI): potongan pesan user + kalimat pertama balasan AI + id listing,
+    bukan ringkasan bergulir yang diperbarui LLM. Baris & jumlah tokennya di-cache per isi pesan, jadi giliran
+    lama tidak diproses / dihitung ulang setiap request.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._cache: OrderedDict[tuple, tuple] = OrderedDict()
+
+    def entry(self, human: str, ai: str) -> tuple:
+        """(baris ringkasan, jumlah token baris)."""
+        key = (human, ai)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        ids = listing_ids(ai)
+        ai_text = compact_listing_reply(ai).splitlines()[0] if ai else ""
+        line = f"- User: {shorten(human, SUMMARY_LINE_CHARS)}"
+        if ai_text and not ai_text.startswith("[menampilkan"):
+            line += f" | AI: {shorten(ai_text, SUMMARY_LINE_CHARS)}"
+        if ids:
+            line += f" [listing: {', '.join(ids)}]"
+
+        cached = (line, count_tokens(line, HISTORY_ENCODING))
+        self._cache[key] = cached
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return cached
+
+    def line(self, human: str, ai: str) -> str:
+        return self.entry(human, ai)[0]
+
+summaries = TurnSummaries()
+
+def pair_turns(messages: List[BaseMessage]) -> List[tuple]:
+    """Kelompokkan pesan menjadi giliran (human, ai); pesan tanpa pasangan tetap dimasukkan."""
+    turns, human = [], None
+    for m in messages:
+        if role_of(m) == "Human":
+            if human is not None:
+                turns.append((human, ""))
+            human = content_of(m)
+        else:
+            turns.append((human or "", content_of(m)))
+            human = None
+    if human is not None:
+        turns.append((human, ""))
+    return turns
+
+def render_turn(human: str, ai: str, keep_listings: bool) -> List[str]:
+    lines = []
+    if human:
+        lines.append(f"Human: {human}")
+    if ai:
+        lines.append(f"AI: {ai if keep_listings else compact_listing_reply(ai)}")
+    return lines
+
+def render_history(hist_obj: BaseChatMessageHistory, verbatim_turns: int = HISTORY_VERBATIM_TURNS,
+                   budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Transcript "Human: ..." / "AI: ..." untuk prompt:
+    - `verbatim_turns` giliran terakhir ditulis utuh (balasan AI terakhir tetap lengkap dengan listing-nya,
+      giliran lain isi listing diganti id),
+    - giliran yang lebih lama menjadi ringkasan 1 baris per giliran,
+    - bila melebihi `budget` token: ringkasan terlama dibuang dulu, lalu giliran verbatim terlama.
+    """
+    if not hist_obj or not getattr(hist_obj, "messages", None):
+        return ""
+
+    turns = pair_turns(hist_obj.messages)
+    split = max(len(turns) - verbatim_turns, 0)
+    older, recent = turns[:split], turns[split:]
+
+    # token dihitung sekali per baris lalu dikurangi saat baris dibuang (tidak men-tokenize ulang seluruh history)
+    summary = [summaries.entry(h, a) for h, a in older]
+    blocks = []
+    for i, (h, a) in enumerate(recent):
+        lines = render_turn(h, a, keep_listings=(i == len(recent) - 1))
+        blocks.append((lines, sum(count_tokens(l, HISTORY_ENCODING) for l in lines)))
+    header_tokens = count_tokens(SUMMARY_HEADER, HISTORY_ENCODING)
+
+    dropped = {"summary": 0, "blocks": 0}
+
+    def can_drop() -> bool:
+        return dropped["summary"] < len(summary) or dropped["blocks"] < len(blocks) - 1
+
+    def drop() -> int:
+        """Buang ringkasan terlama, lalu giliran verbatim terlama; kembalikan token yang dibuang."""
+        if dropped["summary"] < len(summary):
+            freed = summary[dropped["summary"]][1]
+            dropped["summary"] += 1
+            return freed + (header_tokens if dropped["summary"] == len(summary) else 0)
+        freed = blocks[dropped["blocks"]][1]
+        dropped["blocks"] += 1
+        return freed
+
+    def render() -> str:
+        lines = []
+        if dropped["summary"] < len(summary):
+            lines.append(SUMMARY_HEADER)
+            lines.extend(line for line, _ in summary[dropped["summary"]:])
+        for block, _ in blocks[dropped["blocks"]:]:
+            lines.extend(block)
+        return "\n".join(lines)
+
+    estimate = (header_tokens if summary else 0) + sum(t for _, t in summary) + sum(t for _, t in blocks)
+    while estimate > budget and can_drop():
+        estimate -= drop()
+    # perkiraan per baris tidak menghitung "\n": cek sekali dengan hitungan persis, jarang perlu membuang lagi
+    text = render()
+    tokens = count_tokens(text, HISTORY_ENCODING)
+    while tokens > budget and can_drop():
+        drop()
+        text = render()
+        tokens = count_tokens(text, HISTORY_ENCODING)
+    if tokens > budget:
+        # 1 giliran terakhir saja sudah melebihi budget → ambil bagian akhirnya
+        text = keep_last_tokens(text, budget, HISTORY_ENCODING)
+        tokens = count_tokens(text, HISTORY_ENCODING)
+
+    # pembanding "tanpa kompresi" dihitung hanya saat laporan dicetak (history_report)
+    current().history = {"tokens": tokens, "budget": budget, "raw_messages": hist_obj.messages[-20:]}
+    return text
+
+def history_report(history: dict) -> str:
+    """Baris laporan token HISTORY CHAT; pembanding = 10 giliran mentah seperti serialize_history sebelumnya."""
+    raw = history.get("raw_messages") or []
+    raw_tokens = count_tokens("\n".join(f"{role_of(m)}: {content_of(m)}" for m in raw), HISTORY_ENCODING)
+    return f"History : {history['tokens']}/{history['budget']} token (tanpa kompresi {raw_tokens})"
@@ -0,0 +1,242 @@
+#history_writer.py
+#kirim record chat_history di background: antre tanpa blocking, kirim per batch, retry + backoff,
+#simpan ke journal JSONL bila endpoint mati dan kirim ulang saat start
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+from rich import print
+
+load_dotenv()
+
+DATA_API_URL = os.getenv("DATA_API_URL")
+API_TOKEN = os.getenv("API_TOKEN")
+STORE_HISTORY_URL = f"{DATA_API_URL}/chat_history"
+# endpoint opsional yang menerima list record sekaligus; bila kosong record dikirim satu per satu
+STORE_HISTORY_BATCH_URL = os.getenv("STORE_HISTORY_BATCH_URL", "")
+# bukan requests.jsonl di root repo: file itu dipakai untuk hal lain
+HISTORY_JOURNAL = os.getenv("HISTORY_JOURNAL", "data/chat_history_journal.jsonl")
+
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "20"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_MAX_RETRIES = int(os.getenv("HISTORY_MAX_RETRIES", "3"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_CLOSE_TIMEOUT = float(os.getenv("HISTORY_CLOSE_TIMEOUT", "5"))   # detik menunggu batch yang sedang dikirim saat shutdown
+
+class HistoryWriter:
+    def __init__(self, url: str = STORE_HISTORY_URL, token: str | None = API_TOKEN, journal: str = HISTORY_JOURNAL,
+                 batch_url: str = STORE_HISTORY_BATCH_URL, batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL, max_retries: int = HISTORY_MAX_RETRIES,
+                 backoff: float = 0.5, timeout: float = 15):
+        self.url = url
+        self.batch_url = batch_url
+        self.token = token or ""
+        self.journal = Path(journal)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._journal_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._session = requests.Session()
+        self._thread = None
+        self._stop = threading.Event()
+        self._inflight = []     # batch yang sedang dikirim thread pengirim
+        self.sent = 0
+        self.spilled = 0
+
+    # ---------- API ----------
+    def start(self):
+        """Jalankan thread pengirim (sekali); thread itu lebih dulu mengirim ulang isi journal dari run sebelumnya."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def submit(self, record: dict):
+        """Non-blocking. Bila antrean penuh, record langsung ditulis ke journal."""
+        self.start()
+        self._enqueue(record)
+
+    def _enqueue(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._spill([record])
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Tunggu antrean kosong (dipakai saat test / shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout: float = HISTORY_CLOSE_TIMEOUT):
+        """Saat proses berhenti: batch yang sedang dikirim & sisa antrean disimpan ke journal supaya tidak hilang."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive() and self._inflight:
+                # endpoint masih menggantung: simpan batch-nya (bisa terkirim dobel, tapi tidak hilang)
+                self._spill(self._inflight)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if leftover:
+            self._spill(leftover)
+
+    def _claim_journals(self) -> list:
+        """
+        File journal milik proses ini. Journal utama di-rename ke .replay.<pid>-<ns> (tiap worker uvicorn punya nama
+        sendiri, rename atomik: hanya 1 worker yang mendapatkannya), ditambah file replay sisa proses yang sudah
+        mati (crash di tengah replay).
+        """
+        pid = os.getpid()
+        prefix = self.journal.name + ".replay."
+        claimed = []
+        for path in sorted(self.journal.parent.glob(prefix + "*")):
+            owner = path.name[len(prefix):].split("-", 1)[0]
+            if not owner.isdigit() or (int(owner) != pid and _alive(int(owner))):
+                continue
+            if int(owner) == pid:
+                claimed.append(path)    # sisa run sebelumnya dengan pid yang sama (container)
+                continue
+            target = self.journal.with_name(f"{prefix}{pid}-{time.time_ns()}")
+            try:
+                path.replace(target)
+            except FileNotFoundError:
+                continue    # sudah diambil worker lain
+            claimed.append(target)
+        own = self.journal.with_name(f"{prefix}{pid}-{time.time_ns()}")
+        with self._journal_lock:
+            try:
+                self.journal.replace(own)
+                claimed.append(own)
+            except FileNotFoundError:
+                pass        # tidak ada journal / sudah diambil worker lain
+        return claimed
+
+    def replay(self):
+        """
+        Kirim ulang isi journal (dipanggil thread pengirim saat start). File replay baru dihapus setelah
+        semua record-nya terkirim atau masuk journal baru.
+        """
+        for path in self._claim_journals():
+            records = []
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            continue
+            if records:
+                print(f"[italic bold green]Mengirim ulang {len(records)} chat history dari journal ... [/italic bold green]\n")
+            for start in range(0, len(records), self.batch_size):
+                if self._stop.is_set() or not self._send(records[start:start + self.batch_size]):
+                    # endpoint mati / proses berhenti: sisanya langsung ke journal, dicoba lagi di start berikutnya
+                    self._spill(records[start + self.batch_size:])
+                    break
+            path.unlink()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "spilled": self.spilled}
+
+    # ---------- worker ----------
+    def _run(self):
+        try:
+            self.replay()
+        except OSError as e:
+            print("Replay journal chat_history gagal:", e)
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._inflight = batch
+            try:
+                self._send(batch)
+            finally:
+                self._inflight = []
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send(self, batch: list) -> bool:
+        """True bila semua terkirim; yang gagal masuk journal."""
+        if self.batch_url:
+            if self._post(self.batch_url, batch):
+                self.sent += len(batch)
+                return True
+            self._spill(batch)
+            return False
+        for i, record in enumerate(batch):
+            if self._post(self.url, record):
+                self.sent += 1
+            else:
+                # endpoint bermasalah: jangan coba sisa batch satu per satu, langsung ke journal
+                self._spill(batch[i:])
+                return False
+        return True
+
+    def _post(self, url: str, payload) -> bool:
+        headers = {"Authorization": "Bearer " + self.token, "Accept": "application/json"}
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self._session.post(url, json=payload, headers=headers, timeout=self.timeout)
+                if resp.status_code < 400:
+                    return True
+                if resp.status_code < 500 and resp.status_code != 429:
+                    # 4xx selain 429: data ditolak, retry / journal tidak akan membantu
+                    print("HTTP error chat_history:", resp.status_code, "| body:", resp.text)
+                    return True
+                print("HTTP error chat_history:", resp.status_code)
+            except requests.exceptions.RequestException as e:
+                print("Request error chat_history:", e)
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        return False
+
+    def _spill(self, records: list):
+        if not records:
+            return
+        with self._journal_lock:
+            self.journal.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal.open("a", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+        self.spilled += len(records)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+history_writer = HistoryWriter()
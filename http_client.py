@@ -0,0 +1,290 @@
+#http_client.py
+#HTTP client bersama: session keep-alive (sync & async), timeout per endpoint, retry dengan jitter,
+#circuit breaker per endpoint, dan metrik latency / pemakaian ulang koneksi
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from tracing import span
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))       # gagal berturut-turut → open
+BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "30"))          # detik sebelum dicoba lagi (half-open)
+
+class EndpointPolicy:
+    def __init__(self, connect: float = 3.0, read: float = 15.0, retries: int = 1, backoff: float = 0.3):
+        self.connect = connect
+        self.read = read
+        self.retries = retries
+        self.backoff = backoff
+
+# key = segmen terakhir path URL
+ENDPOINT_POLICIES = {
+    # dipakai di jalur jawaban: gagal cepat supaya bisa pindah ke vector fallback
+    "query_listing": EndpointPolicy(connect=2.0, read=float(os.getenv("QUERY_LISTING_TIMEOUT", "8")), retries=1),
+    "chat_history": EndpointPolicy(connect=3.0, read=15.0, retries=0),
+}
+DEFAULT_POLICY = EndpointPolicy()
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+def endpoint_name(url: str) -> str:
+    path = urlsplit(url).path.rstrip("/")
+    return path.rsplit("/", 1)[-1] or urlsplit(url).netloc
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    closed → (BREAKER_FAILURES gagal berturut-turut) → open → (BREAKER_RESET detik) → half-open (1 percobaan).
+    Saat half-open hanya 1 caller yang boleh mencoba (probe); caller lain ditolak sampai hasil probe dicatat.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.reset_after:
+                    return False
+                self.state = "half-open"
+            if self.state == "half-open":
+                # probe yang tidak pernah dicatat (mis. exception lain) tidak mengunci circuit selamanya
+                if self._probing and now - self._probe_started < self.reset_after:
+                    return False
+                self._probing = True
+                self._probe_started = now
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self.consecutive = 0
+                return
+            self.consecutive += 1
+            if self.state == "half-open" or self.consecutive >= self.failures:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+# koneksi TCP yang dibuka oleh request di thread ini (requests/urllib3 connect di thread pemanggil)
+_connects = threading.local()
+
+class CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _connects.count = getattr(_connects, "count", 0) + 1
+        super().connect()
+
+class CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _connects.count = getattr(_connects, "count", 0) + 1
+        super().connect()
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter yang menghitung koneksi baru per request (bukan selisih jumlah koneksi pool bersama)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuits = 0
+        self.new_connections = 0
+        self.latencies = deque(maxlen=1000)   # ms, request yang berhasil
+
+    def snapshot(self) -> dict:
+        lat = sorted(self.latencies)
+        def pct(p):
+            return round(lat[min(int(p * len(lat)), len(lat) - 1)], 1) if lat else None
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "short_circuits": self.short_circuits,
+            "new_connections": self.new_connections,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+        }
+
+class HttpClient:
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self.session = requests.Session()
+        adapter = CountingAdapter(pool_connections=10, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool_size = pool_size
+
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._metrics = {}
+        self._async_client = None
+        self._async_loop = None
+
+    # ---------- state per endpoint ----------
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker()
+            return self._breakers[name]
+
+    def endpoint_metrics(self, name: str) -> EndpointMetrics:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = EndpointMetrics()
+            return self._metrics[name]
+
+    def is_open(self, url: str) -> bool:
+        b = self.breaker(endpoint_name(url))
+        return b.state == "open" and time.monotonic() - b.opened_at < b.reset_after
+
+    def count(self, m: EndpointMetrics, field: str, n: int = 1):
+        """Counter metrik di-update di bawah lock client (jalur sync dipanggil dari banyak thread)."""
+        with self._lock:
+            setattr(m, field, getattr(m, field) + n)
+
+    def observe(self, m: EndpointMetrics, ms: float):
+        with self._lock:
+            m.latencies.append(ms)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            snaps = {name: m.snapshot() for name, m in self._metrics.items()}
+            breakers = dict(self._breakers)
+        out = {}
+        for name, snap in snaps.items():
+            breaker = breakers.get(name)
+            snap["circuit"] = breaker.state if breaker is not None else "closed"
+            ok = snap["requests"] - snap["failures"]
+            snap["connection_reuse"] = round(1 - snap["new_connections"] / ok, 3) if ok > 0 else None
+            out[name] = snap
+        return out
+
+    # ---------- sync ----------
+    def request(self, method: str, url: str, **kwargs):
+        """Kirim request; raise CircuitOpen / requests.RequestException bila gagal setelah retry."""
+        with span(f"{method} {endpoint_name(url)}", "http"):
+            return self._request(method, url, **kwargs)
+
+    def _request(self, method: str, url: str, **kwargs):
+        name = endpoint_name(url)
+        policy = ENDPOINT_POLICIES.get(name, DEFAULT_POLICY)
+        breaker, m = self.breaker(name), self.endpoint_metrics(name)
+
+        if not breaker.allow():
+            self.count(m, "short_circuits")
+            raise CircuitOpen(f"circuit {name} terbuka")
+
+        for attempt in range(policy.retries + 1):
+            self.count(m, "requests")
+            _connects.count = 0
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, timeout=(policy.connect, policy.read), **kwargs)
+                self.count(m, "new_connections", _connects.count)
+                if resp.status_code in RETRY_STATUS and attempt < policy.retries:
+                    raise requests.exceptions.HTTPError(f"{resp.status_code}", response=resp)
+                resp.raise_for_status()
+                self.observe(m, (time.perf_counter() - start) * 1000)
+                breaker.record(True)
+                return resp
+            except requests.exceptions.RequestException as e:
+                self.count(m, "failures")
+                retryable = not isinstance(e, requests.exceptions.HTTPError) or (
+                    e.response is not None and e.response.status_code in RETRY_STATUS
+                )
+                if not retryable or attempt >= policy.retries:
+                    if retryable or e.response is None or e.response.status_code >= 500:
+                        breaker.record(False)
+                    else:
+                        # 4xx: endpoint merespons (kesalahan ada di request) → sehat; probe half-open menutup circuit
+                        breaker.record(True)
+                    raise
+                self.count(m, "retries")
+                time.sleep(policy.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    # ---------- async ----------
+    def async_client(self) -> httpx.AsyncClient:
+        """AsyncClient keep-alive, dibuat ulang bila event loop berganti (asyncio.run berulang)."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                timeout=15,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def arequest(self, method: str, url: str, **kwargs):
+        with span(f"{method} {endpoint_name(url)}", "http"):
+            return await self._arequest(method, url, **kwargs)
+
+    async def _arequest(self, method: str, url: str, **kwargs):
+        name = endpoint_name(url)
+        policy = ENDPOINT_POLICIES.get(name, DEFAULT_POLICY)
+        breaker, m = self.breaker(name), self.endpoint_metrics(name)
+
+        if not breaker.allow():
+            self.count(m, "short_circuits")
+            raise CircuitOpen(f"circuit {name} terbuka")
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self.count(m, "new_connections")
+
+        timeout = httpx.Timeout(policy.read, connect=policy.connect)
+        for attempt in range(policy.retries + 1):
+            self.count(m, "requests")
+            start = time.perf_counter()
+            try:
+                resp = await self.async_client().request(method, url, timeout=timeout, extensions={"trace": trace}, **kwargs)
+                if resp.status_code in RETRY_STATUS and attempt < policy.retries:
+                    raise httpx.HTTPStatusError(f"{resp.status_code}", request=resp.request, response=resp)
+                resp.raise_for_status()
+                self.observe(m, (time.perf_counter() - start) * 1000)
+                breaker.record(True)
+                return resp
+            except httpx.HTTPError as e:
+                self.count(m, "failures")
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                retryable = status is None or status in RETRY_STATUS
+                if not retryable or attempt >= policy.retries:
+                    if retryable or status >= 500:
+                        breaker.record(False)
+                    else:
+                        breaker.record(True)
+                    raise
+                self.count(m, "retries")
+                await asyncio.sleep(policy.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+http = HttpClient()
@@ -0,0 +1,93 @@
+#index_files.py
+#penyimpanan index berbentuk folder (bm25_index, numpy_index): tiap build ditulis ke folder versi baru lalu
+#symlink index dialihkan atomik, dan cache per proses yang memuat ulang index bila ingest menulis versi baru
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MARKER_FILE = "ids.json"   # ditulis setiap save; mtime-nya menandai versi index
+
+@contextmanager
+def atomic_dir(path: Path):
+    """
+    Yield folder versi baru (<path>.v<ns>) untuk diisi; bila selesai tanpa error, `path` (symlink) dialihkan
+    ke folder itu dengan os.replace. Pengalihan symlink atomik: `path` selalu menunjuk index yang lengkap.
+    """
+    path = Path(path)
+    version = path.with_name(f"{path.name}.v{time.time_ns()}")
+    version.mkdir(parents=True)
+    try:
+        yield version
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+    link = path.with_name(path.name + ".tmp")
+    _remove(link)
+    os.symlink(version.name, link)      # target relatif: folder persist bisa dipindah / di-mount di tempat lain
+    if path.is_dir() and not path.is_symlink():
+        # layout lama (folder biasa, bukan symlink): sekali ini saja tidak atomik
+        legacy = path.with_name(path.name + ".old")
+        _remove(legacy)
+        path.replace(legacy)
+        os.replace(link, path)
+        _remove(legacy)
+    else:
+        os.replace(link, path)
+    # versi lama: proses serving yang sudah me-mmap file-nya tetap aman (inode baru dilepas setelah di-unmap)
+    for old in path.parent.glob(path.name + ".v*"):
+        if old != version:
+            _remove(old)
+
+def _remove(path: Path):
+    if path.is_symlink() or path.is_file():
+        path.unlink(missing_ok=True)
+    elif path.exists():
+        shutil.rmtree(path, ignore_errors=True)
+
+class IndexCache:
+    """
+    Index bersama per proses, per folder. `loader(path)` dipanggil lagi bila mtime MARKER_FILE berubah
+    (dicek paling sering tiap check_interval detik). None bila index belum dibangun. Bila versi baru gagal
+    dimuat (mis. versi itu sudah diganti lagi di tengah load), index sebelumnya tetap dipakai.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, path: Path, check_interval: float = 2.0):
+        path = Path(path)
+        key = os.path.abspath(path)    # bukan resolve(): symlink menunjuk folder versi yang berganti-ganti
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["checked"] < check_interval:
+                return entry["index"]
+            # resolve sekali: semua file dibaca dari 1 folder versi walau symlink dialihkan di tengah load
+            target = path.resolve()
+            try:
+                mtime = (target / MARKER_FILE).stat().st_mtime
+            except OSError:
+                if entry is not None and entry["index"] is not None and path.exists():
+                    # versi yang baru di-resolve sudah diganti lagi: pakai yang lama sampai cek berikutnya
+                    entry["checked"] = now
+                    return entry["index"]
+                self._entries[key] = {"index": None, "mtime": None, "checked": now}
+                return None
+            if entry is None or entry["mtime"] != mtime:
+                try:
+                    index = self.loader(target)
+                except (OSError, ValueError) as e:
+                    if entry is None or entry["index"] is None:
+                        raise
+                    print(f"[index_files] gagal memuat {path}, tetap memakai versi sebelumnya: {e!r}")
+                    entry["checked"] = now
+                    return entry["index"]
+                entry = {"index": index, "mtime": mtime}
+                self._entries[key] = entry
+            entry["checked"] = now
+            return entry["index"]
@@ -2,6 +2,8 @@
 import os
 import json
 import argparse
+import hashlib
+import time
 from pathlib import Path
 from typing import List, Dict, Tuple
 
@@ -9,13 +11,16 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_openai import OpenAIEmbeddings
 
-DEFAULT_EMBED_MODEL_HF = "intfloat/multilingual-e5-base"  # bagus untuk Indo
-PERSIST_DIR_DEFAULT = "chroma/realestate"
-COLLECTION_DEFAULT = "realestate"
+from vector_store import VectorStoreManager, PERSIST_DIR, COLLECTION_NAME, record_backend
+from local_embeddings import BACKENDS, backend_model, load_embeddings
+from ingest_pipeline import read_documents, embed_and_write
+import bm25_index
+import numpy_index
+
+PERSIST_DIR_DEFAULT = PERSIST_DIR
+COLLECTION_DEFAULT = COLLECTION_NAME
+MANIFEST_FILE = "ingest_manifest.json"   # listing → hash konten, disimpan di persist_dir
 
 def parse_args():
     p = argparse.ArgumentParser(description="Ingest listings.json + page_content/*.txt ke Chroma")
@@ -26,7 +31,29 @@ def parse_args():
     p.add_argument("--collection", default=COLLECTION_DEFAULT,
                    help="Nama koleksi Chroma")
     p.add_argument("--use-openai", action="store_true",
-                   help="Pakai OpenAIEmbeddings (default: HF e5-base)")
+                   help="Pakai OpenAIEmbeddings (sama dengan --embedding-backend openai)")
+    p.add_argument("--embedding-backend", choices=BACKENDS, default=os.getenv("INGEST_EMBEDDING_BACKEND", "e5"),
+                   help="Backend embedding: openai | e5 (HF, torch) | e5-onnx (ONNX int8, CPU). Default: e5")
+    p.add_argument("--incremental", action="store_true",
+                   help="Hanya embed listing baru/berubah, hapus listing yang sudah tidak ada (pakai manifest)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                   help="Jumlah thread pembaca file page_content")
+    p.add_argument("--batch-size", type=int, default=64,
+                   help="Jumlah dokumen per batch embedding")
+    p.add_argument("--max-concurrency", type=int, default=4,
+                   help="Maksimal batch embedding yang berjalan bersamaan")
+    p.add_argument("--max-batch-tokens", type=int, default=100_000,
+                   help="Maksimal token per batch embedding")
+    p.add_argument("--numpy-index", action="store_true",
+                   help="Tulis juga index vector numpy (npy-<collection>/) untuk VECTOR_INDEX=numpy")
+    p.add_argument("--numpy-dtype", choices=("float16", "float32"), default=numpy_index.NUMPY_INDEX_DTYPE,
+                   help="Tipe matriks embedding index numpy tanpa kompresi (float16 = setengah ukuran); "
+                        "index terkompresi selalu menyimpan float32 untuk rescoring")
+    p.add_argument("--numpy-quant", choices=("none", "int8", "pq"), default=numpy_index.NUMPY_INDEX_QUANT,
+                   help="Kode terkompresi index numpy: int8 (1 byte/dimensi) atau pq (1 byte/subruang); "
+                        "shortlist dihitung ulang dengan vektor penuh float32")
+    p.add_argument("--pq-subspaces", type=int, default=0,
+                   help="Jumlah subruang PQ (0 = dim/16)")
     return p.parse_args()
 
 def load_rows(json_path: Path) -> List[Dict]:
@@ -95,18 +122,109 @@ def build_document(row: Dict, text: str) -> Tuple[Document, str]:
     doc_id = f"listing:{listing_id}"
     return doc, doc_id
 
-def get_embeddings(use_openai: bool):
-    if use_openai:
-        # pastikan OPENAI_API_KEY ada di .env
-        return OpenAIEmbeddings(model="text-embedding-3-small")
-    # default HF e5 multilingual
-    return HuggingFaceEmbeddings(
-        model_name=DEFAULT_EMBED_MODEL_HF,
-        encode_kwargs={"normalize_embeddings": True}
-    )
+def content_hash(doc: Document) -> str:
+    """Hash page_content + metadata; berubah bila teks atau data listing (harga, dll) berubah."""
+    meta = json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(f"{doc.page_content}\x00{meta}".encode("utf-8")).hexdigest()
+
+def load_manifest(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path: Path, manifest: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    tmp.replace(path)
+
+def build_manifest(docs: List[Document], ids: List[str], model: str, prefixed: bool) -> Dict:
+    return {
+        "model": model,
+        "prefix": prefixed,
+        "listings": {
+            doc_id: {"hash": content_hash(doc), "updated_at": doc.metadata.get("updated_at")}
+            for doc, doc_id in zip(docs, ids)
+        },
+    }
+
+def diff_manifest(old: Dict, new: Dict) -> Tuple[List[str], List[str], List[str]]:
+    """Kembalikan (id baru, id berubah, id terhapus) relatif terhadap manifest lama."""
+    old_items = old.get("listings", {})
+    new_items = new["listings"]
+    added = [i for i in new_items if i not in old_items]
+    changed = [i for i in new_items if i in old_items and old_items[i]["hash"] != new_items[i]["hash"]]
+    removed = [i for i in old_items if i not in new_items]
+    return added, changed, removed
+
+def open_collection(persist_dir: str, collection: str):
+    """Koleksi Chroma yang sudah ada, tanpa embedding function (None bila belum pernah di-ingest)."""
+    import chromadb
+    try:
+        return chromadb.PersistentClient(path=persist_dir).get_collection(collection)
+    except Exception:
+        # NotFoundError / ValueError, tergantung versi chromadb
+        return None
+
+def drop_collection(persist_dir: str, collection: str):
+    import chromadb
+    chromadb.PersistentClient(path=persist_dir).delete_collection(collection)
+
+def stale_reason(old_manifest: Dict, collection, model: str, prefixed: bool) -> str | None:
+    """
+    Alasan vektor di koleksi tidak sebanding dengan model sekarang (None bila sebanding / koleksi kosong).
+    Tanpa manifest, pakai model yang dicatat record_backend di metadata koleksi.
+    """
+    if collection is None or collection.count() == 0:
+        return None
+    if old_manifest:
+        if old_manifest.get("model") != model or old_manifest.get("prefix", False) != prefixed:
+            return f"model embedding berubah ({old_manifest.get('model')} → {model})"
+        return None
+    recorded = (collection.metadata or {}).get("embedding_model")
+    if recorded != model:
+        return f"koleksi dibangun dengan {recorded or 'model yang tidak tercatat'}, sekarang {model}"
+    return None
+
+def manifest_from_collection(collection, model: str, prefixed: bool) -> Dict:
+    """Manifest pengganti dari id koleksi (tanpa hash): semua listing di-embed ulang, yang hilang ikut dihapus."""
+    ids = collection.get(include=[])["ids"]
+    return {"model": model, "prefix": prefixed, "listings": {i: {"hash": None} for i in ids}}
+
+def get_embeddings(backend: str):
+    # openai: pastikan OPENAI_API_KEY ada di .env; e5 / e5-onnx: lokal, dengan prefix "passage: "
+    return load_embeddings(backend)
+
+def write_bm25(persist_dir: str, collection: str, texts: List[str], ids: List[str]):
+    """Index BM25 dari page_content, disimpan di samping koleksi Chroma (dipakai hybrid search)."""
+    started = time.perf_counter()
+    path = bm25_index.index_dir(persist_dir, collection)
+    index = bm25_index.BM25Index.build(texts, ids)
+    index.save(path)
+    print(f"  → index BM25: {index.n_docs} dokumen, {len(index.terms)} term ({time.perf_counter() - started:.2f} s) → {path}")
+
+def write_numpy_index(persist_dir: str, collection: str, backend: str, dtype: str, quant: str = "none", subspaces: int = 0,
+                      chroma_collection=None):
+    """Salin seluruh vektor + metadata koleksi Chroma ke index numpy (juga saat --incremental)."""
+    started = time.perf_counter()
+    if chroma_collection is None:
+        import chromadb
+        chroma_collection = chromadb.PersistentClient(path=persist_dir).get_collection(collection)
+    path = numpy_index.index_dir(persist_dir, collection)
+    index, lines = numpy_index.NumpyVectorIndex.from_collection(
+        chroma_collection, backend, backend_model(backend), dtype, quant, subspaces)
+    index.save(path, lines)
+    size = sum(f.stat().st_size for f in path.iterdir()) / 1024 / 1024
+    mem = index.memory_bytes()
+    resident = (mem["per_row"] * index.n_docs + mem["fixed"]) / 1024 / 1024
+    print(f"  → index numpy: {index.n_docs} dokumen, dim {index.info['dim']} {dtype}, kuantisasi {index.info['quant']}, "
+          f"{size:.1f} MB di disk, {resident:.1f} MB dipindai per query ({time.perf_counter() - started:.2f} s) → {path}")
 
 def main():
     args = parse_args()
+    backend = "openai" if args.use_openai else args.embedding_backend
     embeds_dir = Path(args.embeds_dir)
     json_path = embeds_dir / "listings.json"
     txt_dir = embeds_dir / "page_content"
@@ -117,24 +235,20 @@ def main():
     print(f"- page_content   : {txt_dir}")
     print(f"- persist_dir    : {args.persist_dir}")
     print(f"- collection     : {args.collection}")
-    print(f"- embeddings     : {'OpenAI text-embedding-3-small' if args.use_openai else DEFAULT_EMBED_MODEL_HF}")
+    print(f"- embeddings     : {backend} ({backend_model(backend)})")
 
     rows = load_rows(json_path)
     print(f"  → total baris metadata: {len(rows)}")
 
-    docs, ids, missing = [], [], 0
-    for r in rows:
-        try:
-            p = resolve_content_path(r, embeds_dir)
-            text = p.read_text(encoding="utf-8").strip()
-            if not text:
-                raise ValueError("page_content kosong")
-            doc, doc_id = build_document(r, text)
-            docs.append(doc)
-            ids.append(doc_id)
-        except Exception as e:
-            missing += 1
-            print(f"  ! Skip id={r.get('listing_id')}: {e}")
+    def load_one(r):
+        p = resolve_content_path(r, embeds_dir)
+        text = p.read_text(encoding="utf-8").strip()
+        if not text:
+            raise ValueError("page_content kosong")
+        return build_document(r, text)
+
+    docs, ids, missing, read_stats = read_documents(rows, load_one, args.workers)
+    print(read_stats.report())
 
     print(f"  → siap di-embed: {len(docs)} dokumen (skip: {missing})")
 
@@ -142,19 +256,78 @@ def main():
         print("Tidak ada dokumen yang valid. Stop.")
         return
 
-    embeddings = get_embeddings(args.use_openai)
+    # BM25 selalu dari seluruh dokumen (juga saat --incremental)
+    all_texts, all_ids = [d.page_content for d in docs], list(ids)
+
+    model = backend_model(backend)
+    # e5 kini di-embed dengan prefix "passage: "; vektor e5 lama (tanpa prefix) tidak sebanding
+    prefixed = backend != "openai"
+    manifest_path = Path(args.persist_dir) / MANIFEST_FILE
+    manifest = build_manifest(docs, ids, model, prefixed)
+    removed = []
+
+    old_manifest = load_manifest(manifest_path)
+    collection = open_collection(args.persist_dir, args.collection)
+    reason = stale_reason(old_manifest, collection, model, prefixed)
+    if reason:
+        # vektor lama tidak sebanding (dimensi bisa beda) → buang koleksi, embed ulang semuanya
+        print(f"  ! {reason}: koleksi '{args.collection}' dihapus, embed ulang semua")
+        drop_collection(args.persist_dir, args.collection)
+        old_manifest, collection = {}, None
+
+    if args.incremental:
+        if not old_manifest and collection is not None and collection.count():
+            print("  ! manifest tidak ditemukan, dibandingkan dengan id koleksi yang ada")
+            old_manifest = manifest_from_collection(collection, model, prefixed)
+        added, changed, removed = diff_manifest(old_manifest, manifest)
+        todo = set(added) | set(changed)
+        unchanged = len(ids) - len(todo)
+        docs, ids = [d for d, i in zip(docs, ids) if i in todo], [i for i in ids if i in todo]
+        print(f"  → incremental: baru {len(added)}, berubah {len(changed)}, hapus {len(removed)}, tetap {unchanged}")
+
+        if not docs and not removed:
+            if not bm25_index.index_dir(args.persist_dir, args.collection).exists():
+                write_bm25(args.persist_dir, args.collection, all_texts, all_ids)
+            if args.numpy_index and not numpy_index.index_dir(args.persist_dir, args.collection).exists():
+                write_numpy_index(args.persist_dir, args.collection, backend, args.numpy_dtype,
+                                  args.numpy_quant, args.pq_subspaces)
+            print("Tidak ada perubahan. Selesai.")
+            return
+
+    embeddings = get_embeddings(backend)
+
+    # Ingest ke Chroma memakai upsert per id,
+    # jadi listing yang berubah menimpa vektor lamanya.
+    store = VectorStoreManager(args.persist_dir, args.collection, embeddings)
+    db = store.get()
+
+    if docs:
+        # embed per batch secara paralel, lalu upsert ke koleksi dari thread penulis
+        print(f"  → menulis {len(docs)} dokumen ke Chroma…")
+        started = time.perf_counter()
+        embed_stats, write_stats = embed_and_write(
+            db._collection, embeddings, docs, ids,
+            batch_size=args.batch_size,
+            max_concurrency=args.max_concurrency,
+            max_batch_tokens=args.max_batch_tokens,
+        )
+        print(embed_stats.report())
+        print(write_stats.report())
+        print(f"  → total   : {time.perf_counter() - started:.2f} s")
+    if removed:
+        print(f"  → menghapus {len(removed)} dokumen dari Chroma…")
+        db.delete(ids=removed)
 
-    # Ingest ke Chroma (add/update). Kita gunakan add saja;
-    # jika ingin idempotent update, bisa hapus dulu id yang sama atau gunakan ._collection.update untuk metadata-only.
-    db = Chroma(
-        persist_directory=args.persist_dir,
-        collection_name=args.collection,
-        embedding_function=embeddings
-    )
+    # serving (EMBEDDING_BACKEND=auto) membaca backend ini untuk meng-embed query
+    record_backend(db, backend)
+    save_manifest(manifest_path, manifest)
+    write_bm25(args.persist_dir, args.collection, all_texts, all_ids)
+    if args.numpy_index:
+        write_numpy_index(args.persist_dir, args.collection, backend, args.numpy_dtype,
+                          args.numpy_quant, args.pq_subspaces, db._collection)
 
-    # Tambahkan dokumen (Chroma akan meng-embed otomatis)
-    print("  → menulis ke Chroma…")
-    db.add_documents(docs, ids=ids)
+    # beri tanda ke proses serving supaya membuka ulang koleksi
+    store.mark_updated()
     print(f"Selesai. Tersimpan di: {args.persist_dir} (collection: {args.collection})")
 
 if __name__ == "__main__":
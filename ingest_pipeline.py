@@ -0,0 +1,127 @@
+#ingest_pipeline.py
+#pipeline ingest paralel: baca file .txt (thread pool) → embed per batch (concurrent) → tulis ke Chroma (thread terpisah)
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from token_count import count_tokens
+
+MAX_TOKENS_PER_INPUT = 8191   # batas input text-embedding-3-*
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+
+    def report(self) -> str:
+        rate = self.count / self.seconds if self.seconds > 0 else 0.0
+        return f"  → {self.name:<8}: {self.count} dokumen, {self.seconds:.2f} s ({rate:.1f} dok/s)"
+
+def read_documents(rows: List[Dict], load_one: Callable[[Dict], Tuple[Document, str]], workers: int):
+    """
+    Baca & bentuk Document secara paralel; urutan hasil sama dengan rows.
+    load_one(row) -> (doc, doc_id), raise bila file tidak ada / kosong.
+    """
+    stats = StageStats("baca")
+    start = time.perf_counter()
+    docs, ids, missing = [], [], 0
+
+    def safe_load(row):
+        try:
+            return load_one(row), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for row, (result, err) in zip(rows, pool.map(safe_load, rows)):
+            if err is not None:
+                missing += 1
+                print(f"  ! Skip id={row.get('listing_id')}: {err}")
+                continue
+            doc, doc_id = result
+            docs.append(doc)
+            ids.append(doc_id)
+
+    stats.count = len(docs)
+    stats.seconds = time.perf_counter() - start
+    return docs, ids, missing, stats
+
+def make_batches(docs: List[Document], ids: List[str], batch_size: int, max_batch_tokens: int):
+    """Potong menjadi batch maksimal batch_size dokumen DAN max_batch_tokens token."""
+    batch, batch_tokens = [], 0
+    for doc, doc_id in zip(docs, ids):
+        tokens = min(count_tokens(doc.page_content), MAX_TOKENS_PER_INPUT)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((doc, doc_id))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def embed_and_write(collection, embeddings, docs: List[Document], ids: List[str],
+                    batch_size: int = 64, max_concurrency: int = 4, max_batch_tokens: int = 100_000):
+    """
+    Embed batch secara concurrent (max_concurrency request bersamaan) dan
+    upsert hasilnya ke koleksi Chroma dari 1 thread penulis.
+    """
+    embed_stats, write_stats = StageStats("embed"), StageStats("tulis")
+    batches = list(make_batches(docs, ids, batch_size, max_batch_tokens))
+    print(f"  → {len(batches)} batch (batch-size {batch_size}, max {max_batch_tokens} token, concurrency {max_concurrency})")
+
+    out: queue.Queue = queue.Queue(maxsize=max_concurrency * 2)
+    errors = []
+
+    def writer():
+        while True:
+            item = out.get()
+            if item is None:
+                return
+            if errors:
+                continue    # upsert sudah gagal: buang sisa antrean (tetap dikuras supaya pengirim tidak macet)
+            batch, vectors = item
+            start = time.perf_counter()
+            try:
+                collection.upsert(
+                    ids=[doc_id for _, doc_id in batch],
+                    embeddings=vectors,
+                    documents=[doc.page_content for doc, _ in batch],
+                    metadatas=[doc.metadata for doc, _ in batch],
+                )
+                write_stats.count += len(batch)
+            except Exception as e:
+                errors.append(e)
+            write_stats.seconds += time.perf_counter() - start
+
+    def embed(batch):
+        return batch, embeddings.embed_documents([doc.page_content for doc, _ in batch])
+
+    writer_thread = threading.Thread(target=writer, name="chroma-writer", daemon=True)
+    writer_thread.start()
+
+    start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        futures = [pool.submit(embed, b) for b in batches]
+        for fut in as_completed(futures):
+            if errors:
+                break       # penulis gagal: berhenti, sisa batch tidak perlu di-embed
+            batch, vectors = fut.result()
+            embed_stats.count += len(batch)
+            out.put((batch, vectors))
+        embed_stats.seconds = time.perf_counter() - start
+    finally:
+        # error embed / upsert / Ctrl+C: batalkan batch yang belum jalan (panggilan API berbayar),
+        # hanya menunggu batch yang sedang berjalan
+        pool.shutdown(wait=True, cancel_futures=True)
+        out.put(None)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+    return embed_stats, write_stats
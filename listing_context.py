@@ -0,0 +1,171 @@
+#listing_context.py
+#susun Data Property ringkas untuk property_finder_prompt: 1 baris per listing dengan format tetap,
+#catatan (info_tambahan) dipangkas ke bagian yang relevan dengan pertanyaan, total dibatasi budget token
+import os
+import re
+
+from listing_engine import SEPARATOR, tokenize
+from token_count import count_tokens
+
+LISTING_CONTEXT = os.getenv("LISTING_CONTEXT", "compact")                 # compact | raw
+LISTING_CONTEXT_TOKENS = int(os.getenv("LISTING_CONTEXT_TOKENS", "1500"))
+LISTING_CONTEXT_ENCODING = os.getenv("LISTING_CONTEXT_ENCODING", "o200k_base")
+NOTE_MAX_CHARS = int(os.getenv("LISTING_NOTE_MAX_CHARS", "160"))
+
+# kata yang ada di hampir semua pertanyaan; tidak dipakai untuk memilih potongan catatan
+STOPWORDS = {
+    "yang", "dan", "di", "ke", "dari", "untuk", "dengan", "ada", "ini", "itu", "saya", "mau", "cari", "carikan",
+    "tolong", "dong", "ya", "apa", "berapa", "mana", "daerah", "sekitar", "harga", "dibawah", "diatas", "bawah",
+    "atas", "juta", "miliar", "milyar", "rumah", "ruko", "tanah", "gudang", "apartment", "apartemen", "gedung",
+    "dijual", "disewa", "jual", "sewa", "properti", "property", "listing", "lokasi", "kamar", "tidur", "mandi",
+    "luas", "lantai", "tingkat", "yg", "kak", "min", "pak", "bu",
+}
+
+FIELD_LINE = re.compile(r"^(harga|Spesifikasi|keyword lokasi|Catatan|Link Url|Lokasi|Peta)\s*:\s*(.*)$", re.I)
+
+def query_terms(x: dict) -> set:
+    """Kata kunci pertanyaan (rewrite_question + keyword filter JSON) untuk memilih potongan catatan."""
+    text = x.get("rewrite_question") or x.get("question") or ""
+    param = x.get("json_query")
+    if isinstance(param, dict) and param.get("keyword"):
+        text += " " + str(param["keyword"])
+    return {t for t in tokenize(text) if len(t) > 2 and t not in STOPWORDS and not t.isdigit()}
+
+def format_price(value) -> str | None:
+    try:
+        price = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    if price <= 0:
+        return None
+    # format yang dikenali eval.extract_price: "Rp 300.000.000"
+    return "Rp " + f"{price:,}".replace(",", ".")
+
+def fmt_num(value) -> str | None:
+    if value in (None, ""):
+        return None
+    try:
+        f = float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(int(f)) if f.is_integer() else str(f)
+
+def spec_from_metadata(meta: dict) -> str:
+    """Spesifikasi dengan penulisan yang sama seperti page_content (2 KT, LT 108 m², 1 lantai, ...)."""
+    parts = []
+    for key, fmt in (
+        ("kamar_tidur", "{} KT"),
+        ("kamar_mandi", "{} KM"),
+        ("luas_tanah", "LT {} m²"),
+        ("luas_bangunan", "LB {} m²"),
+        ("lebar_bangunan", "lebar {} m"),
+        ("jumlah_lantai", "{} lantai"),
+    ):
+        v = fmt_num(meta.get(key))
+        if v is not None and v != "0":
+            parts.append(fmt.format(v))
+    return ", ".join(parts)
+
+def trim_note(note: str, terms: set, limit: int = NOTE_MAX_CHARS) -> str:
+    """Ambil potongan catatan (per baris / kalimat) yang memuat kata kunci pertanyaan."""
+    if not note or not terms:
+        return ""
+    pieces = [p.strip(" .;,-") for p in re.split(r"[\n\r]+|(?<=[.;!])\s+", note)]
+    kept = [p for p in pieces if p and terms.intersection(tokenize(p))]
+    text = "; ".join(dict.fromkeys(kept))
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+def render_line(n: int, title: str, kind: str, price: str | None, spec: str, area: str, note: str, url: str) -> str:
+    title = re.sub(r"\s+", " ", title).strip()
+    fields = [f"{n}. {title}"]
+    if kind and kind.lower() not in title.lower():
+        fields.append(kind)
+    fields += [f for f in (price, spec) if f]
+    if area:
+        fields.append(f"Lokasi: {area}")
+    if note:
+        fields.append(f"Catatan: {note}")
+    if url:
+        fields.append(f"Link: {url}")
+    return " | ".join(fields)
+
+def join_area(*parts) -> str:
+    seen, out = set(), []
+    for part in parts:
+        for p in str(part or "").split(","):
+            p = p.strip()
+            if p and p.lower() not in seen:
+                seen.add(p.lower())
+                out.append(p)
+    return ", ".join(out)
+
+def line_from_metadata(n: int, meta: dict, terms: set) -> str:
+    kind = " ".join(str(meta.get(k) or "") for k in ("jenis_listing", "kategori")).strip()
+    return render_line(
+        n,
+        str(meta.get("title") or "").strip(),
+        kind,
+        format_price(meta.get("price")),
+        spec_from_metadata(meta),
+        join_area(meta.get("area_string"), meta.get("kecamatan"), meta.get("kota")),
+        trim_note(str(meta.get("info_tambahan") or ""), terms),
+        str(meta.get("url_view") or ""),
+    )
+
+def line_from_text(n: int, text: str, terms: set) -> str:
+    """
+    Listing dalam format page_content (juga format teks /query_listing) → baris ringkas.
+    Teks yang tidak dikenali dikembalikan apa adanya.
+    """
+    lines = [l.strip() for l in text.strip().splitlines() if l.strip()]
+    fields = {}
+    for l in lines[1:]:
+        m = FIELD_LINE.match(l)
+        if m:
+            fields[m.group(1).lower()] = m.group(2).strip()
+    if not lines or "link url" not in fields:
+        return text.strip()
+
+    title, _, place = lines[0].partition(" — ")
+    kind = lines[1].replace("·", " ").split() if len(lines) > 1 and not FIELD_LINE.match(lines[1]) else []
+    return render_line(
+        n,
+        title.strip(),
+        " ".join(kind),
+        format_price(fields.get("harga")),
+        fields.get("spesifikasi", ""),
+        join_area(fields.get("keyword lokasi"), place),
+        trim_note(fields.get("catatan", ""), terms),
+        fields["link url"],
+    )
+
+def fit_budget(lines: list, budget: int = LISTING_CONTEXT_TOKENS) -> str:
+    """Tambahkan listing sesuai urutan sampai budget token habis (listing pertama selalu masuk)."""
+    out, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line, LISTING_CONTEXT_ENCODING)
+        if out and used + tokens > budget:
+            break
+        out.append(line)
+        used += tokens
+    return "\n".join(out)
+
+def context_from_docs(docs: list, x: dict, limit: int = 15) -> str:
+    """Data Property dari Document hasil vector search (metadata listing dari ingest)."""
+    terms = query_terms(x)
+    lines = []
+    for doc in docs[:limit]:
+        meta = getattr(doc, "metadata", None) or {}
+        if meta.get("url_view") and meta.get("title"):
+            lines.append(line_from_metadata(len(lines) + 1, meta, terms))
+        elif getattr(doc, "page_content", None):
+            lines.append(line_from_text(len(lines) + 1, doc.page_content, terms))
+    return fit_budget(lines)
+
+def context_from_text(documents: str, x: dict) -> str:
+    """Data Property dari teks /query_listing (listing dipisah SEPARATOR)."""
+    if not documents or LISTING_CONTEXT != "compact":
+        return documents
+    terms = query_terms(x)
+    entries = [e for e in documents.split(SEPARATOR.strip()) if e.strip()]
+    return fit_budget([line_from_text(i + 1, e, terms) for i, e in enumerate(entries)])
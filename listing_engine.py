@@ -0,0 +1,206 @@
+#listing_engine.py
+#mesin filter listing in-process (pengganti /query_listing) di atas listings.json
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+LISTINGS_DIR = os.getenv("LISTINGS_DIR", "data/embeds")
+SEPARATOR = "\n\n---------\n\n"
+
+# kolom numerik yang bisa di-filter (key filter JSON -> field listings.json)
+NUMERIC_FIELDS = ("price", "kamar_tidur", "luas_tanah", "luas_bangunan", "lebar_bangunan", "jumlah_lantai")
+MIN_FILTERS = {
+    # sama dengan evaluate_constraints di eval.py: nilai listing >= permintaan
+    "kamar_tidur": "kamar_tidur",
+    "luas_bangunan": "luas_bangunan",
+    "luas_tanah": "luas_tanah",
+    "lebar_bangunan": "lebar_bangunan",
+}
+TIPE_LISTING = {1: "dijual", 2: "disewa", 3: "dilelang"}
+JENIS_PROPERTI = {1: "rumah", 2: "ruko", 3: "tanah", 4: "apartment", 5: "gudang", 6: "gedung"}
+TEXT_FIELDS = ("area_string", "title", "address", "kota", "kecamatan", "kelurahan")
+
+def tokenize(text: str) -> list:
+    return re.findall(r"\w+", (text or "").lower())
+
+def to_number(v):
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+class ListingEngine:
+    """
+    Index kolumnar listings.json:
+    - kolom numerik = array float (NaN = tidak diisi) + urutan terurut untuk range filter,
+    - kategori / jenis_listing = kode integer,
+    - keyword / alamat = inverted index token -> array baris.
+    Hasil diurutkan dari listing yang paling baru di-update, dipotong per page/paginate.
+    """
+
+    def __init__(self, embeds_dir: str = LISTINGS_DIR):
+        self.embeds_dir = Path(embeds_dir)
+        self.load()
+
+    @property
+    def json_path(self) -> Path:
+        return self.embeds_dir / "listings.json"
+
+    def load(self):
+        rows = json.loads(self.json_path.read_text(encoding="utf-8"))
+        self.mtime = self.json_path.stat().st_mtime
+        self.size = len(rows)
+
+        self.columns = {}
+        self.sorted_index = {}
+        for field in NUMERIC_FIELDS:
+            col = np.array([to_number(r.get(field)) for r in rows], dtype=np.float64)
+            order = np.argsort(col, kind="stable")       # NaN di akhir
+            valid = int(np.count_nonzero(~np.isnan(col)))
+            self.columns[field] = col
+            self.sorted_index[field] = (order[:valid], col[order[:valid]])
+
+        self.kategori_labels, self.kategori = self._codes(rows, "kategori")
+        self.jenis_labels, self.jenis_listing = self._codes(rows, "jenis_listing")
+
+        postings = {}
+        for i, r in enumerate(rows):
+            tokens = set()
+            for field in TEXT_FIELDS:
+                tokens.update(tokenize(r.get(field)))
+            for t in tokens:
+                postings.setdefault(t, []).append(i)
+        self.inverted = {t: np.array(ids, dtype=np.int32) for t, ids in postings.items()}
+
+        # urutan tampil: updated_at terbaru dulu, lalu listing_id terbesar
+        recency = sorted(range(self.size), key=lambda i: (rows[i].get("updated_at") or "", rows[i].get("listing_id") or 0), reverse=True)
+        self.rank_order = np.array(recency, dtype=np.int32)
+
+        self.listing_ids = [r.get("listing_id") for r in rows]
+        self.texts = [self._read_content(r) for r in rows]
+        self._lower_texts = [t.lower() for t in self.texts]
+
+    def _codes(self, rows, field):
+        labels = {}
+        codes = np.array([labels.setdefault((r.get(field) or "").strip().lower(), len(labels)) for r in rows], dtype=np.int16)
+        return labels, codes
+
+    def _read_content(self, row) -> str:
+        txt_dir = self.embeds_dir / "page_content"
+        names = []
+        if row.get("page_content_path"):
+            names.append(os.path.basename(row["page_content_path"]))
+        names.append(f"listing-{row.get('listing_id')}.txt")
+        for name in names:
+            try:
+                return (txt_dir / name).read_text(encoding="utf-8").strip()
+            except OSError:
+                continue
+        return f"{row.get('title') or ''}\nLink Url: {row.get('url_view') or ''}".strip()
+
+    # ---------- filter ----------
+    def _range(self, field, lo=None, hi=None) -> np.ndarray:
+        order, values = self.sorted_index[field]
+        left = 0 if lo is None else np.searchsorted(values, lo, side="left")
+        right = len(values) if hi is None else np.searchsorted(values, hi, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[left:right]] = True
+        return mask
+
+    def _tokens(self, text) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for t in tokenize(text):
+            ids = self.inverted.get(t)
+            hit = np.zeros(self.size, dtype=bool)
+            if ids is not None:
+                hit[ids] = True
+            mask &= hit
+        return mask
+
+    def _label(self, labels, codes, label) -> np.ndarray:
+        code = labels.get(label)
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return codes == code
+
+    def _contains(self, mask, phrase) -> np.ndarray:
+        phrase = str(phrase).strip().lower()
+        for i in np.flatnonzero(mask):
+            if phrase not in self._lower_texts[i]:
+                mask[i] = False
+        return mask
+
+    def match(self, param: dict) -> np.ndarray:
+        """Indeks baris yang lolos filter, sudah terurut untuk ditampilkan."""
+        mask = np.ones(self.size, dtype=bool)
+
+        harga_min, harga_max = to_number(param.get("harga_min")), to_number(param.get("harga_max"))
+        if harga_min is not None or harga_max is not None:
+            mask &= self._range("price", harga_min, harga_max)
+
+        for key, field in MIN_FILTERS.items():
+            value = to_number(param.get(key))
+            if value is not None:
+                mask &= self._range(field, lo=value)
+
+        tingkat = to_number(param.get("jumlah_tingkat"))
+        if tingkat is not None:
+            mask &= self._range("jumlah_lantai", tingkat, tingkat)
+
+        tipe = to_number(param.get("tipe_listing"))
+        if tipe is not None:
+            mask &= self._label(self.jenis_labels, self.jenis_listing, TIPE_LISTING.get(int(tipe)))
+        jenis = to_number(param.get("jenis_properti"))
+        if jenis is not None:
+            mask &= self._label(self.kategori_labels, self.kategori, JENIS_PROPERTI.get(int(jenis)))
+
+        for key in ("keyword", "alamat"):
+            if param.get(key):
+                mask &= self._tokens(param[key])
+
+        for key in ("kondisi", "mata_angin"):
+            if param.get(key):
+                mask = self._contains(mask, param[key])
+
+        return self.rank_order[mask[self.rank_order]]
+
+    def query(self, param: dict) -> list:
+        """Teks listing untuk page yang diminta (page mulai 1, default paginate 5)."""
+        rows = self.match(param)
+        page = max(int(param.get("page") or 1), 1)
+        paginate = max(int(param.get("paginate") or 5), 1)
+        start = (page - 1) * paginate
+        return [self.texts[i] for i in rows[start:start + paginate]]
+
+    def query_text(self, param: dict) -> str:
+        return SEPARATOR.join(self.query(param))
+
+_engine = None
+_engine_lock = threading.Lock()
+_last_check = 0.0
+
+def get_engine(check_interval: float = 5.0) -> ListingEngine:
+    """Engine bersama per proses; dimuat ulang bila listings.json berubah."""
+    global _engine, _last_check
+    with _engine_lock:
+        now = time.monotonic()
+        if _engine is None:
+            _engine = ListingEngine()
+            _last_check = now
+        elif now - _last_check >= check_interval:
+            _last_check = now
+            try:
+                changed = _engine.json_path.stat().st_mtime != _engine.mtime
+            except OSError:
+                changed = False
+            if changed:
+                print("[listing_engine] listings.json berubah, memuat ulang index ...")
+                _engine = ListingEngine(_engine.embeds_dir)
+        return _engine
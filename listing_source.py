@@ -0,0 +1,57 @@
+#listing_source.py
+#ambil teks listing untuk filter JSON: API /query_listing (dengan cache per filter + page) atau engine lokal
+import os
+
+from dotenv import load_dotenv
+from rich import print
+
+from helper import post_query, apost_query
+from answer_cache import answer_cache
+from listing_engine import get_engine
+from tracing import span
+
+load_dotenv()
+
+DATA_API_URL = os.getenv("DATA_API_URL")
+API_TOKEN = os.getenv("API_TOKEN")
+FETCH_PROPERTY_URL = f"{DATA_API_URL}/query_listing"
+
+# "api"   = MySQL lewat DATA_API_URL/query_listing
+# "local" = listing_engine di atas data/embeds/listings.json (tanpa network)
+LISTING_BACKEND = os.getenv("LISTING_BACKEND", "api")
+
+def local_listing(param):
+    print("[italic bold green]Mencari listing di index lokal ... [/italic bold green]\n")
+    with span("listing_engine query", "local"):
+        return get_engine().query_text(param)
+
+def cached_docs(param):
+    documents = answer_cache.get_docs(param)
+    if documents is not None:
+        print("[italic bold green]Memakai hasil pencarian dari cache ... [/italic bold green]\n")
+    return documents
+
+def remember_docs(param, filter_result):
+    if filter_result is None:
+        # API gagal / circuit terbuka: jangan di-cache, pemanggil yang memutuskan fallback
+        return None
+    documents = filter_result.text
+    answer_cache.put_docs(param, documents)
+    return documents
+
+def query_listing(param: dict) -> str | None:
+    """Teks listing untuk filter; None bila API gagal (bedakan dengan "" = tidak ada hasil)."""
+    if LISTING_BACKEND == "local":
+        return local_listing(param)
+    documents = cached_docs(param)
+    if documents is None:
+        documents = remember_docs(param, post_query(FETCH_PROPERTY_URL,param,API_TOKEN))
+    return documents
+
+async def aquery_listing(param: dict) -> str | None:
+    if LISTING_BACKEND == "local":
+        return local_listing(param)
+    documents = cached_docs(param)
+    if documents is None:
+        documents = remember_docs(param, await apost_query(FETCH_PROPERTY_URL,param,API_TOKEN))
+    return documents
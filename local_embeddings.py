@@ -0,0 +1,215 @@
+#local_embeddings.py
+#backend embedding lokal multilingual-e5: model di-export ke ONNX + kuantisasi int8, dijalankan onnxruntime di CPU
+#(1 sesi persisten per proses); query bersamaan digabung oleh embedding_batcher; pemilihan backend embedding (openai | e5 | e5-onnx) untuk ingest & serving
+import argparse
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from rich import print
+
+E5_MODEL = os.getenv("E5_MODEL", "intfloat/multilingual-e5-base")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "models/multilingual-e5-base-onnx-int8")
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))          # 0 = otomatis (semua core)
+EMBED_ONNX_BATCH = int(os.getenv("EMBED_ONNX_BATCH", "16"))             # dokumen per forward pass saat ingest
+EMBED_QUERY_BATCH = int(os.getenv("EMBED_QUERY_BATCH", "32"))           # maksimal query per forward pass
+E5_MAX_LENGTH = int(os.getenv("E5_MAX_LENGTH", "512"))
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+
+# e5 dilatih dengan prefix: pertanyaan "query: ...", dokumen "passage: ..."
+QUERY_PREFIX = "query: "
+PASSAGE_PREFIX = "passage: "
+
+BACKENDS = ("openai", "e5", "e5-onnx")
+
+def backend_model(backend: str) -> str:
+    """
+    Identitas vektor per backend (dicatat di manifest ingest & metadata koleksi).
+    e5 dan e5-onnx memakai model yang sama: vektornya sebanding (int8 hanya sedikit berbeda).
+    """
+    if backend == "openai":
+        return OPENAI_EMBED_MODEL
+    if backend in ("e5", "e5-onnx"):
+        return E5_MODEL
+    raise ValueError(f"backend embedding tidak dikenal: {backend} (pilihan: {', '.join(BACKENDS)})")
+
+def export_onnx(model_name: str = E5_MODEL, out_dir: str = EMBED_ONNX_DIR) -> Path:
+    """
+    Export model HF ke ONNX (transformers + torch) lalu kuantisasi dinamis bobot ke int8 (onnxruntime).
+    Hasil: out_dir/model.onnx (int8) + tokenizer.json. Hanya perlu sekali per mesin / image.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    fp32_path = out / "model-fp32.onnx"
+    started = time.perf_counter()
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer([QUERY_PREFIX + "rumah dijual di medan"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(str(fp32_path), str(out / "model.onnx"), weight_type=QuantType.QInt8)
+    fp32_path.unlink(missing_ok=True)
+    tokenizer.save_pretrained(str(out))    # tokenizer.json (fast tokenizer) dipakai saat runtime
+    print(f"[italic bold green]Export ONNX int8 {model_name} selesai dalam {time.perf_counter() - started:.1f} s → {out} [/italic bold green]\n")
+    return out
+
+class E5OnnxEmbeddings(Embeddings):
+    """
+    multilingual-e5 lewat onnxruntime (int8, CPU). Sesi & tokenizer dibuat sekali (lazy) dan dipakai
+    bersama semua thread; 1 forward pass sekaligus (thread CPU sudah dipakai penuh oleh onnxruntime).
+    """
+
+    def __init__(self, model_dir: str = EMBED_ONNX_DIR, model_name: str = E5_MODEL, threads: int = EMBED_ONNX_THREADS,
+                 batch_size: int = EMBED_ONNX_BATCH, max_length: int = E5_MAX_LENGTH):
+        self.model_dir = Path(model_dir)
+        self.model_name = f"{model_name}:onnx-int8"   # dipakai CachedEmbeddings sebagai bagian key
+        self.base_model = model_name
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        self._session = None
+        self._tokenizer = None
+        self._inputs = ()
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        self.counters = {"queries": 0, "query_batches": 0, "documents": 0}
+
+    # ---------- model ----------
+    def _load(self):
+        with self._load_lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            if not (self.model_dir / "model.onnx").exists():
+                print(f"Model ONNX belum ada di {self.model_dir}, export dari {self.base_model} ...")
+                export_onnx(self.base_model, str(self.model_dir))
+
+            started = time.perf_counter()
+            tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            pad_id = tokenizer.token_to_id("<pad>")
+            tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 0, pad_token="<pad>")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(str(self.model_dir / "model.onnx"), options, providers=["CPUExecutionProvider"])
+
+            self._inputs = tuple(i.name for i in session.get_inputs())
+            self._tokenizer = tokenizer
+            self._session = session
+            self._encode([QUERY_PREFIX + "pemanasan"])     # warm-up: alokasi buffer sesi
+            print(f"[italic bold green]Embedding {self.model_name} siap dalam {time.perf_counter() - started:.1f} s [/italic bold green]\n")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """1 forward pass: mean pooling hidden state (tanpa padding) lalu normalisasi L2."""
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    # ---------- Embeddings ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._session is None:
+            self._load()
+        # urutkan per panjang supaya padding per batch minimal
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            with self._infer_lock:
+                vectors = self._encode([PASSAGE_PREFIX + texts[i] for i in chunk])
+            for i, vec in zip(chunk, vectors):
+                out[i] = vec.tolist()
+        self.counters["documents"] += len(texts)
+        return out
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Beberapa query dalam 1 forward pass (dipakai embedding_batcher)."""
+        if self._session is None:
+            self._load()
+        out = []
+        for start in range(0, len(texts), EMBED_QUERY_BATCH):
+            with self._infer_lock:
+                vectors = self._encode([QUERY_PREFIX + t for t in texts[start:start + EMBED_QUERY_BATCH]])
+            out += [vec.tolist() for vec in vectors]
+        self.counters["queries"] += len(texts)
+        self.counters["query_batches"] += 1
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # inferensi CPU-bound: jangan blok event loop
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+class E5Embeddings(HuggingFaceEmbeddings):
+    """multilingual-e5 lewat sentence-transformers (torch), dengan prefix query / passage."""
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Beberapa query dalam 1 forward pass (dipakai embedding_batcher)."""
+        return self._embed(texts, self.query_encode_kwargs)
+
+def load_embeddings(backend: str) -> Embeddings:
+    """Objek embeddings mentah (tanpa cache) untuk backend."""
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        # pastikan OPENAI_API_KEY ada di .env
+        return OpenAIEmbeddings(model=OPENAI_EMBED_MODEL)
+    if backend == "e5":
+        return E5Embeddings(
+            model_name=E5_MODEL,
+            encode_kwargs={"normalize_embeddings": True, "prompt": PASSAGE_PREFIX},
+            query_encode_kwargs={"normalize_embeddings": True, "prompt": QUERY_PREFIX},
+        )
+    if backend == "e5-onnx":
+        return E5OnnxEmbeddings()
+    raise ValueError(f"backend embedding tidak dikenal: {backend} (pilihan: {', '.join(BACKENDS)})")
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Export multilingual-e5 ke ONNX int8 untuk backend embedding e5-onnx")
+    p.add_argument("--model", default=E5_MODEL, help="Nama model HF")
+    p.add_argument("--out", default=EMBED_ONNX_DIR, help="Folder tujuan (model.onnx + tokenizer.json)")
+    return p.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_onnx(args.model, args.out)
@@ -0,0 +1,201 @@
+#metrics.py
+#metrik format Prometheus (text exposition 0.0.4) untuk endpoint /metrics
+# - latency, token, cost, branch: di-update di finish_turn (1 lock + beberapa penjumlahan per giliran)
+# - cache, query_listing, session store, history writer: dibaca dari stats() masing-masing saat scrape
+import threading
+
+BRANCH_NAMES = {"1": "property", "2": "update", "3": "greeting"}
+
+TURN_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)                 # detik, 1 giliran penuh
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8)       # detik, 1 tahap
+
+_lock = threading.Lock()
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def fmt_value(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{fmt_labels(self.labels, key)} {fmt_value(v)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = TURN_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # label -> [count per bucket (+Inf terakhir), sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{fmt_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{fmt_labels(self.labels, key)} {fmt_value(total)}")
+            lines.append(f"{self.name}_count{fmt_labels(self.labels, key)} {cumulative}")
+        return lines
+
+# ---------- diisi per giliran ----------
+turn_latency = Histogram("chatbot_turn_latency_seconds", "Durasi 1 giliran chat per pipeline dan branch klasifikasi.",
+                         ("pipeline", "branch"), TURN_BUCKETS)
+stage_latency = Histogram("chatbot_stage_latency_seconds", "Durasi per tahap chain (rewrite, classify, json, retrieval, answer, ...).",
+                          ("pipeline", "stage"), STAGE_BUCKETS)
+turns = Counter("chatbot_turns_total", "Giliran chat yang selesai.", ("pipeline", "branch", "source"))
+turn_errors = Counter("chatbot_turn_errors_total", "Giliran chat yang gagal (exception).", ("pipeline",))
+llm_requests = Counter("chatbot_llm_requests_total", "LLM call yang berhasil (get_openai_callback).", ("pipeline",))
+llm_tokens = Counter("chatbot_llm_tokens_total", "Token LLM.", ("pipeline", "type"))
+llm_cost_usd = Counter("chatbot_llm_cost_usd_total", "Biaya LLM dalam USD.", ("pipeline",))
+llm_cost_idr = Counter("chatbot_llm_cost_idr_total", "Biaya LLM dalam IDR.", ("pipeline",))
+
+REGISTRY = [turn_latency, stage_latency, turns, turn_errors, llm_requests, llm_tokens, llm_cost_usd, llm_cost_idr]
+
+def branch_name(value) -> str:
+    if not value:
+        return "unknown"
+    return BRANCH_NAMES.get(value, value if str(value).startswith("fast_") else "other")
+
+def observe_turn(pipeline: str, ctx, store_data: dict):
+    """Dipanggil finish_turn setelah store_data disusun."""
+    branch = branch_name(ctx.branch)
+    turn_latency.observe(store_data["response_time"] / 1000, pipeline=pipeline, branch=branch)
+    for stage, ms in ctx.timings.items():
+        if stage != "total":
+            stage_latency.observe(ms / 1000, pipeline=pipeline, stage=stage)
+    turns.inc(pipeline=pipeline, branch=branch, source=store_data.get("method") or "none")
+    llm_requests.inc(store_data["response_count"], pipeline=pipeline)
+    llm_tokens.inc(store_data["input_token"], pipeline=pipeline, type="input")
+    llm_tokens.inc(store_data["output_token"], pipeline=pipeline, type="output")
+    llm_cost_usd.inc(store_data["cost_usd"], pipeline=pipeline)
+    llm_cost_idr.inc(store_data["cost_idr"], pipeline=pipeline)
+
+# ---------- dibaca saat scrape ----------
+def sample(lines: list, name: str, kind: str, help: str, values: list):
+    """values: list (dict label, nilai); nilai None dilewati."""
+    values = [(l, v) for l, v in values if v is not None]
+    if not values:
+        return
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, v in values:
+        lines.append(f"{name}{fmt_labels(tuple(labels), tuple(labels.values()))} {fmt_value(v)}")
+
+def collect_runtime() -> list:
+    # import di sini: modul-modul ini tidak perlu dimuat hanya untuk mengimpor metrics
+    import fast_path
+    from answer_cache import answer_cache
+    from embedding_batcher import all_batchers
+    from history_writer import history_writer
+    from http_client import http
+    from reranker import RERANK, reranker
+    from session_store import chat_store, query_store
+    from vector_store import all_managers
+
+    lines = []
+    ac = answer_cache.stats()
+    sample(lines, "chatbot_search_cache_requests_total", "counter", "Lookup cache hasil pencarian listing.",
+           [({"result": "hit"}, ac["hits"]), ({"result": "miss"}, ac["misses"])])
+    sample(lines, "chatbot_answer_cache_hits_total", "counter", "Jawaban yang diambil dari cache.", [({}, ac["answer_hits"])])
+    sample(lines, "chatbot_search_cache_entries", "gauge", "Jumlah entry cache hasil pencarian.", [({}, ac["entries"])])
+
+    fp = fast_path.stats()
+    sample(lines, "chatbot_fast_path_requests_total", "counter", "Giliran yang dicek fast path, per hasil route.",
+           [({"route": "greeting"}, fp[fast_path.GREETING]), ({"route": "more"}, fp[fast_path.MORE]),
+            ({"route": "none"}, fp["total"] - fp["hits"])])
+
+    emb = []
+    for m in all_managers():
+        s = m.embedding_stats()
+        if s:
+            emb += [({"collection": m.collection_name, "result": "hit"}, s["hits"] + s["disk_hits"]),
+                    ({"collection": m.collection_name, "result": "miss"}, s["misses"])]
+    sample(lines, "chatbot_embedding_cache_requests_total", "counter", "Lookup cache embedding query.", emb)
+
+    eb = [b.stats() for b in all_batchers()]
+    sample(lines, "chatbot_embedding_batch_queries_total", "counter", "Query embedding yang lewat batcher.",
+           [({"model": s["model"]}, s["queries"]) for s in eb])
+    sample(lines, "chatbot_embedding_batches_total", "counter", "Panggilan embedding hasil gabungan query (1 per batch).",
+           [({"model": s["model"]}, s["batches"]) for s in eb])
+    sample(lines, "chatbot_embedding_batch_largest", "gauge", "Ukuran batch query embedding terbesar sejauh ini.",
+           [({"model": s["model"]}, s["largest"]) for s in eb])
+
+    if RERANK:
+        sample(lines, "chatbot_rerank_total", "counter", "Permintaan rerank per hasil (reranked / dilewati).",
+               [({"result": k}, v) for k, v in reranker.stats_snapshot().items()])
+
+    hm = http.metrics()
+    for key, kind, help in (
+        ("requests", "counter", "HTTP request keluar (termasuk retry)."),
+        ("failures", "counter", "HTTP request keluar yang gagal (timeout, koneksi, status error)."),
+        ("retries", "counter", "Retry HTTP request keluar."),
+        ("short_circuits", "counter", "Request yang ditolak karena circuit breaker terbuka."),
+        ("new_connections", "counter", "Koneksi baru yang dibuka (sisanya memakai ulang keep-alive)."),
+    ):
+        sample(lines, f"chatbot_http_{key}_total", kind, help, [({"endpoint": n}, s[key]) for n, s in hm.items()])
+    sample(lines, "chatbot_http_circuit_open", "gauge", "1 bila circuit breaker endpoint sedang terbuka.",
+           [({"endpoint": n}, int(s["circuit"] != "closed")) for n, s in hm.items()])
+
+    stores = [("chat", chat_store.stats()), ("query", query_store.stats())]
+    sample(lines, "chatbot_session_store_sessions", "gauge", "Session yang dipegang di memori.",
+           [({"store": n}, s["sessions"]) for n, s in stores])
+    sample(lines, "chatbot_session_store_bytes", "gauge", "Perkiraan ukuran isi session store di memori.",
+           [({"store": n}, s["bytes"]) for n, s in stores])
+    sample(lines, "chatbot_session_store_evictions_total", "counter", "Session yang dikeluarkan dari memori (TTL / LRU / batas ukuran).",
+           [({"store": n}, s["evictions"]) for n, s in stores])
+
+    hw = history_writer.stats()
+    sample(lines, "chatbot_history_queue", "gauge", "Record chat_history yang menunggu dikirim.", [({}, hw["queued"])])
+    sample(lines, "chatbot_history_records_total", "counter", "Record chat_history per hasil pengiriman.",
+           [({"result": "sent"}, hw["sent"]), ({"result": "journal"}, hw["spilled"])])
+    return lines
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += collect_runtime()
+    return "\n".join(lines) + "\n"
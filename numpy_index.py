@@ -0,0 +1,326 @@
+#numpy_index.py
+#index vector brute force tanpa Chroma: matriks embedding ternormalisasi (.npy, di-memory-map) + tabel metadata
+#numerik/kategori untuk filter; dibangun ingest.py dari koleksi Chroma, top-k dengan dot product + argpartition.
+#Opsional terkompresi (int8 / product quantization): kode kecil di memori untuk skor kasar, shortlist dihitung ulang
+#dengan vektor penuh float32 (mmap, hanya baris shortlist yang dibaca dari disk)
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from index_files import MARKER_FILE, IndexCache, atomic_dir
+
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float16")          # float16 | float32
+NUMPY_INDEX_BLOCK = int(os.getenv("NUMPY_INDEX_BLOCK", "8192"))         # baris per blok saat matriks float16 / kode dipindai
+NUMPY_INDEX_QUANT = os.getenv("NUMPY_INDEX_QUANT", "none")              # none | int8 | pq
+NUMPY_RESCORE = int(os.getenv("NUMPY_RESCORE", "4"))                    # shortlist = k x faktor ini; 0 = tanpa rescoring
+PQ_SUB_DIM = 16                                                         # default dimensi per subruang PQ
+PQ_CENTROIDS = 256                                                      # 1 byte per subruang
+
+# field metadata yang bisa difilter (sama dengan field di vector_filter.build_where)
+NUMERIC_FIELDS = ("price", "kamar_tidur", "kamar_mandi", "luas_tanah", "luas_bangunan", "lebar_bangunan", "jumlah_lantai")
+CATEGORY_FIELDS = ("jenis_listing", "kategori")
+
+COMPARE = {
+    "$eq": np.equal,
+    "$ne": np.not_equal,
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+def index_dir(persist_dir: str, collection: str) -> Path:
+    return Path(persist_dir) / f"npy-{collection}"
+
+def as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def blocked_dot(matrix, q: np.ndarray) -> np.ndarray:
+    """matrix @ q untuk matriks non-float32 (float16 / int8): dinaikkan ke float32 per blok supaya memakai BLAS."""
+    if matrix.dtype == np.float32:
+        return matrix @ q
+    out = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), NUMPY_INDEX_BLOCK):
+        block = matrix[start:start + NUMPY_INDEX_BLOCK]
+        out[start:start + len(block)] = block.astype(np.float32) @ q
+    return out
+
+def int8_quantize(matrix: np.ndarray) -> dict:
+    """Kuantisasi skalar simetris per dimensi: x ≈ kode * skala (1 byte per dimensi)."""
+    scale = np.abs(matrix).max(axis=0) / 127
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return {"int8_codes": codes, "int8_scale": scale.astype(np.float32)}
+
+def kmeans(x: np.ndarray, k: int, iters: int, rng) -> np.ndarray:
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        dist = (centroids ** 2).sum(axis=1)[None, :] - 2 * x @ centroids.T
+        assign = dist.argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # centroid kosong: ambil ulang titik acak
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+    return centroids
+
+def pq_subspaces(dim: int, subspaces: int = 0) -> int:
+    if subspaces:
+        if dim % subspaces:
+            raise ValueError(f"dim {dim} tidak habis dibagi {subspaces} subruang PQ")
+        return subspaces
+    return dim // PQ_SUB_DIM if dim % PQ_SUB_DIM == 0 else dim
+
+def pq_train(matrix: np.ndarray, subspaces: int = 0, iters: int = 15, sample: int = 20_000, seed: int = 0) -> dict:
+    """
+    Product quantization: vektor dipotong menjadi m subruang, tiap subruang diwakili 1 dari 256 centroid
+    (k-means) → m byte per vektor. Skor = Σ tabel (query_sub · centroid) per subruang.
+    """
+    n, dim = matrix.shape
+    m = pq_subspaces(dim, subspaces)
+    sub = dim // m
+    rng = np.random.default_rng(seed)
+    train = matrix[rng.choice(n, min(n, sample), replace=False)] if n > sample else matrix
+    k = min(PQ_CENTROIDS, len(train))
+    centroids = np.zeros((m, k, sub), dtype=np.float32)
+    codes = np.empty((n, m), dtype=np.uint8)
+    for j in range(m):
+        part = slice(j * sub, (j + 1) * sub)
+        centroids[j] = kmeans(np.ascontiguousarray(train[:, part], dtype=np.float32), k, iters, rng)
+        for start in range(0, n, NUMPY_INDEX_BLOCK):
+            x = matrix[start:start + NUMPY_INDEX_BLOCK, part]
+            dist = (centroids[j] ** 2).sum(axis=1)[None, :] - 2 * x @ centroids[j].T
+            codes[start:start + len(x), j] = dist.argmin(axis=1)
+    return {"pq_codes": codes, "pq_centroids": centroids}
+
+def compress(matrix: np.ndarray, quant: str, subspaces: int = 0) -> dict:
+    if quant == "int8":
+        return int8_quantize(matrix)
+    if quant == "pq":
+        return pq_train(matrix, subspaces)
+    if quant == "none":
+        return {}
+    raise ValueError(f"mode kuantisasi tidak dikenal: {quant} (pilihan: none, int8, pq)")
+
+class NumpyVectorIndex:
+    """
+    - vectors  : (n, dim) float16/float32, baris sudah dinormalisasi L2 → skor = dot product (cosine),
+    - numeric  : (n, len(NUMERIC_FIELDS)) float32, NaN bila field kosong,
+    - category : (n, len(CATEGORY_FIELDS)) int16, kode ke info["vocab"][field] (-1 bila kosong),
+    - docs.jsonl + doc_offsets : page_content & metadata per baris, dibaca hanya untuk hasil top-k,
+    - opsional int8_codes/int8_scale atau pq_codes/pq_centroids : kode terkompresi untuk skor kasar.
+    """
+
+    FILES = ("vectors", "numeric", "category", "doc_offsets")
+    CODE_FILES = ("int8_codes", "int8_scale", "pq_codes", "pq_centroids")
+
+    def __init__(self, vectors, numeric, category, doc_offsets, ids: list, info: dict, docs_blob=None, **codes):
+        self.vectors = vectors
+        self.int8_codes = codes.get("int8_codes")
+        self.int8_scale = codes.get("int8_scale")
+        self.pq_codes = codes.get("pq_codes")
+        self.pq_centroids = codes.get("pq_centroids")
+        self.numeric = numeric
+        self.category = category
+        self.doc_offsets = doc_offsets
+        self.ids = ids
+        self.info = info
+        self.docs_blob = docs_blob
+        self.n_docs = len(ids)
+        self.row_of = {doc_id: i for i, doc_id in enumerate(ids)}
+        self.vocab = {f: {v: i for i, v in enumerate(info["vocab"][f])} for f in CATEGORY_FIELDS}
+
+    # ---------- build / simpan ----------
+    @classmethod
+    def from_collection(cls, collection, backend: str, model: str, dtype: str = NUMPY_INDEX_DTYPE, quant: str = NUMPY_INDEX_QUANT,
+                        subspaces: int = 0, page: int = 5000) -> tuple:
+        """Salin seluruh isi koleksi Chroma (per halaman). Kembalikan (index, baris docs.jsonl)."""
+        ids, vectors, metas, texts = [], [], [], []
+        offset = 0
+        while True:
+            got = collection.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+            if not got["ids"]:
+                break
+            ids += got["ids"]
+            vectors.append(np.asarray(got["embeddings"], dtype=np.float32))
+            metas += [m or {} for m in got["metadatas"]]
+            texts += got["documents"]
+            offset += len(got["ids"])
+
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+        numeric = np.array([[as_float(m.get(f)) for f in NUMERIC_FIELDS] for m in metas], dtype=np.float32).reshape(len(ids), len(NUMERIC_FIELDS))
+        vocab = {f: sorted({str(m[f]) for m in metas if m.get(f) not in (None, "")}) for f in CATEGORY_FIELDS}
+        codes = {f: {v: i for i, v in enumerate(vocab[f])} for f in CATEGORY_FIELDS}
+        category = np.array([[codes[f].get(str(m.get(f)), -1) for f in CATEGORY_FIELDS] for m in metas], dtype=np.int16).reshape(len(ids), len(CATEGORY_FIELDS))
+
+        lines = [json.dumps({"id": i, "page_content": t or "", "metadata": m}, ensure_ascii=False).encode("utf-8") + b"\n"
+                 for i, t, m in zip(ids, texts, metas)]
+        doc_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum([len(l) for l in lines], out=doc_offsets[1:])
+
+        codes = compress(matrix, quant, subspaces) if len(ids) else {}
+        if codes:
+            # vektor index terkompresi hanya dibaca untuk rescoring shortlist (mmap): simpan float32 supaya skor akhir presisi penuh
+            dtype = "float32"
+        info = {"backend": backend, "model": model, "dtype": dtype, "dim": int(matrix.shape[1]) if len(ids) else 0,
+                "count": len(ids), "vocab": vocab, "quant": quant if codes else "none"}
+        index = cls(matrix.astype(dtype), numeric, category, doc_offsets, ids, info, **codes)
+        return index, lines
+
+    def save(self, path: Path, lines: list):
+        with atomic_dir(path) as tmp:
+            for name in self.FILES + self.CODE_FILES:
+                if getattr(self, name) is not None:
+                    np.save(tmp / f"{name}.npy", getattr(self, name))
+            with (tmp / "docs.jsonl").open("wb") as f:
+                f.writelines(lines)
+            (tmp / "info.json").write_text(json.dumps(self.info, ensure_ascii=False), encoding="utf-8")
+            # ids.json terakhir: mtime-nya menandai versi index (IndexCache)
+            (tmp / MARKER_FILE).write_text(json.dumps(self.ids), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "NumpyVectorIndex":
+        path = Path(path)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in cls.FILES}
+        ids = json.loads((path / MARKER_FILE).read_text(encoding="utf-8"))
+        info = json.loads((path / "info.json").read_text(encoding="utf-8"))
+        # tabel metadata kecil & dibaca penuh setiap filter: simpan di memori; matriks vector tetap mmap
+        arrays["numeric"] = np.array(arrays["numeric"])
+        arrays["category"] = np.array(arrays["category"])
+        # kode terkompresi dipindai penuh setiap query: di memori; vektor penuh hanya dibaca untuk shortlist
+        for name in cls.CODE_FILES:
+            if (path / f"{name}.npy").exists():
+                arrays[name] = np.load(path / f"{name}.npy")
+        size = (path / "docs.jsonl").stat().st_size
+        blob = np.memmap(path / "docs.jsonl", dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+        return cls(ids=ids, info=info, docs_blob=blob, **arrays)
+
+    # ---------- filter ----------
+    def mask(self, where: dict | None):
+        """
+        Mask boolean dari klausa `where` gaya Chroma (keluaran vector_filter.build_where).
+        Field kosong tidak lolos filter apa pun (sama seperti Chroma). None = tanpa filter.
+        """
+        if not where:
+            return None
+        if "$and" in where:
+            out = np.ones(self.n_docs, dtype=bool)
+            for clause in where["$and"]:
+                out &= self.mask(clause)
+            return out
+        if "$or" in where:
+            out = np.zeros(self.n_docs, dtype=bool)
+            for clause in where["$or"]:
+                out |= self.mask(clause)
+            return out
+
+        (field, cond), = where.items()
+        (op, value), = cond.items() if isinstance(cond, dict) else (("$eq", cond),)
+        if op not in COMPARE:
+            raise ValueError(f"operator filter tidak didukung: {op}")
+        if field in NUMERIC_FIELDS:
+            column = self.numeric[:, NUMERIC_FIELDS.index(field)]
+            return COMPARE[op](column, float(value)) & ~np.isnan(column)
+        if field in CATEGORY_FIELDS:
+            column = self.category[:, CATEGORY_FIELDS.index(field)]
+            code = self.vocab[field].get(str(value), -2)
+            return COMPARE[op](column, code) & (column >= 0)
+        raise ValueError(f"field filter tidak ada di index numpy: {field}")
+
+    # ---------- search ----------
+    @property
+    def quantized(self) -> bool:
+        return self.int8_codes is not None or self.pq_codes is not None
+
+    def scores(self, q: np.ndarray, rows=None) -> np.ndarray:
+        """Skor penuh (cosine) dari matriks vektor; rows terurut supaya akses mmap berurutan."""
+        return blocked_dot(self.vectors if rows is None else self.vectors[rows], q)
+
+    def approx_scores(self, q: np.ndarray, rows=None) -> np.ndarray:
+        """Skor kasar dari kode terkompresi."""
+        if self.int8_codes is not None:
+            codes = self.int8_codes if rows is None else self.int8_codes[rows]
+            # (kode * skala) · q == kode · (q * skala): skala cukup dikalikan ke query
+            return blocked_dot(codes, q * self.int8_scale)
+        m, _, sub = self.pq_centroids.shape
+        table = np.einsum("mkd,md->mk", self.pq_centroids, q.reshape(m, sub))
+        codes = self.pq_codes if rows is None else self.pq_codes[rows]
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), NUMPY_INDEX_BLOCK):
+            block = codes[start:start + NUMPY_INDEX_BLOCK]
+            out[start:start + len(block)] = table[np.arange(m), block].sum(axis=1)
+        return out
+
+    def search(self, query, k: int = 10, where: dict | None = None, rescore: int = NUMPY_RESCORE) -> list:
+        """
+        [(baris, skor)] terurut skor tertinggi, hanya baris yang lolos filter.
+        Index terkompresi: k x rescore kandidat teratas dari skor kasar dihitung ulang dengan vektor penuh (float32).
+        """
+        mask = self.mask(where)
+        rows = None if mask is None else np.flatnonzero(mask)
+        n = self.n_docs if rows is None else len(rows)
+        if not n:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        k = min(k, n)
+
+        if not self.quantized:
+            scores = self.scores(q, rows)
+        else:
+            scores = self.approx_scores(q, rows)
+            if rescore > 0:
+                short = min(n, k * rescore)
+                cand = np.sort(np.argpartition(-scores, short - 1)[:short])
+                rows = cand if rows is None else rows[cand]
+                scores = self.scores(q, rows)
+                k = min(k, len(rows))
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def memory_bytes(self) -> dict:
+        """
+        Ukuran (byte): per_row = yang dipindai per listing setiap query, fixed = skala / codebook PQ,
+        full = vektor penuh (mmap; untuk index terkompresi hanya baris shortlist yang dibaca).
+        """
+        full = self.vectors.nbytes
+        if self.int8_codes is not None:
+            return {"per_row": self.int8_codes.shape[1], "fixed": self.int8_scale.nbytes, "full": full}
+        if self.pq_codes is not None:
+            return {"per_row": self.pq_codes.shape[1], "fixed": self.pq_centroids.nbytes, "full": full}
+        return {"per_row": self.vectors.shape[1] * self.vectors.dtype.itemsize, "fixed": 0, "full": full}
+
+    def document(self, row: int) -> Document:
+        start, end = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        data = json.loads(bytes(self.docs_blob[start:end]))
+        return Document(id=data["id"], page_content=data["page_content"], metadata=data["metadata"])
+
+    def search_docs(self, query, k: int = 10, where: dict | None = None) -> list:
+        return [self.document(row) for row, _ in self.search(query, k, where)]
+
+    def get_docs(self, ids: list, where: dict | None = None) -> dict:
+        """{id: Document} untuk id yang ada di index dan lolos filter (pengganti Chroma get by id)."""
+        mask = self.mask(where)
+        rows = [self.row_of[i] for i in ids if i in self.row_of]
+        return {self.ids[r]: self.document(r) for r in rows if mask is None or mask[r]}
+
+_indexes = IndexCache(NumpyVectorIndex.load)
+
+def get_index(persist_dir: str, collection: str, check_interval: float = 2.0) -> NumpyVectorIndex | None:
+    """Index bersama per proses; dimuat ulang bila ingest menulis index baru. None bila belum dibangun."""
+    return _indexes.get(index_dir(persist_dir, collection), check_interval)
@@ -0,0 +1,103 @@
+#request_context.py
+#konteks per request (contextvars) pengganti dict global report_param
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+class RequestContext:
+    """
+    Data 1 giliran chat yang diisi sepanjang chain:
+    - doc     : data properti yang dikirim ke LLM
+    - method  : sumber data (mysql / vector)
+    - tokens  : pemakaian token dari get_openai_callback
+    - timings : durasi per tahap (ms)
+    - history : token HISTORY CHAT yang dirender vs budget
+    - branch  : hasil klasifikasi ("1"/"2"/"3") atau route fast path ("fast_greeting"/"fast_more")
+    Objek ini di-share oleh thread/task turunan (context di-copy, objeknya sama).
+    """
+
+    def __init__(self, session_id: str | None = None):
+        self.session_id = session_id
+        self.doc = None
+        self.method = None
+        self.tokens = {}
+        self.timings = {}
+        self.history = {}
+        self.branch = None
+
+    def add_timing(self, name: str, ms: float):
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def report(self) -> dict:
+        return {
+            "doc": self.doc,
+            "method": self.method,
+            "timings": {k: round(v, 1) for k, v in self.timings.items()},
+            "history_tokens": self.history.get("tokens"),
+            **self.tokens,
+        }
+
+_current: ContextVar[RequestContext | None] = ContextVar("request_context", default=None)
+
+def current() -> RequestContext:
+    """Konteks request aktif; di luar request_scope dikembalikan konteks sementara (tidak disimpan)."""
+    ctx = _current.get()
+    return ctx if ctx is not None else RequestContext()
+
+@contextmanager
+def request_scope(session_id: str | None = None):
+    ctx = RequestContext(session_id)
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def stage(name: str):
+    """Catat durasi 1 tahap (retrieval, dll) ke konteks request aktif."""
+    ctx = current()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ctx.add_timing(name, (time.perf_counter() - start) * 1000)
+
+def timed(name: str, runnable):
+    """Bungkus runnable supaya durasinya tercatat sebagai tahap `name`."""
+    def run(x, config):
+        with stage(name):
+            return runnable.invoke(x, config)
+
+    async def arun(x, config):
+        with stage(name):
+            return await runnable.ainvoke(x, config)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+def timed_stream(name: str, runnable):
+    """
+    Seperti `timed`, tapi output runnable tetap mengalir per chunk saat di-stream
+    (RunnableLambda menunggu output lengkap). Output harus bisa dijumlahkan (str) untuk invoke.
+    """
+    def transform(inputs, config):
+        with stage(name):
+            yield from runnable.transform(inputs, config)
+
+    async def atransform(inputs, config):
+        with stage(name):
+            async for chunk in runnable.atransform(inputs, config):
+                yield chunk
+
+    return RunnableGenerator(transform, atransform, name=name)
+
+def set_doc(doc):
+    current().doc = doc
+
+def set_method(method: str):
+    current().method = method
+
+def set_branch(branch: str):
+    current().branch = branch
@@ -0,0 +1,140 @@
+#reranker.py
+#rerank hasil retrieval dengan cross-encoder multilingual kecil di CPU (sentence-transformers),
+#dengan budget latency per request: bila model belum siap / diperkirakan melebihi budget, rerank dilewati
+import asyncio
+import os
+import threading
+import time
+
+from rich import print
+
+from request_context import stage
+from tracing import span
+
+RERANK = os.getenv("RERANK", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")          # torch | onnx (onnx butuh optimum[onnxruntime])
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", "8"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_DOC_CHARS = int(os.getenv("RERANK_DOC_CHARS", "700"))
+
+class Reranker:
+    """
+    Model dimuat sekali di background thread (request pertama tidak menunggu download / load).
+    Latency per pasangan (query, dokumen) dipantau (EWMA) untuk memperkirakan apakah rerank muat di budget.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, backend: str = RERANK_BACKEND, budget_ms: float = RERANK_BUDGET_MS,
+                 top_n: int = RERANK_TOP_N, batch_size: int = RERANK_BATCH):
+        self.model_name = model_name
+        self.backend = backend
+        self.budget_ms = budget_ms
+        self.top_n = top_n
+        self.batch_size = batch_size
+
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._failed = False
+        # hanya 1 inferensi sekaligus: thread CPU sudah dipakai penuh oleh onnxruntime / torch
+        self._infer_lock = threading.Lock()
+        # ms_per_pair & stats diubah dari banyak thread (to_thread / threadpool)
+        self._stats_lock = threading.Lock()
+        self.ms_per_pair = None
+        self.stats = {"reranked": 0, "skipped_loading": 0, "skipped_budget": 0, "skipped_busy": 0, "aborted": 0}
+
+    # ---------- model ----------
+    def load(self):
+        """Muat model sekarang (blocking). Exception diteruskan: dipakai saat startup supaya RERANK=1 tidak gagal diam-diam."""
+        from sentence_transformers import CrossEncoder
+
+        started = time.perf_counter()
+        kwargs = {"backend": self.backend} if self.backend != "torch" else {}
+        model = CrossEncoder(self.model_name, max_length=RERANK_MAX_LENGTH, device="cpu", **kwargs)
+        model.predict([("pemanasan", "model")])    # warm-up: alokasi sesi / graph
+        self._model = model
+        print(f"[italic bold green]Reranker {self.model_name} ({self.backend}) siap dalam {time.perf_counter() - started:.1f} s [/italic bold green]\n")
+
+    def _load(self):
+        try:
+            self.load()
+        except Exception as e:
+            self._failed = True
+            print(f"[bold red]RERANK=1 tetapi reranker {self.model_name} ({self.backend}) gagal dimuat: {e!r}. "
+                  f"Hasil retrieval TIDAK di-rerank sampai proses di-restart.[/bold red]\n")
+        finally:
+            self._loading = False
+
+    def ready(self) -> bool:
+        if self._model is not None:
+            return True
+        with self._load_lock:
+            if not self._loading and not self._failed and self._model is None:
+                self._loading = True
+                threading.Thread(target=self._load, name="reranker-load", daemon=True).start()
+        return False
+
+    # ---------- rerank ----------
+    def rerank(self, query: str, docs: list) -> list:
+        """Dokumen diurutkan ulang oleh cross-encoder, dipotong ke top_n. Urutan asal dipakai bila dilewati."""
+        if len(docs) <= 1:
+            return docs
+        if not self.ready():
+            self._count("skipped_loading")
+            return docs[:self.top_n]
+        with self._stats_lock:
+            over_budget = self.ms_per_pair is not None and self.ms_per_pair * len(docs) > self.budget_ms
+            if over_budget:
+                # perkiraan melebihi budget: coba lagi sesekali supaya perkiraan bisa turun
+                self.ms_per_pair *= 0.9
+                self.stats["skipped_budget"] += 1
+        if over_budget:
+            return docs[:self.top_n]
+
+        pairs = [(query, (d.page_content or "")[:RERANK_DOC_CHARS]) for d in docs]
+        scores = []
+        waiting = time.perf_counter()
+        with stage("rerank"), span("rerank", "rerank", model=self.model_name, docs=len(docs)):
+            # menunggu inferensi request lain ikut memakan budget, tapi tidak masuk perkiraan ms_per_pair
+            if not self._infer_lock.acquire(timeout=self.budget_ms / 1000):
+                self._count("skipped_busy")
+                return docs[:self.top_n]
+            try:
+                started = time.perf_counter()
+                remaining = self.budget_ms - (started - waiting) * 1000
+                for i in range(0, len(pairs), self.batch_size):
+                    batch = pairs[i:i + self.batch_size]
+                    scores.extend(float(s) for s in self._model.predict(batch, batch_size=len(batch)))
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if elapsed > remaining and len(scores) < len(pairs):
+                        self._observe(elapsed, len(scores))
+                        self._count("aborted")
+                        return docs[:self.top_n]
+            finally:
+                self._infer_lock.release()
+        self._observe((time.perf_counter() - started) * 1000, len(pairs))
+        self._count("reranked")
+
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [docs[i] for i in order[:self.top_n]]
+
+    async def arerank(self, query: str, docs: list) -> list:
+        # inferensi CPU-bound: jangan blok event loop
+        return await asyncio.to_thread(self.rerank, query, docs)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _observe(self, elapsed_ms: float, pairs: int):
+        per_pair = elapsed_ms / max(pairs, 1)
+        with self._stats_lock:
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+
+    def stats_snapshot(self) -> dict:
+        with self._stats_lock:
+            return dict(self.stats)
+
+reranker = Reranker()
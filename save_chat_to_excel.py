@@ -24,6 +24,9 @@ BASE_COLUMNS = [
     "cost_idr",
     "doc",
     "gold",
+    "understand",
+    "fast_path",
+    "timings",
     # kolom hasil flatten json
     # "json_keyword",
     # "json_jenis_properti",
@@ -39,10 +42,12 @@ def _to_row(record: Dict[str, Any]) -> Dict[str, Any]:
     # Ambil kolom top-level kalau ada
     for k in [
         "chat_session_id", "human", "ai", "method", "input_token", "output_token",
-        "total_token", "response_count", "response_time", "cost_usd", "cost_idr","doc","gold"
+        "total_token", "response_count", "response_time", "cost_usd", "cost_idr","doc","gold","understand","fast_path"
     ]:
         if k in record:
             row[k] = record[k]
+    if "timings" in record:
+        row["timings"] = json.dumps(record["timings"])
 
     # Flatten bagian `json`
     # json_part = record.get("json", {}) or {}
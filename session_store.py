@@ -0,0 +1,257 @@
+#session_store.py
+#penyimpanan history chat & history query per session (WhatsApp sender id), dipakai bersama semua pipeline
+# - tier memori : LRU + TTL, dibatasi jumlah session dan total byte
+# - tier sqlite : opsional (SESSION_DB), supaya history tahan restart & dibagi antar worker uvicorn
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))          # detik sejak akses terakhir
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))                  # jumlah session di memori
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "64"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))   # per session (genap: pasangan user+AI)
+SESSION_DB = os.getenv("SESSION_DB", "")                              # contoh: data/sessions.sqlite
+SESSION_SYNC_INTERVAL = float(os.getenv("SESSION_SYNC_INTERVAL", "2"))  # detik antar cek tulisan worker lain
+
+COMPRESS_MIN = 256   # pesan lebih panjang dari ini disimpan zlib di sqlite
+
+# encoding ringkas: pesan disimpan sebagai (role, content); role 1 huruf
+HUMAN, AI = "h", "a"
+
+def encode_message(message: BaseMessage) -> tuple:
+    role = HUMAN if message.type in ("human", "user") else AI
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return role, content
+
+def decode_message(item: tuple) -> BaseMessage:
+    role, content = item
+    return HumanMessage(content=content) if role == HUMAN else AIMessage(content=content)
+
+def pack(content: str) -> tuple:
+    raw = content.encode("utf-8")
+    if len(raw) > COMPRESS_MIN:
+        return 1, zlib.compress(raw, 6)
+    return 0, raw
+
+def unpack(compressed: int, data: bytes) -> str:
+    return (zlib.decompress(data) if compressed else data).decode("utf-8")
+
+class SQLiteBackend:
+    """Tabel messages(store, session_id, role, compressed, content); id autoincrement = urutan pesan."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " store TEXT, session_id TEXT, role TEXT, compressed INTEGER, content BLOB)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (store, session_id, id)")
+        self._db.commit()
+
+    def load(self, store: str, session_id: str, limit: int):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, role, compressed, content FROM messages WHERE store = ? AND session_id = ? ORDER BY id DESC LIMIT ?",
+                (store, session_id, limit),
+            ).fetchall()
+        rows.reverse()
+        last_id = rows[-1][0] if rows else 0
+        return [(role, unpack(c, data)) for _, role, c, data in rows], last_id
+
+    def data_version(self) -> int:
+        """Berubah hanya bila koneksi lain (worker lain) commit; tanpa membaca tabel."""
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_id(self, store: str, session_id: str) -> int:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(id) FROM messages WHERE store = ? AND session_id = ?", (store, session_id)
+            ).fetchone()
+        return row[0] or 0
+
+    def append(self, store: str, session_id: str, items: Sequence[tuple], keep: int) -> int:
+        with self._lock:
+            cur = None
+            for role, content in items:
+                compressed, data = pack(content)
+                cur = self._db.execute(
+                    "INSERT INTO messages (store, session_id, role, compressed, content) VALUES (?, ?, ?, ?, ?)",
+                    (store, session_id, role, compressed, data),
+                )
+            # buang pesan lama di luar jendela `keep`
+            self._db.execute(
+                "DELETE FROM messages WHERE store = ? AND session_id = ? AND id <= "
+                "(SELECT id FROM messages WHERE store = ? AND session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (store, session_id, store, session_id, keep),
+            )
+            self._db.commit()
+            return cur.lastrowid if cur is not None else 0
+
+    def clear(self, store: str, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE store = ? AND session_id = ?", (store, session_id))
+            self._db.commit()
+
+class StoredHistory(BaseChatMessageHistory):
+    """History 1 session. Pesan disimpan ringkas; `messages` dibentuk ulang hanya bila berubah."""
+
+    def __init__(self, owner: "SessionStore", session_id: str, items: List[tuple] | None = None, last_id: int = 0,
+                 version: int | None = None):
+        self.owner = owner
+        self.session_id = session_id
+        self.items = items or []
+        self.last_id = last_id
+        self.version = version              # data_version sqlite saat terakhir disinkronkan
+        self.checked = time.monotonic()
+        self.nbytes = sum(len(c) for _, c in self.items)
+        self._messages = None
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        if self._messages is None:
+            self._messages = [decode_message(i) for i in self.items]
+        return self._messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        new_items = [encode_message(m) for m in messages]
+        self.owner.append(self, new_items)
+
+    def clear(self) -> None:
+        self.owner.clear(self)
+
+class SessionStore:
+    """
+    Map session_id -> StoredHistory dengan batas:
+    - TTL sejak akses terakhir, jumlah session maksimal, total byte maksimal (LRU dibuang duluan),
+    - SESSION_MAX_MESSAGES pesan terakhir per session.
+    Bila backend sqlite aktif, session yang dibuang dari memori dimuat lagi dari disk,
+    dan perubahan dari worker lain terdeteksi lewat id pesan terakhir (dicek paling sering tiap
+    SESSION_SYNC_INTERVAL detik, dan hanya bila data_version sqlite berubah).
+    """
+
+    def __init__(self, name: str, backend: SQLiteBackend | None = None, ttl: float = SESSION_TTL,
+                 max_sessions: int = SESSION_MAX, max_bytes: int | None = None, max_messages: int = SESSION_MAX_MESSAGES,
+                 sync_interval: float = SESSION_SYNC_INTERVAL):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = int(max_bytes if max_bytes is not None else SESSION_MAX_MB * 1024 * 1024)
+        self.max_messages = max_messages
+        self.sync_interval = sync_interval
+
+        self._lock = threading.RLock()
+        self._sessions: OrderedDict[str, tuple] = OrderedDict()   # session_id -> (history, last_access)
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> StoredHistory:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                history, last_access = entry
+                if now - last_access > self.ttl:
+                    self._drop(session_id)
+                    history = None
+                elif self.backend is not None and self._changed_elsewhere(history, now):
+                    # ditulis worker lain
+                    self._drop(session_id)
+                    history = None
+                if history is not None:
+                    self._sessions[session_id] = (history, now)
+                    self._sessions.move_to_end(session_id)
+                    return history
+
+            history = self._load(session_id)
+            self._sessions[session_id] = (history, now)
+            self._bytes += history.nbytes
+            self._evict()
+            return history
+
+    def _changed_elsewhere(self, history: StoredHistory, now: float) -> bool:
+        # cache hit dalam sync_interval tidak menyentuh sqlite sama sekali
+        if now - history.checked < self.sync_interval:
+            return False
+        history.checked = now
+        version = self.backend.data_version()
+        if version == history.version:
+            return False
+        history.version = version
+        return self.backend.last_id(self.name, history.session_id) != history.last_id
+
+    def _load(self, session_id: str) -> StoredHistory:
+        if self.backend is None:
+            return StoredHistory(self, session_id)
+        # versi dibaca sebelum load: commit di antaranya tetap terdeteksi pada cek berikutnya
+        version = self.backend.data_version()
+        items, last_id = self.backend.load(self.name, session_id, self.max_messages)
+        return StoredHistory(self, session_id, items, last_id, version)
+
+    def _drop(self, session_id: str):
+        history, _ = self._sessions.pop(session_id)
+        self._bytes -= history.nbytes
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (history, last_access) = next(iter(self._sessions.items()))
+            over = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not over and now - last_access <= self.ttl:
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    def append(self, history: StoredHistory, items: List[tuple]):
+        with self._lock:
+            if self.backend is not None:
+                history.last_id = self.backend.append(self.name, history.session_id, items, self.max_messages)
+            added = sum(len(c) for _, c in items)
+            history.items.extend(items)
+            overflow = len(history.items) - self.max_messages
+            if overflow > 0:
+                added -= sum(len(c) for _, c in history.items[:overflow])
+                del history.items[:overflow]
+            history.nbytes += added
+            history._messages = None
+            if history.session_id in self._sessions:
+                self._bytes += added
+                self._evict()
+
+    def clear(self, history: StoredHistory):
+        with self._lock:
+            if self.backend is not None:
+                self.backend.clear(self.name, history.session_id)
+            if history.session_id in self._sessions:
+                self._bytes -= history.nbytes
+            history.items = []
+            history.nbytes = 0
+            history.last_id = 0
+            history._messages = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes, "evictions": self.evictions}
+
+_backend = SQLiteBackend(SESSION_DB) if SESSION_DB else None
+
+chat_store = SessionStore("chat", _backend)
+query_store = SessionStore("query", _backend)
+
+def get_history(session_id: str) -> BaseChatMessageHistory:
+    return chat_store.get(session_id)
+
+def get_query_history(session_id: str) -> BaseChatMessageHistory:
+    return query_store.get(session_id)
@@ -0,0 +1,42 @@
+#streaming.py
+#utilitas streaming jawaban: jalankan giliran chat di task sendiri dan format event SSE
+import asyncio
+import json
+
+# task giliran yang masih berjalan (referensi supaya tidak di-garbage collect bila client putus)
+_running = set()
+
+async def detached(agen):
+    """
+    Jalankan async generator `agen` di task terpisah dan teruskan chunk-nya.
+    Bila client putus di tengah stream, task tetap selesai: jawaban lengkap
+    tetap masuk history & chat_history. request_scope / trace_scope di dalam
+    `agen` juga selalu dibuka & ditutup di task yang sama.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async for chunk in agen:
+                queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(done)
+
+    task = asyncio.create_task(produce())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+    while True:
+        item = await queue.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def sse_event(event: str, data) -> str:
+    """1 event Server-Sent Events; data di-encode JSON supaya newline di jawaban aman."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,97 @@
+#tests/test_http_client.py
+#state machine CircuitBreaker & counter metrik HttpClient (tanpa network)
+import threading
+import time
+
+from http_client import CircuitBreaker, HttpClient
+
+def open_breaker(failures: int = 1, reset_after: float = 0.01) -> CircuitBreaker:
+    breaker = CircuitBreaker(failures=failures, reset_after=reset_after)
+    for _ in range(failures):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == "open"
+    return breaker
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, reset_after=60)
+    for _ in range(2):
+        breaker.record(False)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failures=2, reset_after=60)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+def test_half_open_allows_single_probe():
+    breaker = open_breaker()
+    time.sleep(0.02)
+    assert [breaker.allow() for _ in range(5)] == [True, False, False, False, False]
+    assert breaker.state == "half-open"
+
+def test_half_open_single_probe_under_threads():
+    breaker = open_breaker()
+    time.sleep(0.02)
+    results = []
+    barrier = threading.Barrier(16)
+
+    def call():
+        barrier.wait()
+        results.append(breaker.allow())
+
+    threads = [threading.Thread(target=call) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+
+def test_probe_success_closes_circuit():
+    breaker = open_breaker()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert all(breaker.allow() for _ in range(5))
+
+def test_probe_failure_reopens_circuit():
+    breaker = open_breaker(failures=3, reset_after=0.01)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()
+
+def test_unrecorded_probe_expires():
+    breaker = open_breaker(reset_after=0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+def test_metric_counters_are_thread_safe():
+    client = HttpClient()
+    m = client.endpoint_metrics("query_listing")
+
+    def work():
+        for _ in range(2000):
+            client.count(m, "requests")
+            client.observe(m, 1.0)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = client.metrics()["query_listing"]
+    assert snap["requests"] == 16000
+    assert snap["p50_ms"] == 1.0
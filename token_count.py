@@ -0,0 +1,31 @@
+#token_count.py
+#hitung token dengan tiktoken; perkiraan len/4 bila encoding tidak bisa dimuat (mis. offline)
+import threading
+
+_encoders = {}
+_lock = threading.Lock()
+
+def get_encoder(encoding: str):
+    with _lock:
+        if encoding not in _encoders:
+            try:
+                import tiktoken
+                _encoders[encoding] = tiktoken.get_encoding(encoding)
+            except Exception:
+                _encoders[encoding] = None
+        return _encoders[encoding]
+
+def count_tokens(text: str, encoding: str = "cl100k_base") -> int:
+    enc = get_encoder(encoding)
+    if enc is not None:
+        return len(enc.encode(text or "", disallowed_special=()))
+    return len(text or "") // 4 + 1
+
+def keep_last_tokens(text: str, max_tokens: int, encoding: str = "cl100k_base") -> str:
+    """Potong teks dari depan sehingga tersisa maksimal max_tokens token terakhir."""
+    enc = get_encoder(encoding)
+    if enc is not None:
+        ids = enc.encode(text or "", disallowed_special=())
+        return text if len(ids) <= max_tokens else enc.decode(ids[-max_tokens:])
+    limit = max_tokens * 4
+    return text if len(text) <= limit else text[-limit:]
@@ -0,0 +1,265 @@
+#tracing.py
+#span durasi per runnable / LLM call / retriever / HTTP call untuk 1 giliran chat
+# - disimpan di ring buffer in-process (dibaca lewat /debug/traces)
+# - opsional dikirim ke OTLP collector (TRACE_OTLP_ENDPOINT, mis. http://localhost:4317)
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))                 # jumlah trace terakhir yang disimpan
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "rag-chatbot")
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "kind", "start", "end", "error", "attrs")
+
+    def __init__(self, name: str, kind: str, parent_id: str | None = None, span_id: str | None = None, attrs: dict | None = None):
+        self.span_id = span_id or uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.error = None
+        self.attrs = attrs or {}
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 2),
+            "error": self.error,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+class Trace:
+    def __init__(self, name: str, session_id: str | None = None):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.root = Span(name, "request")
+        self.spans = [self.root]
+        self._open = {}            # run_id LangChain -> Span
+        self._lock = threading.Lock()
+
+    def open_span(self, key, name: str, kind: str, parent_key=None, attrs: dict | None = None) -> Span:
+        with self._lock:
+            parent = self._open.get(parent_key) if parent_key is not None else None
+            span = Span(name, kind, parent_id=(parent or self.root).span_id, attrs=attrs)
+            self._open[key] = span
+            self.spans.append(span)
+            return span
+
+    def close_span(self, key, error: BaseException | None = None):
+        with self._lock:
+            span = self._open.pop(key, None)
+        if span is not None:
+            span.end = time.time()
+            if error is not None:
+                span.error = f"{type(error).__name__}: {error}"
+
+    def finish(self):
+        self.root.end = time.time()
+        with self._lock:
+            for span in self._open.values():
+                span.end = span.end or self.root.end
+            self._open.clear()
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "name": self.root.name,
+            "start": self.root.start,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "spans": len(self.spans),
+            "error": any(s.error for s in self.spans),
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "spans": [s.to_dict() for s in self.spans]}
+
+def run_name(serialized, kwargs, default: str) -> str:
+    if kwargs.get("name"):
+        return kwargs["name"]
+    if serialized:
+        if serialized.get("name"):
+            return serialized["name"]
+        ids = serialized.get("id")
+        if ids:
+            return ids[-1]
+    return default
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Ubah event callback LangChain (per run_id) menjadi span di Trace."""
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+
+    # chain / runnable
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self.trace.open_span(run_id, run_name(serialized, kwargs, "chain"), "chain", parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self.trace.close_span(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.trace.close_span(run_id, error)
+
+    # LLM
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self.trace.open_span(run_id, run_name(serialized, kwargs, "llm"), "llm", parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (kwargs.get("invocation_params") or {}).get("model")
+        self.trace.open_span(run_id, run_name(serialized, kwargs, "chat_model"), "llm", parent_run_id,
+                             attrs={"model": model} if model else None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        span = self.trace._open.get(run_id)
+        if span is not None and usage:
+            span.attrs["total_tokens"] = usage.get("total_tokens")
+        self.trace.close_span(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.trace.close_span(run_id, error)
+
+    # retriever (Chroma)
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self.trace.open_span(run_id, run_name(serialized, kwargs, "retriever"), "retriever", parent_run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self.trace.close_span(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self.trace.close_span(run_id, error)
+
+class TraceBuffer:
+    """Ring buffer trace yang sudah selesai."""
+
+    def __init__(self, size: int = TRACE_BUFFER):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, limit: int = 20, session_id: str | None = None) -> list:
+        with self._lock:
+            traces = list(self._traces)
+        if session_id:
+            traces = [t for t in traces if t.session_id == session_id]
+        return [t.summary() for t in reversed(traces[-limit:])]
+
+    def get(self, trace_id: str) -> dict | None:
+        with self._lock:
+            for t in self._traces:
+                if t.trace_id == trace_id:
+                    return t.to_dict()
+        return None
+
+buffer = TraceBuffer()
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_handler: ContextVar[TracingCallbackHandler | None] = ContextVar("tracing_callback", default=None)
+# handler otomatis ikut ke semua runnable yang dijalankan di dalam trace_scope (seperti get_openai_callback)
+register_configure_hook(_handler, inheritable=True)
+
+@contextmanager
+def trace_scope(name: str, session_id: str | None = None):
+    trace = Trace(name, session_id)
+    t_token = _current_trace.set(trace)
+    h_token = _handler.set(TracingCallbackHandler(trace))
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _handler.reset(h_token)
+        _current_trace.reset(t_token)
+        trace.finish()
+        buffer.add(trace)
+        export(trace)
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    """Span manual (mis. HTTP call) di trace aktif; tidak melakukan apa-apa di luar trace_scope."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    key = object()
+    s = trace.open_span(key, name, kind, attrs=attrs or None)
+    try:
+        yield s
+    except BaseException as e:
+        trace.close_span(key, e)
+        raise
+    else:
+        trace.close_span(key)
+
+# ---------- OTLP (opsional) ----------
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    global _tracer
+    if not TRACE_OTLP_ENDPOINT:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            try:
+                from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+                provider = TracerProvider(resource=Resource.create({"service.name": TRACE_SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=TRACE_OTLP_ENDPOINT, insecure=True)))
+                _tracer = provider.get_tracer("rag-chatbot")
+            except Exception as e:
+                print("OTLP export tidak aktif:", e)
+                _tracer = False
+        return _tracer or None
+
+def export(trace: Trace):
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+
+    created = {}
+    for s in sorted(trace.spans, key=lambda s: s.start):
+        parent = created.get(s.parent_id)
+        ctx = otel_trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = tracer.start_span(s.name, context=ctx, start_time=int(s.start * 1e9))
+        otel_span.set_attribute("span.kind", s.kind)
+        if trace.session_id and s is trace.root:
+            otel_span.set_attribute("session.id", trace.session_id)
+        for k, v in s.attrs.items():
+            if v is not None:
+                otel_span.set_attribute(k, v)
+        if s.error:
+            otel_span.set_status(Status(StatusCode.ERROR, s.error))
+        created[s.span_id] = otel_span
+    for s in trace.spans:
+        created[s.span_id].end(end_time=int((s.end or trace.root.end) * 1e9))
@@ -0,0 +1,105 @@
+#understand.py
+#gabungkan rewrite + klasifikasi (+ konversi JSON filter) dalam 1 LLM call terstruktur
+import os
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from rich import print
+
+from request_context import set_branch
+
+# "chain"  = urutan lama: rewrite_chain -> classifier -> json_convertion_chain (3 call)
+# "single" = 1 structured call yang mengembalikan ketiganya sekaligus
+UNDERSTAND_MODE = os.getenv("UNDERSTAND_MODE", "chain")
+
+class FilterQuery(BaseModel):
+    """Filter pencarian properti, key sama dengan json_convertion_prompt."""
+    alamat: Optional[str] = None
+    keyword: Optional[str] = None
+    harga_min: Optional[int] = None
+    harga_max: Optional[int] = None
+    kamar_tidur: Optional[int] = None
+    lebar_bangunan: Optional[float] = None
+    luas_bangunan: Optional[int] = None
+    jumlah_tingkat: Optional[int] = None
+    luas_tanah: Optional[int] = None
+    kondisi: Optional[str] = None
+    tipe_listing: Optional[int] = None
+    jenis_properti: Optional[int] = None
+    mata_angin: Optional[str] = None
+    is_hard_filter: int = Field(0, description="1 jika ada harga_min, harga_max, kamar_tidur, luas_bangunan atau luas_tanah, selain itu 0")
+
+class Understanding(BaseModel):
+    """Hasil pemahaman 1 giliran chat."""
+    rewrite_question: str = Field(description="Pertanyaan user yang sudah dibuat mandiri berdasarkan HISTORY CHAT")
+    category: Literal["1", "2", "3", "4"] = Field(description="Kategori pertanyaan (1/2/3/4)")
+    json_query: Optional[FilterQuery] = Field(None, description="Filter pencarian, hanya diisi jika category = 1")
+
+understand_system = (
+    "Lakukan 3 tugas sekaligus untuk pesan user terakhir.\n"
+    "A. rewrite_question: Ubahlah pertanyaan menjadi satu kalimat mandiri. "
+    "Memanfaatkan HISTORY chat bila ada. Jangan menjawab; keluarkan hanya pertanyaannya. "
+    "Buatlah kalimat pertanyaan dengan posisi anda adalah user. "
+    "Ikuti gaya bicara dan bahasa sesuai HISTORY CHAT.\n"
+    "B. category: Klasifikasikan rewrite_question ke dalam salah satu kategori berikut: \n"
+    "1. Minta informasi properti, pencarian properti, rekomendasi properti. \n"
+    "2. Mau melakukan perubahan data properti yang sudah ada di website atau aplikasi. ( misal perubahan harga, status, atau detail lainnya) \n"
+    "3. Salam, Perkenalan, Sapaan pembuka. \n"
+    "4. Lainnya. \n"
+)
+
+def build_understand_prompt(json_prompt: ChatPromptTemplate | None = None) -> ChatPromptTemplate:
+    """
+    Susun prompt gabungan. Aturan konversi JSON diambil langsung dari
+    `json_convertion_prompt` milik pipeline supaya tetap 1 sumber aturan.
+    """
+    messages = [("system", understand_system)]
+    if json_prompt is not None:
+        rules = json_prompt.messages[0].prompt.template
+        messages.append(("system", "C. json_query: hanya jika category = 1, isi sesuai aturan berikut. \n" + rules))
+    else:
+        messages.append(("system", "C. json_query: kosongkan (null)."))
+    messages.append(("system", "berikut ini adalah HISTORY CHAT : \n {history_chat} \n"))
+    messages.append(("human", "{question}"))
+    return ChatPromptTemplate.from_messages(messages)
+
+def to_fields(result: Understanding) -> dict:
+    """Ubah hasil structured output ke key yang dipakai classifier_branches."""
+    json_query = None
+    if result.category == "1" and result.json_query is not None:
+        json_query = result.json_query.model_dump(exclude_none=True)
+
+    print("[italic bold green]Memahami pertanyaan (1 call)... [/italic bold green]\n")
+    print(f"[italic bold green]hasil pertanyaan baru (history): {result.rewrite_question} [/italic bold green]\n")
+    print(f"[italic bold green]Hasil Klasifikasi : {result.category} [/italic bold green]\n")
+    set_branch(result.category)
+
+    return {
+        "rewrite_question": result.rewrite_question,
+        "cls": result.category,
+        "json_query": json_query,
+    }
+
+def understand_runnable(llm, json_prompt: ChatPromptTemplate | None = None):
+    """
+    Runnable pengganti rewrite_context_chain | classifier_chain.
+    Input dict diteruskan apa adanya, ditambah rewrite_question, cls dan json_query.
+    """
+    chain = build_understand_prompt(json_prompt) | llm.with_structured_output(Understanding, method="function_calling")
+
+    def run(x):
+        return {**x, **to_fields(chain.invoke(x))}
+
+    async def arun(x):
+        return {**x, **to_fields(await chain.ainvoke(x))}
+
+    return RunnableLambda(run, afunc=arun)
+
+def resolve_mode(data: dict) -> str:
+    """Mode per request (data['understand']) atau default dari env UNDERSTAND_MODE."""
+    mode = data.get("understand") or UNDERSTAND_MODE
+    if mode not in ("chain", "single"):
+        raise ValueError(f"UNDERSTAND_MODE tidak dikenal: {mode}")
+    return mode
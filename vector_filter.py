@@ -0,0 +1,169 @@
+#vector_filter.py
+#ubah filter JSON (json_query) menjadi klausa `where` Chroma untuk pencarian vector terfilter
+import os
+
+from rich import print
+
+from langchain_core.documents import Document
+
+import numpy_index
+from bm25_index import get_index, rrf_fuse
+from listing_engine import TIPE_LISTING, JENIS_PROPERTI, to_number
+from tracing import span
+
+VECTOR_K = int(os.getenv("VECTOR_K", "10"))
+VECTOR_MAX_K = int(os.getenv("VECTOR_MAX_K", "80"))   # batas pelebaran k bila hasil terfilter terlalu sedikit
+VECTOR_MIN_DOCS = int(os.getenv("VECTOR_MIN_DOCS", "5"))
+HYBRID_SPARSE = os.getenv("HYBRID_SPARSE", "1") == "1"  # gabungkan BM25 dengan dense (RRF) bila index ada
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "chroma")       # chroma | numpy (index npy dari ingest --numpy-index)
+
+# key filter JSON -> (field metadata, operator); field metadata berasal dari ingest.build_document
+NUMERIC_WHERE = {
+    "harga_min": ("price", "$gte"),
+    "harga_max": ("price", "$lte"),
+    "kamar_tidur": ("kamar_tidur", "$gte"),
+    "luas_bangunan": ("luas_bangunan", "$gte"),
+    "luas_tanah": ("luas_tanah", "$gte"),
+    "lebar_bangunan": ("lebar_bangunan", "$gte"),
+    "jumlah_tingkat": ("jumlah_lantai", "$eq"),
+}
+
+def as_metadata_number(value: float):
+    # metadata Chroma bertipe int untuk field ini; bandingkan int dengan int
+    return int(value) if float(value).is_integer() else value
+
+def build_where(param: dict | None) -> dict | None:
+    """
+    Klausa `where` untuk batasan yang bisa dicek dari metadata.
+    keyword / alamat / kondisi tidak diubah: itu tugas kemiripan vector.
+    """
+    if not param:
+        return None
+
+    conditions = []
+    for key, (field, op) in NUMERIC_WHERE.items():
+        value = to_number(param.get(key))
+        if value is not None:
+            conditions.append({field: {op: as_metadata_number(value)}})
+
+    tipe = to_number(param.get("tipe_listing"))
+    if tipe is not None and int(tipe) in TIPE_LISTING:
+        conditions.append({"jenis_listing": {"$eq": TIPE_LISTING[int(tipe)].capitalize()}})
+
+    jenis = to_number(param.get("jenis_properti"))
+    if jenis is not None and int(jenis) in JENIS_PROPERTI:
+        conditions.append({"kategori": {"$eq": JENIS_PROPERTI[int(jenis)].capitalize()}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def log_where(where, count, k):
+    if where is not None:
+        print(f"[italic bold green]Filter vector : {where} → {count} document (k={k}) [/italic bold green]\n")
+
+def filtered_search(store, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    """
+    Similarity search dengan filter metadata.
+    HNSW terfilter bisa mengembalikan < k dokumen walau kandidat ada,
+    jadi k dilebarkan (x4) sampai cukup, hasil tidak bertambah, atau VECTOR_MAX_K.
+    """
+    where = build_where(param)
+    with span("chroma similarity_search", "vectorstore", k=k):
+        docs = store.similarity_search(query, k=k, filter=where)
+    fetch_k = k
+    while where is not None and len(docs) < min(k, VECTOR_MIN_DOCS) and fetch_k < VECTOR_MAX_K:
+        fetch_k = min(fetch_k * 4, VECTOR_MAX_K)
+        with span("chroma similarity_search", "vectorstore", k=fetch_k):
+            wider = store.similarity_search(query, k=fetch_k, filter=where)
+        if len(wider) <= len(docs):
+            break
+        docs = wider
+    log_where(where, len(docs), fetch_k)
+    return docs[:k]
+
+async def afiltered_search(store, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    where = build_where(param)
+    with span("chroma similarity_search", "vectorstore", k=k):
+        docs = await store.asimilarity_search(query, k=k, filter=where)
+    fetch_k = k
+    while where is not None and len(docs) < min(k, VECTOR_MIN_DOCS) and fetch_k < VECTOR_MAX_K:
+        fetch_k = min(fetch_k * 4, VECTOR_MAX_K)
+        with span("chroma similarity_search", "vectorstore", k=fetch_k):
+            wider = await store.asimilarity_search(query, k=fetch_k, filter=where)
+        if len(wider) <= len(docs):
+            break
+        docs = wider
+    log_where(where, len(docs), fetch_k)
+    return docs[:k]
+
+def dense_index(manager):
+    """Index numpy untuk koleksi manager, None bila tidak dipakai / belum dibangun (pakai Chroma)."""
+    if VECTOR_INDEX != "numpy":
+        return None
+    return numpy_index.get_index(manager.persist_dir, manager.collection_name)
+
+def numpy_search(index, vector, param: dict | None, k: int) -> list:
+    # filter metadata = mask boolean, tidak perlu melebarkan k seperti HNSW terfilter
+    where = build_where(param)
+    with span("numpy search", "vectorstore", k=k):
+        docs = index.search_docs(vector, k, where)
+    log_where(where, len(docs), k)
+    return docs
+
+def dense_search(manager, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    """Similarity search terfilter: index numpy bila VECTOR_INDEX=numpy dan index ada, selain itu Chroma."""
+    index = dense_index(manager)
+    if index is None:
+        return filtered_search(manager.get(), query, param, k)
+    return numpy_search(index, manager.embed_query(query), param, k)
+
+async def adense_search(manager, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    index = dense_index(manager)
+    if index is None:
+        return await afiltered_search(manager.get(), query, param, k)
+    # dot product atas <= 50rb baris: orde milidetik, tidak perlu thread terpisah
+    return numpy_search(index, await manager.aembed_query(query), param, k)
+
+def sparse_candidates(manager, query: str, where: dict | None, k: int, exclude: set) -> tuple:
+    """Top-k BM25 yang lolos filter `where`; dokumen yang sudah ada di hasil dense tidak diambil ulang."""
+    index = get_index(manager.persist_dir, manager.collection_name) if HYBRID_SPARSE else None
+    if index is None:
+        return {}, []
+    with span("bm25 search", "vectorstore", k=k):
+        ranking = [doc_id for doc_id, _ in index.search(query, k)]
+    missing = [i for i in ranking if i not in exclude]
+    docs = {}
+    dense = dense_index(manager)
+    if missing and dense is not None:
+        docs = dense.get_docs(missing, where)
+    elif missing:
+        with span("chroma get", "vectorstore", ids=len(missing)):
+            got = manager.get().get(ids=missing, where=where, include=["documents", "metadatas"])
+        for doc_id, text, meta in zip(got["ids"], got["documents"], got["metadatas"]):
+            docs[doc_id] = Document(id=doc_id, page_content=text, metadata=meta or {})
+    # hanya id yang lolos filter (dense sudah terfilter, sisanya dicek lewat get)
+    ranking = [i for i in ranking if i in exclude or i in docs]
+    return docs, ranking
+
+def fuse(dense: list, query: str, param: dict | None, manager, k: int) -> list:
+    by_id = {d.id: d for d in dense if d.id}
+    sparse_docs, sparse_ranking = sparse_candidates(manager, query, build_where(param), k, set(by_id))
+    if not sparse_ranking:
+        return dense
+    by_id.update(sparse_docs)
+    fused = rrf_fuse([[d.id for d in dense if d.id], sparse_ranking])
+    print(f"[italic bold green]Hybrid BM25 + dense : {len(sparse_ranking)} hasil BM25, {len(sparse_docs)} listing baru [/italic bold green]\n")
+    return [by_id[i] for i in fused[:k]]
+
+def hybrid_search(manager, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    """dense_search + BM25 dari page_content, digabung dengan reciprocal rank fusion."""
+    dense = dense_search(manager, query, param, k)
+    return fuse(dense, query, param, manager, k)
+
+async def ahybrid_search(manager, query: str, param: dict | None, k: int = VECTOR_K) -> list:
+    dense = await adense_search(manager, query, param, k)
+    # BM25 + get by id: CPU/sqlite lokal dalam orde milidetik, tidak perlu thread terpisah
+    return fuse(dense, query, param, manager, k)
@@ -2,6 +2,7 @@
 from dotenv import load_dotenv
 
 from typing import Dict, List, Tuple
+import asyncio
 import os
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
@@ -11,10 +12,10 @@ from langchain_chroma import Chroma
 from langchain_core.runnables import RunnableLambda, RunnableParallel
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables import RunnableBranch
+from langchain_core.runnables import RunnableBranch, RunnablePassthrough
 from langchain_community.callbacks import get_openai_callback
 from langchain_core.output_parsers import JsonOutputParser
-from helper import token_usage_calculator, post_query, text_to_json
+from helper import token_usage_calculator, post_query, apost_query, text_to_json
 from rich import print
 from langchain_community.callbacks import get_openai_callback
 import time
@@ -25,47 +26,29 @@ from operator import itemgetter
 import json
 
 from helper import jakarta_time_greeting
+from understand import understand_runnable, resolve_mode
+from vector_store import get_manager
+from vector_filter import VECTOR_INDEX, dense_search, adense_search
+import fast_path
+import metrics
+from tracing import trace_scope
+from history_writer import history_writer
+from reranker import RERANK, reranker
+from listing_context import LISTING_CONTEXT, context_from_docs
+from history_window import render_history, history_report
+from session_store import get_history
+from request_context import request_scope, timed, timed_stream, current, set_doc, set_branch
 
 load_dotenv()
 
-PERSIST_DIR = "chroma/realestate"
-COLLECTION_NAME = "realestate"
 DATA_API_URL = os.getenv("DATA_API_URL")
 API_TOKEN = os.getenv("API_TOKEN")
-STORE_HISTORY_URL = DATA_API_URL + "/chat_history"
-
-report_param = {}
-
-_session_store: Dict[str, ChatMessageHistory] = {}
-def get_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in _session_store:
-        _session_store[session_id] = ChatMessageHistory()
-    return _session_store[session_id]
-
 
 def coming_soon(x):
     return "Maaf, fitur ini masih dalam tahap pengembangan. Silahkan hubungi Admin atau kunjungi www.metaproperty.co.id ."
 
-def serialize_history(hist_obj: BaseChatMessageHistory, turns: int = 10) -> str:
-    """
-    Ambil 10 percakapan terakhir (user+AI = 2 pesan x 10 = 20 messages)
-    dan ubah jadi transcript teks sederhana: "Human: ..." / "AI: ..."
-    """
-    if not hist_obj or not getattr(hist_obj, "messages", None):
-        return ""
-    msgs = hist_obj.messages[-2*turns:]  # 10 percakapan terakhir
-    lines = []
-    for m in msgs:
-        role = "Human" if m.type in ("human", "user") else "AI"
-        try:
-            content = m.content if isinstance(m.content, str) else json.dumps(m.content, ensure_ascii=False)
-        except Exception:
-            content = str(m.content)
-        lines.append(f"{role}: {content}")
-    return "\n".join(lines)
-
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# stream_usage: token tetap tercatat di get_openai_callback saat jawaban di-stream (astream_chain)
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, stream_usage=True)
 
 contextualize_q_prompt = ChatPromptTemplate.from_messages([
         (   
@@ -83,18 +66,27 @@ contextualize_q_prompt = ChatPromptTemplate.from_messages([
         ("human", "{question}")
     ])
 
+history_context = contextualize_q_prompt | llm | StrOutputParser()
+
 def rewrite_chain(x):
     q = x['question']
     hist_chat = x.get("history_chat")  
-    history_context = contextualize_q_prompt | llm | StrOutputParser()
     hist_chain = history_context.invoke({"question":q, "history_chat":hist_chat})
-    
+    log_rewrite(hist_chat, hist_chain)
+    return hist_chain
+
+async def arewrite_chain(x):
+    q = x['question']
+    hist_chat = x.get("history_chat")  
+    hist_chain = await history_context.ainvoke({"question":q, "history_chat":hist_chat})
+    log_rewrite(hist_chat, hist_chain)
+    return hist_chain
+
+def log_rewrite(hist_chat, hist_chain):
     print("\n[italic bold green]Membaca histori chat sebelumnya... [/italic bold green]\n")
     print(f"[italic bold green]{hist_chat if hist_chat else 'Tidak ada history chat'}[/italic bold green]\n")
     print("[italic bold green]Membuat pertanyaan baru (history context)... [/italic bold green]\n")
     print(f"[italic bold green]hasil pertanyaan baru (history): {hist_chain} [italic bold green]\n" ) 
-    
-    return hist_chain
 
 classifier_prompt = ChatPromptTemplate.from_messages([
     (
@@ -118,11 +110,20 @@ classifier_prompt = ChatPromptTemplate.from_messages([
     ("human", "{rewrite_question}")
 ])
 
+classify_chain = classifier_prompt | llm | StrOutputParser()
+
 def classifier(x):
-    rewrite_question = x['rewrite_question'] 
-    chain = classifier_prompt | llm | StrOutputParser()
-    cls = chain.invoke({"rewrite_question":rewrite_question})
+    cls = classify_chain.invoke({"rewrite_question":x['rewrite_question']})
+    log_classification(cls)
+    return cls
+
+async def aclassifier(x):
+    cls = await classify_chain.ainvoke({"rewrite_question":x['rewrite_question']})
+    log_classification(cls)
+    return cls
 
+def log_classification(cls):
+    set_branch(cls)
     if(cls == "1"):
         classification  = "(1) Minta informasi properti, pencarian properti, rekomendasi properti."
     elif(cls == "2"):
@@ -134,8 +135,6 @@ def classifier(x):
     
     print("[italic bold green]Melakukan klasifikasi pertanyaan... [/italic bold green]\n")
     print("[italic bold green]Hasil Klasifikasi : " + classification + " [/italic bold green]\n")
-    
-    return cls
 
 greeting_prompt = ChatPromptTemplate.from_messages([
     (
@@ -168,11 +167,8 @@ greeting_prompt = ChatPromptTemplate.from_messages([
 
 greeting_chain = greeting_prompt | llm | StrOutputParser()
 
-vectordb = Chroma(
-        persist_directory=PERSIST_DIR,
-        collection_name=COLLECTION_NAME,
-        embedding_function=embeddings,
-    )
+# koleksi dibuka sekali per proses (lazy) dan dibuka ulang otomatis setelah ingest
+vector_store = get_manager()
 
 # retriever =vectordb.as_retriever(
 #     search_type="similarity_score_threshold",
@@ -183,12 +179,8 @@ vectordb = Chroma(
 #     },
 # )
 
-retriever =vectordb.as_retriever(
-    search_type="similarity",
-    search_kwargs={
-        "k": 10, 
-    },
-)
+def get_retriever():
+    return vector_store.as_retriever(search_type="similarity", k=10)
 
 # retriever = vectordb.as_retriever(
 #         search_type="mmr",
@@ -219,17 +211,36 @@ def join_page_contents(relevant_docs: Iterable, limit: int = 15 ) -> str:
     return "\n\n".join(chunks)
 
 def fetch_relevant_docs(x):
-    query = x['rewrite_question']
-    question = x['question']
+    print("[italic bold green]Mencari document yang sesuai ... [/italic bold green]\n")
+    if VECTOR_INDEX == "numpy":
+        relevant_docs = dense_search(vector_store, x['rewrite_question'], None)
+    else:
+        relevant_docs = get_retriever().invoke(x['rewrite_question'])
+    if RERANK:
+        relevant_docs = reranker.rerank(x['rewrite_question'], relevant_docs)
+    return docs_to_property(x, relevant_docs)
 
+async def afetch_relevant_docs(x):
     print("[italic bold green]Mencari document yang sesuai ... [/italic bold green]\n")
-    relevant_docs = retriever.invoke(query)
+    if VECTOR_INDEX == "numpy":
+        relevant_docs = await adense_search(vector_store, x['rewrite_question'], None)
+    else:
+        relevant_docs = await get_retriever().ainvoke(x['rewrite_question'])
+    if RERANK:
+        relevant_docs = await reranker.arerank(x['rewrite_question'], relevant_docs)
+    return docs_to_property(x, relevant_docs)
+
+def docs_to_property(x, relevant_docs):
+    question = x['question']
     count = len(relevant_docs)
 
     print(f"[italic bold green]Menemukan {count} document yang sesuai ... [/italic bold green]\n")
-    data_property = join_page_contents(relevant_docs, limit=15)
+    if LISTING_CONTEXT == "compact":
+        data_property = context_from_docs(relevant_docs, x)
+    else:
+        data_property = join_page_contents(relevant_docs, limit=15)
 
-    report_param["doc"] = data_property
+    set_doc(data_property)
 
     print(f"[italic bold green]{'Menemukan document properti...' if count > 0 else 'Tidak menemukan document properti'}[/italic bold green]\n")
     print(f"[italic bold green]Document : \n{data_property} [/italic bold green]\n")
@@ -265,7 +276,7 @@ property_finder_prompt = ChatPromptTemplate.from_messages([
 ]) 
 
 fetch_property_chain = RunnableParallel(
-    data_property = RunnableLambda(fetch_relevant_docs),
+    data_property = timed("retrieval", RunnableLambda(fetch_relevant_docs, afunc=afetch_relevant_docs)),
     question = itemgetter("question")
 )
 
@@ -307,9 +318,7 @@ classifier_branches = RunnableBranch(
     (
         lambda x: x['cls'] == "1",
         fetch_property_chain 
-        | property_finder_prompt 
-        | llm
-        | StrOutputParser()
+        | timed_stream("answer", property_finder_prompt | llm | StrOutputParser())
     ),
     (
         lambda x: x['cls'] == "2",
@@ -319,7 +328,7 @@ classifier_branches = RunnableBranch(
 )
 
 classifier_chain = RunnableParallel(
-    cls = RunnableLambda(classifier),
+    cls = timed("classify", RunnableLambda(classifier, afunc=aclassifier)),
     rewrite_question = itemgetter("rewrite_question"),
     question = itemgetter("question"),
     history_chat = itemgetter("history_chat"),
@@ -328,7 +337,7 @@ classifier_chain = RunnableParallel(
 )
 
 rewrite_context_chain = RunnableParallel(
-    rewrite_question = RunnableLambda(rewrite_chain),
+    rewrite_question = timed("rewrite", RunnableLambda(rewrite_chain, afunc=arewrite_chain)),
     question = itemgetter("question"),
     history_chat = itemgetter("history_chat"),
     time_greeting = itemgetter("time_greeting"),
@@ -337,28 +346,40 @@ rewrite_context_chain = RunnableParallel(
 
 chain = rewrite_context_chain | classifier_chain | classifier_branches
 
+# rewrite + klasifikasi (+ JSON filter) dalam 1 structured call, pilih lewat UNDERSTAND_MODE=single
+understand_chain = timed("understand", understand_runnable(llm)) | classifier_branches
 
+def select_chain(data, inputs):
+    if inputs["fast_path"] == fast_path.GREETING:
+        set_branch("fast_greeting")
+        return greeting_chain
+    return understand_chain if resolve_mode(data) == "single" else chain
 
-def build_chain(data):
-    start = time.perf_counter()
+
+
+def chain_input(data):
+    """Susun input chain dari payload (history chat per session)."""
+    history = get_history(data['session_id'])
+    return {
+        "session_id": data['session_id'],
+        "question": data['question'],
+        "history_chat": render_history(history),
+        "time_greeting": jakarta_time_greeting(),
+        "user_name": data['user_name'],
+        "fast_path": fast_path.route(data['question']),
+    }
+
+def finish_turn(data, answer, cb, start):
+    """Simpan percakapan ke history, cetak rincian token, dan kembalikan record chat_history."""
     session_id = data['session_id']
     question = data['question']
     history = get_history(session_id)
-    last_history = serialize_history(history,10)
-
-    with get_openai_callback() as cb:
-        answer = chain.invoke({
-            "session_id": session_id,
-            "question": question,
-            "history_chat": last_history,
-            "time_greeting": jakarta_time_greeting(),
-            "user_name": data['user_name']
-        })
-
     history.add_user_message(question)
     history.add_ai_message(answer)
 
     elapsed_ms = (time.perf_counter() - start) * 1000
+    ctx = current()
+    ctx.add_timing("total", elapsed_ms)
 
     store_data = {
         "chat_session_id" : session_id,
@@ -373,8 +394,7 @@ def build_chain(data):
         "cost_usd" : cb.total_cost,
         "cost_idr" : cb.total_cost * 17000,
     }
-    
-    post_query(STORE_HISTORY_URL,store_data,API_TOKEN)
+    ctx.tokens = {k: store_data[k] for k in ("input_token", "output_token", "total_token", "cost_usd")}
 
     print("[italic bold blue]\n======== RINCIAN PEMAKAIAN TOKEN =============[/italic bold blue]")
     print(f"[italic bold blue]Total Token : {cb.total_tokens}[/italic bold blue]")
@@ -384,58 +404,86 @@ def build_chain(data):
     print(f"[italic bold blue]Cost (USD) : {round(cb.total_cost,4)}[/italic bold blue]")
     print(f"[italic bold blue]Cost (IDR) : {round((cb.total_cost * 17000),2)}[/italic bold blue]")
     print(f"[italic bold blue]Total response time: {elapsed_ms:.1f} ms[/italic bold blue]")
+    if ctx.history:
+        print(f"[italic bold blue]{history_report(ctx.history)}[/italic bold blue]")
+    print(f"[italic bold blue]Tahap (ms) : {', '.join(f'{k} {v:.0f}' for k, v in ctx.timings.items())}[/italic bold blue]")
+    fp = fast_path.stats()
+    print(f"[italic bold blue]Fast path hit rate : {fp['hits']}/{fp['total']} ({fp['hit_rate']:.0%})[/italic bold blue]")
+    ec = vector_store.embedding_stats()
+    if ec:
+        print(f"[italic bold blue]Embedding cache : hit {ec['hits'] + ec['disk_hits']} / miss {ec['misses']} ({ec['hit_rate']:.0%})[/italic bold blue]")
     print("[italic bold blue]===============================================[/italic bold blue]\n")
-    
+
+    metrics.observe_turn("vector", ctx, store_data)
+    return store_data
+
+def build_chain(data):
+    start = time.perf_counter()
+
+    with request_scope(data['session_id']), trace_scope("vector_rval", data['session_id']):
+        inputs = chain_input(data)
+        with get_openai_callback() as cb:
+            answer = select_chain(data, inputs).invoke(inputs)
+
+        store_data = finish_turn(data, answer, cb, start)
+    # dikirim di background; jawaban user tidak menunggu endpoint chat_history
+    history_writer.submit(store_data)
 
     return answer
 
-def build_chain_test(data):
+async def abuild_chain(data):
+    """Versi async build_chain untuk FastAPI: semua LLM call & HTTP call non-blocking."""
     start = time.perf_counter()
-    session_id = data['session_id']
-    question = data['question']
-    history = get_history(session_id)
-    last_history = serialize_history(history,10)
 
-    with get_openai_callback() as cb:
-         answer = chain.invoke({
-            "session_id": session_id,
-            "question": question,
-            "history_chat": last_history,
-            "time_greeting": jakarta_time_greeting(),
-            "user_name": data['user_name']
-        })
+    with request_scope(data['session_id']), trace_scope("vector_rval", data['session_id']):
+        # history sqlite (SESSION_DB) dibaca/ditulis di thread, bukan di event loop
+        inputs = await asyncio.to_thread(chain_input, data)
+        with get_openai_callback() as cb:
+            answer = await select_chain(data, inputs).ainvoke(inputs)
 
-    
-    history.add_user_message(question)
-    history.add_ai_message(answer)
+        store_data = await asyncio.to_thread(finish_turn, data, answer, cb, start)
+    # dikirim di background; jawaban user tidak menunggu endpoint chat_history
+    history_writer.submit(store_data)
 
-    elapsed_ms = (time.perf_counter() - start) * 1000
+    return answer
+
+async def astream_chain(data):
+    """
+    Versi streaming abuild_chain: yield potongan jawaban akhir selama LLM menulis.
+    History & chat_history disimpan setelah stream selesai (jawaban lengkap).
+    """
+    start = time.perf_counter()
 
-    report_param["chat_session_id"] = session_id
-    report_param["human"] = question
-    report_param["ai"] = answer
-    report_param["gold"] = data['gold'] 
-    report_param["method"] = 'vector-similarity'
-    report_param["input_token"] = cb.prompt_tokens
-    report_param["output_token"] = cb.completion_tokens
-    report_param["total_token"] = cb.total_tokens
-    report_param["response_count"] = cb.successful_requests
-    report_param["response_time"] = elapsed_ms
-    report_param["cost_usd"] = cb.total_cost
-    report_param["cost_idr"] = cb.total_cost * 17000
+    with request_scope(data['session_id']), trace_scope("vector_rval", data['session_id']):
+        # history sqlite (SESSION_DB) dibaca/ditulis di thread, bukan di event loop
+        inputs = await asyncio.to_thread(chain_input, data)
+        chunks = []
+        with get_openai_callback() as cb:
+            async for chunk in select_chain(data, inputs).astream(inputs):
+                chunks.append(chunk)
+                yield chunk
 
-    print("[italic bold blue]\n======== RINCIAN PEMAKAIAN TOKEN =============[/italic bold blue]")
-    print(f"[italic bold blue]Total Token : {cb.total_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Input Token : {cb.prompt_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Output Token : {cb.completion_tokens}[/italic bold blue]")
-    print(f"[italic bold blue]Request Count : {cb.successful_requests}[/italic bold blue]")
-    print(f"[italic bold blue]Cost (USD) : {round(cb.total_cost,4)}[/italic bold blue]")
-    print(f"[italic bold blue]Cost (IDR) : {round((cb.total_cost * 17000),2)}[/italic bold blue]")
-    print(f"[italic bold blue]Total response time: {elapsed_ms:.1f} ms[/italic bold blue]")
-    print("[italic bold blue]===============================================[/italic bold blue]\n")
-    
-    # return answer
-    return report_param
+        store_data = await asyncio.to_thread(finish_turn, data, "".join(chunks), cb, start)
+    history_writer.submit(store_data)
+
+def build_chain_test(data):
+    start = time.perf_counter()
+
+    with request_scope(data['session_id']) as ctx, trace_scope("vector_rval", data['session_id']):
+        inputs = chain_input(data)
+        with get_openai_callback() as cb:
+            answer = select_chain(data, inputs).invoke(inputs)
+
+        store_data = finish_turn(data, answer, cb, start)
+
+    # record milik request ini saja (aman untuk evaluasi paralel)
+    record = ctx.report()
+    record.update(store_data)
+    record["gold"] = data['gold'] 
+    record["understand"] = resolve_mode(data)
+    record["fast_path"] = inputs["fast_path"]
+
+    return record
 
 
 
@@ -0,0 +1,184 @@
+#vector_store.py
+#satu koneksi Chroma per proses, dipakai bersama oleh pipeline & ingest
+import os
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+
+from embedding_batcher import EMBED_BATCH, EMBED_BATCH_CONCURRENCY, BatchedEmbeddings
+from embedding_cache import CachedEmbeddings
+from local_embeddings import backend_model, load_embeddings
+
+load_dotenv()
+
+PERSIST_DIR = os.getenv("PERSIST_DIR", "chroma/realestate")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "realestate")
+EMBED_CACHE = os.getenv("EMBED_CACHE", "1") == "1"
+# auto = ikuti backend yang tercatat di metadata koleksi (openai bila koleksi lama belum mencatat)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto")             # auto | openai | e5 | e5-onnx
+STAMP_FILE = ".ingest_stamp"   # ditulis ingest.py setiap selesai menulis koleksi
+
+def get_embeddings(backend: str = "openai"):
+    """Embedding untuk query saat serving (harus sama dengan yang dipakai saat ingest)."""
+    embeddings = load_embeddings(backend)
+    if EMBED_BATCH:
+        # query bersamaan → 1 panggilan embedding; model lokal cukup 1 batch berjalan sekaligus
+        embeddings = BatchedEmbeddings(embeddings, concurrency=EMBED_BATCH_CONCURRENCY if backend == "openai" else 1)
+    if EMBED_CACHE:
+        # query berulang ("rumah dijual di cemara") tidak perlu network call lagi
+        embeddings = CachedEmbeddings(embeddings)
+    return embeddings
+
+def recorded_backend(store: Chroma) -> str | None:
+    """Backend embedding yang membangun koleksi (ditulis ingest.py di metadata koleksi)."""
+    return (store._collection.metadata or {}).get("embedding_backend")
+
+def record_backend(store: Chroma, backend: str):
+    collection = store._collection
+    # kunci hnsw:* tidak boleh ikut di-modify (Chroma menolak perubahan distance function)
+    metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    metadata.update({"embedding_backend": backend, "embedding_model": backend_model(backend)})
+    collection.modify(metadata=metadata)
+
+class VectorStoreManager:
+    """
+    Pegang 1 instance Chroma untuk (persist_dir, collection).
+    - Dibuka lazy saat pertama dipakai.
+    - Retriever di-cache per search_kwargs.
+    - Bila ingest menulis STAMP_FILE baru, koleksi dibuka ulang otomatis.
+    """
+
+    def __init__(self, persist_dir: str, collection_name: str, embedding_function=None, check_interval: float = 2.0):
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.backend = None     # diisi bila embedding dipilih sendiri (embedding_function tidak diberikan)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._store = None
+        self._retrievers = {}
+        self._stamp = None
+        self._last_check = 0.0
+
+    @property
+    def stamp_path(self) -> Path:
+        return Path(self.persist_dir) / STAMP_FILE
+
+    def read_stamp(self):
+        try:
+            return self.stamp_path.read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+
+    def _chroma(self) -> Chroma:
+        return Chroma(
+            persist_directory=self.persist_dir,
+            collection_name=self.collection_name,
+            embedding_function=self.embedding_function,
+        )
+
+    def _open(self):
+        store = self._chroma()
+        if self.embedding_function is None or self.backend is not None:
+            backend = self.choose_backend(recorded_backend(store))
+            if backend != self.backend:
+                self.backend = backend
+                self.embedding_function = get_embeddings(backend)
+                store = self._chroma()
+                print(f"[vector_store] koleksi '{self.collection_name}': embedding query {backend} ({backend_model(backend)})")
+        self._store = store
+        self._retrievers = {}
+        self._stamp = self.read_stamp()
+        self._last_check = time.monotonic()
+
+    def choose_backend(self, recorded: str | None) -> str:
+        if EMBEDDING_BACKEND == "auto":
+            return recorded or "openai"
+        if recorded and backend_model(recorded) != backend_model(EMBEDDING_BACKEND):
+            print(f"[vector_store] PERINGATAN: koleksi '{self.collection_name}' dibangun dengan {recorded}, "
+                  f"query memakai {EMBEDDING_BACKEND}; hasil pencarian tidak akan relevan")
+        return EMBEDDING_BACKEND
+
+    def _is_stale(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        return self.read_stamp() != self._stamp
+
+    def get(self) -> Chroma:
+        store = self._store
+        if store is not None and not self._is_stale():
+            return store
+        with self._lock:
+            if self._store is None:
+                self._open()
+            elif self.read_stamp() != self._stamp:
+                self._reload_locked()
+            return self._store
+
+    def embedding_stats(self):
+        """Counter hit/miss cache embedding (None bila cache tidak aktif / belum dipakai)."""
+        if not isinstance(self.embedding_function, CachedEmbeddings):
+            return None
+        return self.embedding_function.stats()
+
+    def embed_query(self, text: str) -> list:
+        """Vektor query dengan embedding yang sama seperti koleksi (cache & batching ikut terpakai)."""
+        self.get()
+        return self.embedding_function.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list:
+        self.get()
+        return await self.embedding_function.aembed_query(text)
+
+    def as_retriever(self, search_type: str = "similarity", **search_kwargs):
+        store = self.get()
+        key = (search_type, tuple(sorted(search_kwargs.items())))
+        retriever = self._retrievers.get(key)
+        if retriever is None:
+            retriever = store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+            self._retrievers[key] = retriever
+        return retriever
+
+    def _reload_locked(self):
+        print(f"[vector_store] koleksi '{self.collection_name}' berubah, membuka ulang ...")
+        try:
+            # Chroma meng-cache client per path; kosongkan supaya segment HNSW dibaca ulang dari disk
+            from chromadb.api.shared_system_client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except Exception:
+            pass
+        self._open()
+
+    def reload(self):
+        with self._lock:
+            self._reload_locked()
+
+    def mark_updated(self):
+        """Dipanggil ingest setelah menulis: proses serving akan membuka ulang koleksi."""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self.stamp_path.write_text(str(time.time_ns()), encoding="utf-8")
+        with self._lock:
+            self._stamp = self.read_stamp()
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(persist_dir: str = PERSIST_DIR, collection_name: str = COLLECTION_NAME, embedding_function=None) -> VectorStoreManager:
+    """Manager bersama per proses untuk (persist_dir, collection)."""
+    key = (os.path.abspath(persist_dir), collection_name)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = VectorStoreManager(persist_dir, collection_name, embedding_function)
+            _managers[key] = manager
+        return manager
+
+def all_managers() -> list:
+    with _managers_lock:
+        return list(_managers.values())